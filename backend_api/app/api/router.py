@@ -1,18 +1,93 @@
 from fastapi import APIRouter, UploadFile, File, Form
+from typing import List, Optional
 from fastapi.responses import JSONResponse, StreamingResponse
-from ..controllers.export_controller import sample_data, export_file
+from ..controllers.admission_controller import admission_stats
+from ..controllers.export_controller import sample_data, export_file, export_batch, list_rules
+from ..controllers.cache_controller import cache_stats, invalidate_exports
+from ..controllers.llm_controller import llm_usage
+from ..controllers.jobs_controller import submit_job, job_status, job_result
+from ..controllers.workbooks_controller import upload_workbook, workbook_info, delete_workbook, preview_sheet
 
 router = APIRouter()
 
 
 @router.get("/sample-data")
-async def _sample_data():
-    return await sample_data()
+async def _sample_data(rules_id: Optional[str] = None):
+    return await sample_data(rules_id=rules_id)
+
+
+@router.get("/rules")
+async def _list_rules():
+    return await list_rules()
 
 
 @router.post("/export")
-async def _export(file: UploadFile = File(...), sheet: str = Form(...)):
-    return await export_file(file=file, sheet=sheet)
+async def _export(file: Optional[UploadFile] = File(None), sheet: str = Form(...),
+                  rules_id: Optional[str] = Form(None), workbook_id: Optional[str] = Form(None)):
+    return await export_file(file=file, sheet=sheet, rules_id=rules_id, workbook_id=workbook_id)
+
+
+@router.post("/export/batch")
+async def _export_batch(files: List[UploadFile] = File(...), sheets: Optional[str] = Form(None),
+                        rules_id: Optional[str] = Form(None), output: str = Form("auto")):
+    return await export_batch(files=files, sheets=sheets, rules_id=rules_id, output=output)
+
+@router.post("/jobs", status_code=202)
+async def _submit_job(file: Optional[UploadFile] = File(None), sheet: str = Form(...),
+                      rules_id: Optional[str] = Form(None), workbook_id: Optional[str] = Form(None)):
+    return await submit_job(file=file, sheet=sheet, rules_id=rules_id, workbook_id=workbook_id)
+
+
+@router.get("/jobs/{job_id}")
+async def _job_status(job_id: str):
+    return await job_status(job_id)
+
+
+@router.get("/jobs/{job_id}/result")
+async def _job_result(job_id: str):
+    return await job_result(job_id)
+
+
+@router.post("/workbooks", status_code=201)
+async def _upload_workbook(file: UploadFile = File(...)):
+    return await upload_workbook(file=file)
+
+
+@router.get("/workbooks/{workbook_id}")
+async def _workbook_info(workbook_id: str):
+    return await workbook_info(workbook_id)
+
+
+@router.delete("/workbooks/{workbook_id}")
+async def _delete_workbook(workbook_id: str):
+    return await delete_workbook(workbook_id)
+
+
+@router.get("/workbooks/{workbook_id}/sheets/{sheet}")
+async def _preview_sheet(workbook_id: str, sheet: str, view: str = "raw", table: Optional[str] = None,
+                         offset: int = 0, limit: int = 100):
+    return await preview_sheet(workbook_id, sheet, view=view, table=table, offset=offset, limit=limit)
+
+
+@router.get("/cache/stats")
+async def _cache_stats():
+    return await cache_stats()
+
+
+@router.get("/admission/stats")
+async def _admission_stats():
+    return await admission_stats()
+
+
+@router.get("/llm/usage")
+async def _llm_usage():
+    return await llm_usage()
+
+
+@router.delete("/cache/exports")
+async def _invalidate_exports(rules_id: Optional[str] = None):
+    return await invalidate_exports(rules_id=rules_id)
+
 
 @router.post("/test")
 async def _test(file: UploadFile = File(...)):
@@ -0,0 +1,12 @@
+from fastapi.responses import JSONResponse
+
+from ..utils.admission import get_governor
+from ..utils.config import env_int
+from ..utils.llm_client import get_llm_pool
+
+
+async def admission_stats() -> JSONResponse:
+    return JSONResponse(content={
+        "exports": get_governor().stats(),
+        "llm": {"in_flight": get_llm_pool().in_flight, "max_in_flight": max(1, env_int("LLM_MAX_IN_FLIGHT", 16))},
+    })
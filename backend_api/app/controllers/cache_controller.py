@@ -0,0 +1,23 @@
+from fastapi.responses import JSONResponse
+from typing import Optional
+
+from ..utils.export_cache import get_export_cache
+from ..utils.llm_cache import get_llm_cache
+from ..utils.sheet_cache import get_sheet_cache
+
+
+async def cache_stats() -> JSONResponse:
+    cache = get_llm_cache()
+    exports = get_export_cache()
+    sheets = get_sheet_cache()
+    return JSONResponse(content={
+        "llm": cache.stats() if cache is not None else {"enabled": False},
+        "exports": exports.stats() if exports is not None else {"enabled": False},
+        "sheets": sheets.stats() if sheets is not None else {"enabled": False},
+    })
+
+
+async def invalidate_exports(rules_id: Optional[str] = None) -> JSONResponse:
+    cache = get_export_cache()
+    removed = cache.invalidate(rules_id) if cache is not None else 0
+    return JSONResponse(content={"removed": removed})
@@ -1,40 +1,91 @@
 from fastapi import UploadFile, HTTPException
 from fastapi.responses import JSONResponse, StreamingResponse
-from typing import Any, Dict
-import io
-import json
+from starlette.background import BackgroundTask
+from typing import Any, Dict, List, Optional
 
-from ..services.excel_service import process_export
-from pathlib import Path
+from ..services.batch_export import process_batch_upload
+from ..services.excel_service import process_export_to_file, process_workbook_export
+from ..services.rules_registry import get_rules_registry
+from ..utils.admission import ExportTooLargeError
+from ..utils.executors import ExecutorSaturatedError
+from ..utils.uploads import UploadTooLargeError, iter_file
+from .workbooks_controller import get_workbook_or_404
 
-BASE_DIR = Path(__file__).resolve().parents[2]
-DATA_DIR = BASE_DIR / "data"
-SAMPLE_RULES = DATA_DIR / "sample_test3.json"
 
-
-async def sample_data() -> JSONResponse:
-    if SAMPLE_RULES.exists():
-        try:
-            data = json.loads(SAMPLE_RULES.read_text(encoding="utf-8"))
-            return JSONResponse(content=data)
-        except Exception:
-            raise HTTPException(status_code=500, detail="Failed reading sample rules file")
+async def sample_data(rules_id: Optional[str] = None) -> JSONResponse:
+    try:
+        ruleset = get_rules_registry().get(rules_id)
+    except ValueError as ve:
+        raise HTTPException(status_code=404, detail=str(ve))
+    if ruleset.rules:
+        return JSONResponse(content=ruleset.rules, headers={"X-Rules-Version": ruleset.version})
     return JSONResponse(content={"rules": []})
 
 
-async def export_file(file: UploadFile, sheet: str) -> StreamingResponse:
-    # Basic validation
-    if not file.filename.lower().endswith((".xlsx", ".xls")):
-        raise HTTPException(status_code=400, detail="Only Excel files (.xlsx/.xls) are supported")
+async def list_rules() -> JSONResponse:
+    return JSONResponse(content={"rules": [rs.describe() for rs in get_rules_registry().list()]})
+
+
+async def export_file(file: Optional[UploadFile], sheet: str, rules_id: Optional[str] = None,
+                      workbook_id: Optional[str] = None) -> StreamingResponse:
+    # Basic validation: a workbook uploaded earlier (POST /workbooks) or the file itself
+    workbook = get_workbook_or_404(workbook_id) if workbook_id else None
+    if workbook is None:
+        if file is None:
+            raise HTTPException(status_code=400, detail="Send a file or a workbook_id")
+        if not file.filename.lower().endswith((".xlsx", ".xls")):
+            raise HTTPException(status_code=400, detail="Only Excel files (.xlsx/.xls) are supported")
 
     try:
-        out_bytes, out_name = await process_export(file, sheet)
+        if workbook is not None:
+            out_path, out_name = await process_workbook_export(workbook, sheet, rules_id=rules_id)
+        else:
+            out_path, out_name = await process_export_to_file(file, sheet, rules_id=rules_id)
+    except ExecutorSaturatedError as se:
+        raise HTTPException(status_code=503, detail=str(se),
+                            headers={"Retry-After": str(se.retry_after)})
+    except (UploadTooLargeError, ExportTooLargeError) as te:
+        raise HTTPException(status_code=413, detail=str(te))
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Export failed: {e}")
 
-    headers = {"Content-Disposition": f'attachment; filename="{out_name}"'}
-    return StreamingResponse(io.BytesIO(out_bytes),
+    headers = {
+        "Content-Disposition": f'attachment; filename="{out_name}"',
+        "Content-Length": str(out_path.stat().st_size),
+    }
+    # stream the spooled workbook in chunks; the file is removed once sent (or on disconnect)
+    return StreamingResponse(iter_file(out_path, remove=True),
                              media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                             headers=headers)
+                             headers=headers,
+                             background=BackgroundTask(out_path.unlink, missing_ok=True))
+
+
+async def export_batch(files: List[UploadFile], sheets: Optional[str] = None, rules_id: Optional[str] = None,
+                       output: str = "auto") -> StreamingResponse:
+    for file in files:
+        if not file.filename.lower().endswith((".xlsx", ".xls")):
+            raise HTTPException(status_code=400, detail=f"Only Excel files (.xlsx/.xls) are supported: {file.filename}")
+    selection = [s.strip() for s in sheets.split(",") if s.strip()] if sheets else None
+
+    try:
+        out_path, out_name = await process_batch_upload(files, selection, rules_id=rules_id, output=output)
+    except ExecutorSaturatedError as se:
+        raise HTTPException(status_code=503, detail=str(se),
+                            headers={"Retry-After": str(se.retry_after)})
+    except (UploadTooLargeError, ExportTooLargeError) as te:
+        raise HTTPException(status_code=413, detail=str(te))
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Batch export failed: {e}")
+
+    headers = {
+        "Content-Disposition": f'attachment; filename="{out_name}"',
+        "Content-Length": str(out_path.stat().st_size),
+    }
+    media_type = ("application/zip" if out_name.endswith(".zip")
+                  else "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+    return StreamingResponse(iter_file(out_path, remove=True), media_type=media_type, headers=headers,
+                             background=BackgroundTask(out_path.unlink, missing_ok=True))
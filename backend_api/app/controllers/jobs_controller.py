@@ -0,0 +1,68 @@
+from fastapi import UploadFile, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from ..services.export_jobs import describe_job, get_job_runner
+from ..utils.admission import ExportTooLargeError
+from ..utils.executors import ExecutorSaturatedError
+from ..utils.job_store import DONE, FAILED, get_job_store
+from ..utils.uploads import UploadTooLargeError, iter_file
+from .workbooks_controller import get_workbook_or_404
+
+
+def _get_job(job_id: str) -> Dict[str, Any]:
+    job = get_job_store().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job '{job_id}'")
+    return job
+
+
+async def submit_job(file: Optional[UploadFile], sheet: str, rules_id: Optional[str] = None,
+                     workbook_id: Optional[str] = None) -> JSONResponse:
+    workbook = get_workbook_or_404(workbook_id) if workbook_id else None
+    if workbook is None:
+        if file is None:
+            raise HTTPException(status_code=400, detail="Send a file or a workbook_id")
+        if not file.filename.lower().endswith((".xlsx", ".xls")):
+            raise HTTPException(status_code=400, detail="Only Excel files (.xlsx/.xls) are supported")
+
+    try:
+        if workbook is not None:
+            job = await get_job_runner().submit_workbook(workbook, sheet, rules_id=rules_id)
+        else:
+            job = await get_job_runner().submit(file, sheet, rules_id=rules_id)
+    except ExecutorSaturatedError as se:
+        raise HTTPException(status_code=503, detail=str(se),
+                            headers={"Retry-After": str(se.retry_after)})
+    except (UploadTooLargeError, ExportTooLargeError) as te:
+        raise HTTPException(status_code=413, detail=str(te))
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+
+    return JSONResponse(status_code=202, content=describe_job(job), headers={"Location": f"/jobs/{job['id']}"})
+
+
+async def job_status(job_id: str) -> JSONResponse:
+    # make sure this process works the queue even if the startup hook did not run
+    get_job_runner().start()
+    return JSONResponse(content=describe_job(_get_job(job_id)))
+
+
+async def job_result(job_id: str) -> StreamingResponse:
+    job = _get_job(job_id)
+    if job["status"] == FAILED:
+        raise HTTPException(status_code=409, detail=f"Job failed: {job['error']}")
+    if job["status"] != DONE:
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']} (stage: {job['stage']})")
+    path = Path(job["result_path"])
+    if not path.exists():
+        raise HTTPException(status_code=410, detail="Job result has expired")
+
+    headers = {
+        "Content-Disposition": f'attachment; filename="{job["result_name"]}"',
+        "Content-Length": str(path.stat().st_size),
+    }
+    return StreamingResponse(iter_file(path),
+                             media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                             headers=headers)
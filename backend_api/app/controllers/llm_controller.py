@@ -0,0 +1,7 @@
+from fastapi.responses import JSONResponse
+
+from ..utils.token_budget import get_token_meter
+
+
+async def llm_usage() -> JSONResponse:
+    return JSONResponse(content=get_token_meter().stats())
@@ -0,0 +1,48 @@
+from fastapi import UploadFile, HTTPException
+from fastapi.responses import JSONResponse
+from typing import Any, Dict, Optional
+
+from ..services.workbook_service import create_workbook, describe_workbook, sheet_preview
+from ..utils.uploads import UploadTooLargeError
+from ..utils.workbook_store import get_workbook_store
+
+
+def get_workbook_or_404(workbook_id: str) -> Dict[str, Any]:
+    workbook = get_workbook_store().get(workbook_id)
+    if workbook is None:
+        raise HTTPException(status_code=404, detail=f"Unknown workbook '{workbook_id}'")
+    return workbook
+
+
+async def upload_workbook(file: UploadFile) -> JSONResponse:
+    if not file.filename.lower().endswith((".xlsx", ".xls")):
+        raise HTTPException(status_code=400, detail="Only Excel files (.xlsx/.xls) are supported")
+
+    try:
+        workbook = await create_workbook(file)
+    except UploadTooLargeError as te:
+        raise HTTPException(status_code=413, detail=str(te))
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+
+    return JSONResponse(status_code=201, content=workbook, headers={"Location": f"/workbooks/{workbook['id']}"})
+
+
+async def workbook_info(workbook_id: str) -> JSONResponse:
+    return JSONResponse(content=describe_workbook(get_workbook_or_404(workbook_id)))
+
+
+async def delete_workbook(workbook_id: str) -> JSONResponse:
+    if not get_workbook_store().delete(workbook_id):
+        raise HTTPException(status_code=404, detail=f"Unknown workbook '{workbook_id}'")
+    return JSONResponse(content={"deleted": workbook_id})
+
+
+async def preview_sheet(workbook_id: str, sheet: str, view: str = "raw", table: Optional[str] = None,
+                        offset: int = 0, limit: int = 100) -> JSONResponse:
+    workbook = get_workbook_or_404(workbook_id)
+    try:
+        page = await sheet_preview(workbook, sheet, view=view, table=table, offset=offset, limit=limit)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    return JSONResponse(content=page)
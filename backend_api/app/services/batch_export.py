@@ -0,0 +1,216 @@
+"""Batch export: several workbooks and sheets in one run.
+
+Every (file, sheet) pair is cleaned in its own CPU-executor task, so cleaning runs
+on all pool workers at once; the tables of a sheet go to rule application as soon
+as that sheet is cleaned. The result is either one workbook with a sheet per table
+or a zip archive with one `modified_<file>` workbook per input.
+"""
+import asyncio
+import logging
+import re
+import zipfile
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Set, Tuple, Union
+
+import pandas as pd
+from fastapi import UploadFile
+
+from ..utils.admission import ExportCost, estimate_export, get_governor
+from ..utils.config import env_int
+from ..utils.excel_utils import ExcelWorkbook, dataframe_to_excel_file
+from ..utils.executors import run_cpu, run_io
+from ..utils.sheet_cache import file_sha256, get_sheet_cache
+from ..utils.uploads import SpooledUpload, spool_path, spool_upload
+from .excel_service import _apply_rules_safe, prepare_export_tables_timed, record_prepared
+from .rules_registry import RuleSet, get_rules_registry
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_FORMATS = ("auto", "xlsx", "zip")
+
+_INVALID_SHEET_CHARS = re.compile(r"[\[\]:*?/\\]")
+
+
+class BatchInput:
+    """One workbook of a batch: its file on disk, display name, sheets (None = all)
+    and SHA-256 when already known (hashed on demand for the sheet cache otherwise)."""
+
+    def __init__(self, path: Union[str, Path], filename: Optional[str] = None,
+                 sheets: Optional[Sequence[str]] = None, digest: Optional[str] = None):
+        self.path = Path(path)
+        self.filename = filename or self.path.name
+        self.sheets = list(sheets) if sheets else None
+        self.digest = digest
+
+
+def workbook_sheet_names(path: Union[str, Path], digest: Optional[str] = None) -> List[str]:
+    with ExcelWorkbook(path, digest=digest) as wb:
+        return wb.sheet_names
+
+
+def sheets_for_file(selection: Optional[Sequence[str]], filename: str) -> Optional[List[str]]:
+    """Sheets of `filename` named in `selection` (None = every sheet of the workbook).
+
+    Entries are either a plain sheet name, which applies to every file, or
+    `<filename>:<sheet>` for one file only (Excel sheet names cannot contain `:`).
+    """
+    if not selection:
+        return None
+    sheets = []
+    for entry in selection:
+        target, sep, sheet = entry.rpartition(":")
+        if not sep:
+            sheets.append(entry)
+        elif target == filename:
+            sheets.append(sheet)
+    return sheets or None
+
+
+def _unique_sheet_name(name: str, used: Set[str]) -> str:
+    """Excel-safe sheet name (max 31 chars, no []:*?/\\), unique within `used`."""
+    base = _INVALID_SHEET_CHARS.sub("_", name)[:31] or "Sheet"
+    candidate, n = base, 1
+    while candidate.lower() in used:
+        n += 1
+        suffix = f"~{n}"
+        candidate = base[:31 - len(suffix)] + suffix
+    used.add(candidate.lower())
+    return candidate
+
+
+async def _export_sheet(item: BatchInput, sheet: str, ruleset: RuleSet, explicit: bool,
+                        rules_slots: asyncio.Semaphore) -> Dict[str, pd.DataFrame]:
+    try:
+        tables, timings, memory = await run_cpu(prepare_export_tables_timed, str(item.path), sheet, item.digest)
+    except ValueError as e:
+        if explicit:
+            raise ValueError(f"{item.filename}: {e}")
+        # whole-workbook mode: sheets without usable data are skipped
+        logger.info("Skipping sheet '%s' of %s: %s", sheet, item.filename, e)
+        return {}
+    record_prepared(sheet, timings, memory)
+    if not explicit:
+        tables = {name: df for name, df in tables.items() if not df.empty}
+
+    async def apply(df: pd.DataFrame) -> pd.DataFrame:
+        async with rules_slots:
+            return await run_io(_apply_rules_safe, df, ruleset)
+
+    results = await asyncio.gather(*(apply(df) for df in tables.values()))
+    return dict(zip(tables.keys(), results))
+
+
+async def run_batch(items: Sequence[BatchInput], rules_id: Optional[str] = None,
+                    output: str = "auto") -> Tuple[Path, str]:
+    """Export every requested sheet of every input; returns (spool file, download name).
+
+    `output`: `xlsx` (one workbook, sheets named `<file>_<table>` when there are
+    several inputs), `zip` (one workbook per input) or `auto` (xlsx for a single
+    input, zip otherwise). At most `BATCH_MAX_TABLES_IN_FLIGHT` tables (default 4)
+    are in rule application at once, which bounds concurrent LLM calls to that many
+    times `LLM_MAX_CONCURRENCY`. The caller owns and must delete the returned file.
+    """
+    if output not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format '{output}'. Use one of {list(OUTPUT_FORMATS)}")
+    if not items:
+        raise ValueError("No input files")
+    if output == "auto":
+        output = "xlsx" if len(items) == 1 else "zip"
+    ruleset = get_rules_registry().get(rules_id)
+    rules_slots = asyncio.Semaphore(max(1, env_int("BATCH_MAX_TABLES_IN_FLIGHT", 4)))
+
+    jobs = []
+    for idx, item in enumerate(items):
+        if item.digest is None and get_sheet_cache() is not None:
+            item.digest = await run_io(file_sha256, item.path)
+        sheets = item.sheets or await run_io(workbook_sheet_names, item.path, item.digest)
+        for sheet in sheets:
+            jobs.append((idx, _export_sheet(item, sheet, ruleset, bool(item.sheets), rules_slots)))
+    results = await asyncio.gather(*(coro for _, coro in jobs))
+
+    per_file: List[Dict[str, pd.DataFrame]] = [{} for _ in items]
+    for (idx, _), tables in zip(jobs, results):
+        per_file[idx].update(tables)
+    if not any(per_file):
+        raise ValueError("No tables found in the selected files and sheets")
+
+    if output == "xlsx":
+        used: Set[str] = set()
+        sheets_out: Dict[str, pd.DataFrame] = {}
+        for item, tables in zip(items, per_file):
+            for name, df in tables.items():
+                label = name if len(items) == 1 else f"{Path(item.filename).stem}_{name}"
+                sheets_out[_unique_sheet_name(label, used)] = df
+        out_path = spool_path(suffix=".xlsx")
+        try:
+            await run_cpu(dataframe_to_excel_file, sheets_out, str(out_path))
+        except BaseException:
+            out_path.unlink(missing_ok=True)
+            raise
+        name = f"modified_{items[0].filename}" if len(items) == 1 else "modified_batch.xlsx"
+        return out_path, name
+
+    # zip: write the per-file workbooks in parallel, then store them (already compressed)
+    parts: List[Tuple[str, Path]] = []
+    writes = []
+    names_used: Set[str] = set()
+    for item, tables in zip(items, per_file):
+        if not tables:
+            continue
+        used = set()
+        sheets_out = {_unique_sheet_name(name, used): df for name, df in tables.items()}
+        arcname = f"modified_{Path(item.filename).stem}.xlsx"
+        n = 1
+        while arcname in names_used:
+            n += 1
+            arcname = f"modified_{Path(item.filename).stem}_{n}.xlsx"
+        names_used.add(arcname)
+        part = spool_path(suffix=".xlsx")
+        parts.append((arcname, part))
+        writes.append(run_cpu(dataframe_to_excel_file, sheets_out, str(part)))
+    out_path = spool_path(suffix=".zip")
+    try:
+        await asyncio.gather(*writes)
+        await run_io(_write_zip, out_path, parts)
+    except BaseException:
+        out_path.unlink(missing_ok=True)
+        raise
+    finally:
+        for _, part in parts:
+            part.unlink(missing_ok=True)
+    return out_path, "modified_batch.zip"
+
+
+async def process_batch_upload(files: Sequence[UploadFile], sheets: Optional[Sequence[str]] = None,
+                               rules_id: Optional[str] = None, output: str = "auto") -> Tuple[Path, str]:
+    """Spool every upload to disk and run `run_batch` on them as one admitted export.
+
+    The estimated cost is the sum over the inputs (see `admission`), since the
+    tables of every input are held until the output is written. `sheets` is a
+    selection as understood by `sheets_for_file`. The caller owns and must delete
+    the returned file.
+    """
+    get_rules_registry().get(rules_id)
+    uploads: List[SpooledUpload] = []
+    try:
+        for file in files:
+            uploads.append(await spool_upload(file))
+        items = [BatchInput(u.path, u.filename, sheets_for_file(sheets, u.filename), u.sha256)
+                 for u in uploads]
+        costs = [await run_io(estimate_export, u.path, u.size, item.sheets) for u, item in zip(uploads, items)]
+        cost = sum(costs[1:], costs[0]) if costs else ExportCost(0, 0)
+        async with get_governor().admit(cost):
+            return await run_batch(items, rules_id=rules_id, output=output)
+    finally:
+        for upload in uploads:
+            upload.cleanup()
+
+
+def _write_zip(path: Path, parts: List[Tuple[str, Path]]) -> None:
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_STORED) as zf:
+        for arcname, part in parts:
+            zf.write(part, arcname)
+
+
+__all__ = ["BatchInput", "OUTPUT_FORMATS", "process_batch_upload", "run_batch", "sheets_for_file",
+           "workbook_sheet_names"]
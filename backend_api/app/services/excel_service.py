@@ -1,90 +1,310 @@
 from fastapi import UploadFile
 from typing import Tuple, Dict, Any
-from ..utils.excel_utils import read_excel_from_upload, dataframe_to_excel_bytes, normalize_dataframe
-from ..services.llm_service import apply_rules_to_df
+from ..utils.excel_utils import (ExcelWorkbook, blank_mask, read_excel_from_upload, dataframe_to_excel_bytes,
+                                 dataframe_to_excel_file, normalize_dataframe)
+from ..utils.admission import estimate_export, get_governor
+from ..utils.executors import run_cpu, run_io
+from ..utils.export_cache import get_export_cache
+from ..utils.metrics import BYTES_BUCKETS, SIZE_BUCKETS, get_metrics, record_timing, stage_timer
+from ..utils.sheet_cache import file_sha256, get_sheet_cache
+from ..utils.uploads import spool_path, spool_upload
+from ..services.llm_service import ChunkCallback, FallbackCallback, apply_rules_to_df, engine_fingerprint
+from ..services.rules_registry import RuleSet, get_rules_registry
+from ..services.table_detection import bounding_box, detect_regions, occupancy_matrix, row_segments
+from ..utils.dtype_inference import compact_tables, compact_types_enabled, shallow_memory_bytes
 from pathlib import Path
-import json
+import asyncio
+import logging
+import time
 
 # Additional imports for table cleaning utilities
-import io
 import re
-from typing import List, Optional
+from typing import Callable, Iterable, List, Optional, Union
 import pandas as pd
 import numpy as np
 
+logger = logging.getLogger(__name__)
+
 BASE_DIR = Path(__file__).resolve().parents[3]
 DATA_DIR = BASE_DIR / "data"
-SAMPLE_RULES = DATA_DIR / "sample3_test.json" 
+
+# Pipeline stages reported to `export_from_path` progress callbacks, in order
+EXPORT_STAGES = ("parsed", "tables_detected", "chunks_transformed", "written")
+ProgressCallback = Callable[..., None]
+# Part of the sheet cache key of prepared tables: bump when detection or cleaning
+# changes what `prepare_export_tables` returns for the same workbook
+TABLES_VERSION = "5"
 
 
-async def process_export(file: UploadFile, sheet: str) -> Tuple[bytes, str]:
+async def process_export(file: UploadFile, sheet: str, rules_id: Optional[str] = None) -> Tuple[bytes, str]:
     """
     Read uploaded excel, apply rules (via LLM service), return bytes and filename.
+
+    Convenience wrapper over `process_export_to_file` for callers that want the
+    result in memory; the HTTP endpoint streams the file instead.
+    """
+    out_path, out_name = await process_export_to_file(file, sheet, rules_id=rules_id)
+    try:
+        return out_path.read_bytes(), out_name
+    finally:
+        out_path.unlink(missing_ok=True)
+
+
+async def process_export_to_file(file: UploadFile, sheet: str,
+                                 rules_id: Optional[str] = None) -> Tuple[Path, str]:
+    """
+    Read uploaded excel, apply rules (via LLM service) and write the result to a
+    spool file. Returns (path, filename); the caller owns and must delete the file.
+
+    The upload is streamed in chunks to a spool file (size limit enforced while
+    streaming, `UploadTooLargeError`); workers get its path, never the bytes.
+    The export is then estimated and admitted by the resource governor (see
+    `admission`): it raises `ExportTooLargeError` for exports over the limit of
+    one export and `ExecutorSaturatedError` when the worker stays saturated.
+
+    Results are kept in the export cache (see `export_cache`) under the upload's
+    SHA-256, the sheet, the rule set version and the engine; re-posting the same
+    workbook skips parsing, detection, rule application and writing.
+
+    `rules_id` selects a rule set from the rules registry (default rule set if None).
     """
-    # Read raw bytes once and try advanced detection/cleaning
-    contents = await file.read()
+    # Resolve rules first: an unknown id fails before any upload is read
+    ruleset = get_rules_registry().get(rules_id)
+
+    # Spool the upload to disk; parsers open the file instead of an in-memory copy
+    with stage_timer("upload"):
+        upload = await spool_upload(file)
+    _export_bytes().observe(upload.size, kind="upload")
+    with upload:
+        cost = await run_io(estimate_export, upload.path, upload.size, [sheet])
+        async with get_governor().admit(cost):
+            out_path = await export_cached(upload.path, upload.sha256, sheet, ruleset)
+
+    out_name = f"modified_{file.filename}"
+    return out_path, out_name
+
+
+async def process_workbook_export(workbook: Dict[str, Any], sheet: str,
+                                  rules_id: Optional[str] = None) -> Tuple[Path, str]:
+    """`process_export_to_file` for a workbook uploaded earlier (see `workbook_store`).
 
-    # Try to detect and clean tabular blocks per sheet using advanced heuristics
+    Nothing is uploaded: the stored file is exported, through the same admission
+    control and export cache. Returns (path, filename); the caller deletes the file.
+    """
+    ruleset = get_rules_registry().get(rules_id)
+    if sheet not in workbook["sheet_names"]:
+        raise ValueError(f"Sheet '{sheet}' not found. Available: {workbook['sheet_names']}")
+    cost = await run_io(estimate_export, workbook["path"], workbook["size"], [sheet])
+    async with get_governor().admit(cost):
+        out_path = await export_cached(Path(workbook["path"]), workbook["sha256"], sheet, ruleset)
+    return out_path, f"modified_{workbook['filename']}"
+
+
+async def export_cached(source: Path, sha256: Optional[str], sheet: str, ruleset: RuleSet,
+                        out_path: Optional[Path] = None,
+                        progress: Optional[ProgressCallback] = None) -> Path:
+    """`export_from_path` through the export cache; writes to `out_path` (default: a new spool file).
+
+    A cache hit only copies the stored result: `progress` then sees no stage events.
+    Without a `sha256` the cache is skipped. Results where rules fell back to the
+    deterministic engine (LLM errors, open circuit breaker) are not stored, so the
+    next export retries the LLM. `out_path` is removed on failure.
+    """
+    out_path = out_path if out_path is not None else spool_path(suffix=".xlsx")
+    cache = get_export_cache() if sha256 else None
+    cache_key = cache and cache.make_key(sha256, sheet, ruleset.id, ruleset.version, engine_fingerprint())
     try:
-        cleaned_map = detect_and_clean_tables_from_bytes(contents)
-    except Exception:
-        cleaned_map = {}
+        with stage_timer("cache"):
+            hit = cache is not None and await run_io(cache.fetch, cache_key, out_path)
+        if not hit:
+            fallbacks: List[str] = []
+            await export_from_path(source, sheet, ruleset, out_path, progress=progress, digest=sha256,
+                                   on_fallback=fallbacks.append)
+            if cache is not None and fallbacks:
+                logger.info("Not caching export of sheet '%s': rules fell back (%s)",
+                            sheet, ", ".join(sorted(set(fallbacks))))
+            elif cache is not None:
+                try:
+                    await run_io(cache.store, cache_key, out_path, ruleset.id, ruleset.version)
+                except OSError as e:
+                    logger.warning("Could not cache export of sheet '%s': %s", sheet, e)
+    except BaseException:
+        out_path.unlink(missing_ok=True)
+        raise
+    return out_path
+
+
+async def export_from_path(source: Union[str, Path], sheet: str, ruleset: RuleSet,
+                           out_path: Union[str, Path],
+                           progress: Optional[ProgressCallback] = None, digest: Optional[str] = None,
+                           on_fallback: Optional[FallbackCallback] = None) -> Path:
+    """Run the export pipeline on the workbook at `source` and write the result to `out_path`.
+
+    Parsing/cleaning and xlsx writing (constant-memory, see `write_excel`) go to the
+    CPU executor and rule application (LLM calls) to the I/O thread pool.
+    `progress(stage, **info)` is called after each of `EXPORT_STAGES` and, from I/O
+    threads, with stage "chunk" (`table`, `index`, `total`) for every LLM row batch.
+    Stage durations (`parse`, `detect`, `types` or `sheet_cache`, `rules`, `write`), rows,
+    cells, output bytes and table memory are recorded in the metrics registry. `digest` is the
+    workbook's SHA-256 when the caller already knows it (see `prepare_export_tables`).
+    `on_fallback(reason)` is called, from I/O threads, whenever rule application fell back.
+    """
+    def report(stage: str, **info: Any) -> None:
+        if progress is not None:
+            progress(stage, **info)
+
+    # parsing and table detection happen in one CPU task (they share the parse)
+    tables, timings, memory = await run_cpu(prepare_export_tables_timed, str(source), sheet, digest)
+    record_prepared(sheet, timings, memory)
+    report("parsed", sheet=sheet)
+    report("tables_detected", tables=list(tables))
+
+    # Apply rules to every table concurrently; each call may block on the LLM
+    def on_chunk(table: str) -> Optional[ChunkCallback]:
+        if progress is None:
+            return None
+        return lambda idx, total: progress("chunk", table=table, index=idx, total=total)
+
+    with stage_timer("rules"):
+        results = await asyncio.gather(*(run_io(_apply_rules_safe, tbl, ruleset, on_chunk(name), on_fallback)
+                                         for name, tbl in tables.items()))
+    out_sheets: Dict[str, pd.DataFrame] = dict(zip(tables.keys(), results))
+    rows = sum(len(df) for df in results)
+    _export_size().observe(rows, unit="rows")
+    _export_size().observe(sum(df.size for df in results), unit="cells")
+    report("chunks_transformed", rows=rows)
+
+    # Write the workbook (may contain multiple sheets) straight to the output file
+    with stage_timer("write"):
+        await run_cpu(dataframe_to_excel_file, out_sheets, str(out_path))
+    size = Path(out_path).stat().st_size
+    _export_bytes().observe(size, kind="output")
+    report("written", bytes=size)
+    return Path(out_path)
+
+
+def _export_size():
+    return get_metrics().histogram("export_size", "Rows and cells per exported workbook", SIZE_BUCKETS, ("unit",))
+
+
+def _export_bytes():
+    return get_metrics().histogram("export_bytes", "Uploaded and written workbook sizes", BYTES_BUCKETS, ("kind",))
+
+
+def record_prepared(sheet: str, timings: Dict[str, float], memory: Dict[str, int]) -> None:
+    """Record what `prepare_export_tables_timed` measured in a worker: stage timings and
+    the tables' memory before and after type inference (`table_memory_bytes{state,measure}`;
+    `measure` is `shallow` when `TABLE_COMPACT_TYPES` is off)."""
+    for stage, seconds in timings.items():
+        record_timing(stage, seconds)
+    if not memory:
+        return
+    measure = "deep" if compact_types_enabled() else "shallow"
+    histogram = get_metrics().histogram("table_memory_bytes", "Memory of the tables of an exported sheet",
+                                        BYTES_BUCKETS, ("state", "measure"))
+    for state in ("before", "after"):
+        histogram.observe(memory[state], state=state, measure=measure)
+    logger.info("Tables of sheet '%s': %.1f MB with compact types (%.1f MB as parsed, %s)",
+                sheet, memory["after"] / 1024 ** 2, memory["before"] / 1024 ** 2, measure)
+
+
+def prepare_export_tables(source: Union[bytes, str, Path], sheet: str,
+                          digest: Optional[str] = None) -> Dict[str, pd.DataFrame]:
+    """Parse the workbook and return the tables to transform, keyed by output sheet name.
+
+    `source` is a workbook path (preferred: only the path is pickled to the worker)
+    or raw bytes. Runs in the CPU executor, so it must stay a picklable
+    module-level function.
+
+    Results are kept in the sheet cache under the workbook's SHA-256 (`digest`,
+    hashed from `source` when not given), the sheet and `TABLES_VERSION`: a later
+    export of the same workbook, with any rules, loads them instead of parsing.
+    """
+    return prepare_export_tables_timed(source, sheet, digest)[0]
+
 
-    df = None
-    if sheet in cleaned_map and cleaned_map[sheet]:
-        # Use the first detected table for the requested sheet
-        df = cleaned_map[sheet][0]
+def prepare_export_tables_timed(source: Union[bytes, str, Path], sheet: str, digest: Optional[str] = None
+                                ) -> Tuple[Dict[str, pd.DataFrame], Dict[str, float], Dict[str, int]]:
+    """`prepare_export_tables` plus the seconds spent in its `parse`, `detect` and `types`
+    stages and the tables' memory in bytes `before` and `after` type inference (see
+    `dtype_inference`). With `TABLE_COMPACT_TYPES=0` there is no `types` stage and the
+    memory is only the shallow size of the column arrays, the same before and after.
+
+    A sheet cache hit reports a single `sheet_cache` stage instead (and the memory
+    measured when the entry was stored). Both are returned rather than recorded
+    because this runs in a worker process; the caller records them with
+    `record_prepared`.
+    """
+    start = time.perf_counter()
+    cache = get_sheet_cache()
+    if cache is None:
+        digest = None
+    elif digest is None:
+        digest = file_sha256(source)
+    compact = compact_types_enabled()
+    variant = TABLES_VERSION + ("-typed" if compact else "")
+    key = cache.make_key(digest, "tables", sheet, variant) if digest else None
+    if key is not None:
+        entry = cache.load(key)
+        if entry is not None:
+            return entry[0], {"sheet_cache": time.perf_counter() - start}, entry[1]["memory"]
+
+    tables, timings = _prepare_tables(source, sheet, digest, start)
+    if compact:
+        typed = time.perf_counter()
+        tables, memory = compact_tables(tables)
+        timings["types"] = time.perf_counter() - typed
     else:
-        # Fallback: read sheet and normalize using existing heuristics
-        import io as _io
+        shallow = sum(shallow_memory_bytes(df) for df in tables.values())
+        memory = {"before": shallow, "after": shallow}
+    if key is not None:
         try:
-            with _io.BytesIO(contents) as b:
-                xl = pd.ExcelFile(b)
-                if sheet not in xl.sheet_names:
-                    raise ValueError(f"Sheet '{sheet}' not found. Available: {xl.sheet_names}")
-                raw_df = pd.read_excel(xl, sheet_name=sheet, header=None, engine="openpyxl")
-                df = normalize_dataframe(raw_df)
-        except ValueError:
-            # re-raise sheet not found
-            raise
+            cache.store(key, digest, tables, {"memory": memory})
         except Exception as e:
-            raise ValueError(f"Failed reading sheet '{sheet}': {e}")
+            logger.warning("Could not cache tables of sheet '%s': %s", sheet, e)
+    return tables, timings, memory
 
-    # Load rules if available
-    rules: Dict[str, Any] = {}
-    print(f"Loading sample rules from {SAMPLE_RULES}")
-    print(f"Existe: {SAMPLE_RULES.exists()}")
-    if SAMPLE_RULES.exists():
+
+def _prepare_tables(source: Union[bytes, str, Path], sheet: str, digest: Optional[str],
+                    start: float) -> Tuple[Dict[str, pd.DataFrame], Dict[str, float]]:
+    with ExcelWorkbook(source, digest=digest) as wb:
+        if not wb.has_sheet(sheet):
+            raise ValueError(f"Sheet '{sheet}' not found. Available: {wb.sheet_names}")
+        wb.sheet(sheet)
+        parsed = time.perf_counter()
+        timings = {"parse": parsed - start}
+
+        # Try to detect and clean tabular blocks using advanced heuristics; only the
+        # requested sheet is parsed and the parse is reused by the fallback below
         try:
-            rules = json.loads(SAMPLE_RULES.read_text(encoding="utf-8"))
-            print(f"Loaded sample rules from {SAMPLE_RULES}")
+            cleaned_map = detect_and_clean_tables(wb, sheets=[sheet])
         except Exception:
-            rules = {}
-
-    # Apply rules
-    out_sheets: Dict[str, pd.DataFrame] = {}
-    if sheet in cleaned_map and cleaned_map[sheet]:
-        # multiple detected tables -> apply rules to each and export as separate sheets
-        for idx, tbl in enumerate(cleaned_map[sheet], start=1):
-            name = f"{sheet}_Table{idx}"
-            try:
-                out_df = apply_rules_to_df(tbl, rules)
-            except Exception:
-                out_df = tbl
-            out_sheets[name] = out_df
-    else:
-        # Single sheet fallback
+            cleaned_map = {}
+
+        if sheet in cleaned_map and cleaned_map[sheet]:
+            # multiple detected tables -> apply rules to each and export as separate sheets
+            timings["detect"] = time.perf_counter() - parsed
+            return {f"{sheet}_Table{idx}": tbl for idx, tbl in enumerate(cleaned_map[sheet], start=1)}, timings
+
+        # Fallback: normalize the already parsed sheet using existing heuristics
         try:
-            new_df = apply_rules_to_df(df, rules)
-        except Exception:
-            new_df = df
-        out_sheets[sheet] = new_df
+            df = normalize_dataframe(wb.sheet(sheet))
+        except Exception as e:
+            raise ValueError(f"Failed reading sheet '{sheet}': {e}")
+    timings["detect"] = time.perf_counter() - parsed
+    return {sheet: df}, timings
 
-    # Write back to excel bytes (may contain multiple sheets)
-    out_bytes = dataframe_to_excel_bytes(out_sheets)
 
-    out_name = f"modified_{file.filename}"
-    return out_bytes, out_name
+def _apply_rules_safe(df: pd.DataFrame, ruleset: RuleSet,
+                      on_chunk: Optional[ChunkCallback] = None,
+                      on_fallback: Optional[FallbackCallback] = None) -> pd.DataFrame:
+    try:
+        return apply_rules_to_df(df, ruleset.rules, compiled=ruleset.compiled, on_chunk=on_chunk,
+                                 on_fallback=on_fallback)
+    except Exception:
+        if on_fallback is not None:
+            on_fallback("exception")
+        return df
 
 
 # -------------------------
@@ -106,20 +326,11 @@ def slugify_header(s) -> str:
 
 def trim_edges(df: pd.DataFrame) -> pd.DataFrame:
     """Trim fully-empty rows/columns from the four edges of the DataFrame."""
-    out = df.copy()
-    # Top
-    while len(out) and out.isna().all(axis=1).iloc[0]:
-        out = out.iloc[1:, :]
-    # Bottom
-    while len(out) and out.isna().all(axis=1).iloc[-1]:
-        out = out.iloc[:-1, :]
-    # Left
-    while out.shape[1] and out.isna().all(axis=0).iloc[0]:
-        out = out.iloc[:, 1:]
-    # Right
-    while out.shape[1] and out.isna().all(axis=0).iloc[-1]:
-        out = out.iloc[:, :-1]
-    return out
+    box = bounding_box(occupancy_matrix(df))
+    if box is None:
+        return df.iloc[0:0, 0:0].copy()
+    r0, r1, c0, c1 = box
+    return df.iloc[r0 : r1 + 1, c0 : c1 + 1].copy()
 
 
 def find_segments(non_null_counts: List[int],
@@ -129,21 +340,7 @@ def find_segments(non_null_counts: List[int],
 
     Returns a list of (start_idx, end_idx) pairs.
     """
-    good = [i for i, c in enumerate(non_null_counts) if c >= min_non_null]
-    if not good:
-        return []
-    segs = []
-    start = prev = good[0]
-    for r in good[1:]:
-        if r == prev + 1:
-            prev = r
-        else:
-            if prev - start + 1 >= min_rows:
-                segs.append((start, prev))
-            start = prev = r
-    if prev - start + 1 >= min_rows:
-        segs.append((start, prev))
-    return segs
+    return row_segments(non_null_counts, min_non_null=min_non_null, min_rows=min_rows)
 
 
 def clean_block(block: pd.DataFrame) -> Optional[pd.DataFrame]:
@@ -161,7 +358,8 @@ def clean_block(block: pd.DataFrame) -> Optional[pd.DataFrame]:
         return None
 
     # Header row: first row with >= 2 non-empty cells, default 0
-    header_idx = next((i for i in range(len(block)) if block.iloc[i].notna().sum() >= 2), 0)
+    header_candidates = np.flatnonzero(block.notna().to_numpy().sum(axis=1) >= 2)
+    header_idx = int(header_candidates[0]) if len(header_candidates) else 0
     cols = [slugify_header(x) for x in block.iloc[header_idx].tolist()]
     data = block.iloc[header_idx + 1 :].copy()
     if data.shape[0] == 0:
@@ -171,53 +369,58 @@ def clean_block(block: pd.DataFrame) -> Optional[pd.DataFrame]:
     data = data.iloc[:, : len(cols)]
     data.columns = cols
 
+    # One emptiness mask (NaN or blank string) drives both column and row dropping
+    empty = blank_mask(data)
+
     # Drop fully-empty or blank-only columns
-    keep_cols = []
-    for c in data.columns:
-        col = data[c]
-        if not (col.isna().all() or (col.astype(str).str.strip() == "").all()):
-            keep_cols.append(c)
-    data = data[keep_cols]
-    if data.shape[1] == 0:
+    keep_cols = ~empty.all(axis=0)
+    if not keep_cols.any():
         return None
+    data = data.iloc[:, keep_cols]
 
     # Drop empty rows
-    mask_empty_row = data.isna().all(axis=1) | data.astype(str).apply(lambda x: x.str.strip()).eq("").all(axis=1)
-    data = data.loc[~mask_empty_row].reset_index(drop=True)
+    keep_rows = ~empty[:, keep_cols].all(axis=1)
+    data = data.iloc[keep_rows].reset_index(drop=True)
     if data.empty:
         return None
 
-    # Try to convert numeric-ish columns
-    for c in data.columns:
-        data[c] = pd.to_numeric(data[c], errors="ignore")
+    # Try to convert numeric-ish columns (only object columns can change); compact
+    # types for the export are chosen later, see `dtype_inference`
+    for i, dt in enumerate(data.dtypes):
+        if dt == object:
+            try:
+                data.isetitem(i, pd.to_numeric(data.iloc[:, i]))
+            except (ValueError, TypeError):
+                pass
 
     return data
 
 
-def detect_and_clean_tables_from_bytes(excel_bytes: bytes,
-                                       min_non_null: int = 2,
-                                       min_rows: int = 2) -> Dict[str, List[pd.DataFrame]]:
-    """Read an Excel file from bytes and detect/clean tabular blocks per sheet.
+def detect_and_clean_tables(workbook: ExcelWorkbook,
+                            sheets: Optional[Iterable[str]] = None,
+                            min_non_null: int = 2,
+                            min_rows: int = 2,
+                            min_col_gap: int = 2) -> Dict[str, List[pd.DataFrame]]:
+    """Detect/clean tabular blocks for `sheets` (default: all) of an opened workbook.
+
+    Sheets that are not requested are never parsed. Tables are located on the sheet's
+    occupancy bitmap (see `table_detection`): stacked tables are split on sparse rows
+    and side-by-side tables on runs of at least `min_col_gap` empty columns (a
+    single blank column inside a table does not split it).
 
     Returns a dict: {sheet_name: [cleaned_table_df, ...], ...}
     """
     out: Dict[str, List[pd.DataFrame]] = {}
-    with io.BytesIO(excel_bytes) as b:
-        sheets = pd.read_excel(b, sheet_name=None, header=None, engine="openpyxl")
-
-    for sheet_name, df in sheets.items():
-        df = trim_edges(df)
-        if df.empty:
-            continue
+    names = workbook.sheet_names if sheets is None else [s for s in sheets if workbook.has_sheet(s)]
 
-        non_null_counts = df.notna().sum(axis=1).tolist()
-        segs = find_segments(non_null_counts, min_non_null=min_non_null, min_rows=min_rows)
-        if not segs:
-            segs = [(0, len(df) - 1)]
+    for sheet_name in names:
+        df = workbook.sheet(sheet_name)
+        occ = occupancy_matrix(df)
 
         cleaned_tables: List[pd.DataFrame] = []
-        for (r0, r1) in segs:
-            block = df.iloc[r0 : r1 + 1, :]
+        for (r0, r1, c0, c1) in detect_regions(occ, min_non_null=min_non_null, min_rows=min_rows,
+                                               min_col_gap=min_col_gap):
+            block = df.iloc[r0 : r1 + 1, c0 : c1 + 1]
             cleaned = clean_block(block)
             if cleaned is None or cleaned.empty:
                 continue
@@ -229,10 +432,37 @@ def detect_and_clean_tables_from_bytes(excel_bytes: bytes,
     return out
 
 
+def detect_and_clean_tables_from_bytes(excel_bytes: Union[bytes, ExcelWorkbook],
+                                       min_non_null: int = 2,
+                                       min_rows: int = 2,
+                                       sheets: Optional[Iterable[str]] = None,
+                                       reader: Optional[str] = None) -> Dict[str, List[pd.DataFrame]]:
+    """Read an Excel file from bytes (or an opened `ExcelWorkbook`) and detect/clean tabular blocks per sheet.
+
+    `reader` names the spreadsheet backend (see `excel_readers`, default `EXCEL_READER`).
+    Returns a dict: {sheet_name: [cleaned_table_df, ...], ...}
+    """
+    if isinstance(excel_bytes, ExcelWorkbook):
+        return detect_and_clean_tables(excel_bytes, sheets=sheets, min_non_null=min_non_null, min_rows=min_rows)
+    with ExcelWorkbook(excel_bytes, reader=reader) as wb:
+        return detect_and_clean_tables(wb, sheets=sheets, min_non_null=min_non_null, min_rows=min_rows)
+
+
 __all__ = [
+    "process_export",
+    "process_export_to_file",
+    "process_workbook_export",
+    "export_cached",
+    "export_from_path",
+    "EXPORT_STAGES",
+    "TABLES_VERSION",
+    "prepare_export_tables",
+    "prepare_export_tables_timed",
+    "record_prepared",
     "slugify_header",
     "trim_edges",
     "find_segments",
     "clean_block",
+    "detect_and_clean_tables",
     "detect_and_clean_tables_from_bytes",
 ]
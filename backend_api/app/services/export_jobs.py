@@ -0,0 +1,234 @@
+"""Background export jobs: submit an upload, poll its progress, download the result.
+
+Jobs are persisted in a `JobStore` (SQLite under `JOBS_DIR`) and processed by a
+small pool of asyncio workers running on the application event loop. The heavy
+work still goes through the CPU/I/O executors (see `export_from_path`), so the
+number of jobs in flight is bounded by `JOBS_WORKERS`, not by open connections.
+Jobs share the export cache with synchronous exports (see `export_cached`).
+Jobs share the resource governor with synchronous exports (see `admission`):
+jobs over the limit of one export are refused at submit time, the others wait
+for capacity before they run.
+"""
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from fastapi import UploadFile
+
+from ..utils.admission import estimate_export, get_governor
+from ..utils.config import env_float, env_int
+from ..utils.executors import ExecutorSaturatedError, run_io
+from ..utils.job_store import DONE, FAILED, QUEUED, JobStore, get_job_store, jobs_dir
+from ..utils.uploads import link_or_copy, spool_upload
+from .excel_service import export_cached
+from .rules_registry import get_rules_registry
+
+logger = logging.getLogger(__name__)
+
+
+class _JobProgress:
+    """Collects `export_from_path` progress events and persists them on the job.
+
+    Chunk events arrive from I/O threads, hence the lock.
+    """
+
+    def __init__(self, store: JobStore, job_id: str):
+        self.store = store
+        self.job_id = job_id
+        self.state: Dict[str, Any] = {"stages": {}, "tables": [], "chunks": {}}
+        self._lock = threading.Lock()
+
+    def __call__(self, stage: str, **info: Any) -> None:
+        with self._lock:
+            if stage == "chunk":
+                chunks = self.state["chunks"].setdefault(info["table"], {"done": 0, "total": info["total"]})
+                chunks["done"] += 1
+                self.store.update(self.job_id, progress=self.state)
+                return
+            self.state["stages"][stage] = time.time()
+            if stage == "tables_detected":
+                self.state["tables"] = info.get("tables", [])
+            self.store.update(self.job_id, stage=stage, progress=self.state)
+
+
+def describe_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Public view of a job record (no server-side paths)."""
+    progress = job.get("progress") or {}
+    chunks = (progress.get("chunks") or {}).values()
+    out = {
+        "id": job["id"],
+        "status": job["status"],
+        "stage": job["stage"],
+        "filename": job["filename"],
+        "sheet": job["params"].get("sheet"),
+        "rules_id": job["params"].get("rules_id"),
+        "stages": progress.get("stages", {}),
+        "tables": progress.get("tables", []),
+        "chunks_done": sum(c["done"] for c in chunks),
+        "chunks_total": sum(c["total"] for c in chunks),
+        "error": job["error"],
+        "created": job["created"],
+        "updated": job["updated"],
+    }
+    if job["status"] == DONE:
+        out["result_url"] = f"/jobs/{job['id']}/result"
+    return out
+
+
+class ExportJobRunner:
+    """Pool of `workers` asyncio tasks that claim queued jobs from `store` and run them.
+
+    `start()` must be called from the event loop that should run the jobs; it is
+    idempotent. Workers poll the store every `poll_interval` seconds (so jobs
+    submitted by other processes sharing the store are picked up too) and are woken
+    immediately by local submissions.
+    """
+
+    def __init__(self, store: JobStore, workers: int = 2, poll_interval: float = 1.0,
+                 stale_seconds: float = 600.0):
+        self.store = store
+        self.workers = max(1, workers)
+        self.poll_interval = poll_interval
+        self.stale_seconds = stale_seconds
+        self._tasks: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+
+    @property
+    def running(self) -> bool:
+        return any(not t.done() for t in self._tasks)
+
+    def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self.running:
+            return
+        self._loop = loop
+        self._wake = asyncio.Event()
+        requeued = self.store.requeue_stale(self.stale_seconds)
+        if requeued:
+            logger.warning("Requeued %d stale export job(s)", requeued)
+        self._tasks = [loop.create_task(self._worker(), name=f"export-job-{i}") for i in range(self.workers)]
+
+    async def stop(self) -> None:
+        tasks, self._tasks = self._tasks, []
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def submit(self, file: UploadFile, sheet: str, rules_id: Optional[str] = None) -> Dict[str, Any]:
+        """Spool the upload into the jobs directory and queue a job for it.
+
+        Raises ValueError for an unknown rules id, `ExecutorSaturatedError` when
+        `JOBS_MAX_QUEUED` jobs are already waiting and `ExportTooLargeError` for
+        an export over the limit of one export.
+        """
+        self._check_submit(rules_id)
+        self.start()
+        upload = await spool_upload(file, directory=str(jobs_dir()))
+        try:
+            get_governor().check(await run_io(estimate_export, upload.path, upload.size, [sheet]))
+            job = self.store.create({"sheet": sheet, "rules_id": rules_id, "sha256": upload.sha256},
+                                    filename=upload.filename, input_path=str(upload.path))
+        except BaseException:
+            upload.cleanup()
+            raise
+        self._wake.set()
+        return job
+
+    async def submit_workbook(self, workbook: Dict[str, Any], sheet: str,
+                              rules_id: Optional[str] = None) -> Dict[str, Any]:
+        """Queue a job for a stored workbook (see `workbook_store`) without uploading it again.
+
+        The job gets its own link to the file, so it survives the workbook expiring.
+        """
+        self._check_submit(rules_id)
+        if sheet not in workbook["sheet_names"]:
+            raise ValueError(f"Sheet '{sheet}' not found. Available: {workbook['sheet_names']}")
+        get_governor().check(await run_io(estimate_export, workbook["path"], workbook["size"], [sheet]))
+        self.start()
+        input_path = jobs_dir() / f"workbook_{uuid.uuid4().hex}{Path(workbook['path']).suffix}"
+        link_or_copy(Path(workbook["path"]), input_path)
+        try:
+            job = self.store.create({"sheet": sheet, "rules_id": rules_id, "sha256": workbook["sha256"],
+                                     "workbook_id": workbook["id"]},
+                                    filename=workbook["filename"], input_path=str(input_path))
+        except BaseException:
+            input_path.unlink(missing_ok=True)
+            raise
+        self._wake.set()
+        return job
+
+    def _check_submit(self, rules_id: Optional[str]) -> None:
+        # fail fast on an unknown rule set; the job resolves the current version when it runs
+        get_rules_registry().get(rules_id)
+        max_queued = env_int("JOBS_MAX_QUEUED", 100)
+        if max_queued > 0 and self.store.count(QUEUED) >= max_queued:
+            raise ExecutorSaturatedError(f"Export job queue is full ({max_queued} jobs waiting)", retry_after=30)
+
+    async def _worker(self) -> None:
+        while True:
+            job = self.store.claim_next()
+            if job is None:
+                self.store.purge()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+                continue
+            await self.run_job(job)
+
+    async def run_job(self, job: Dict[str, Any]) -> None:
+        job_id = job["id"]
+        params = job["params"]
+        result_path = jobs_dir() / f"{job_id}.xlsx"
+        input_path = Path(job["input_path"])
+        try:
+            ruleset = get_rules_registry().get(params.get("rules_id"))
+            cost = await run_io(estimate_export, input_path, input_path.stat().st_size, [params["sheet"]])
+            # queued jobs already waited their turn: wait for capacity instead of failing
+            async with get_governor().admit(cost, interactive=False):
+                await export_cached(input_path, params.get("sha256"), params["sheet"], ruleset,
+                                    out_path=result_path, progress=_JobProgress(self.store, job_id))
+        except asyncio.CancelledError:
+            # worker stopped: leave the job running so `requeue_stale` picks it up again
+            result_path.unlink(missing_ok=True)
+            raise
+        except Exception as e:
+            logger.warning("Export job %s failed: %s", job_id, e)
+            result_path.unlink(missing_ok=True)
+            input_path.unlink(missing_ok=True)
+            error = str(e) if isinstance(e, ValueError) else f"Export failed: {e}"
+            self.store.update(job_id, status=FAILED, error=error)
+            return
+        input_path.unlink(missing_ok=True)
+        self.store.update(job_id, status=DONE, stage="written", result_path=str(result_path),
+                          result_name=f"modified_{job['filename']}")
+
+
+_runner: Optional[ExportJobRunner] = None
+_runner_lock = threading.Lock()
+
+
+def get_job_runner() -> ExportJobRunner:
+    """Shared runner over the shared job store (`JOBS_WORKERS` workers, default 2)."""
+    global _runner
+    store = get_job_store()
+    with _runner_lock:
+        if _runner is None or _runner.store is not store:
+            _runner = ExportJobRunner(store, workers=env_int("JOBS_WORKERS", 2),
+                                      poll_interval=env_float("JOBS_POLL_SECONDS", 1.0),
+                                      stale_seconds=env_float("JOBS_STALE_SECONDS", 600.0))
+        return _runner
+
+
+async def shutdown_job_runner() -> None:
+    if _runner is not None:
+        await _runner.stop()
+
+
+__all__ = ["ExportJobRunner", "describe_job", "get_job_runner", "shutdown_job_runner"]
@@ -1,12 +1,30 @@
-from typing import Dict, Any, Optional
+from typing import Callable, Dict, Any, Iterator, List, Optional, Tuple
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+import csv
+import numpy as np
 import pandas as pd
 import os
 import re
 import io
-import time
-from pathlib import Path
-from datetime import datetime
 import logging
+import threading
+import time
+
+from ..utils.config import env_bool, env_int, env_str
+from ..utils.csv_stream import CsvStreamParser
+from ..utils.debug_artifacts import get_debug_writer
+from ..utils.llm_cache import get_llm_cache
+from ..utils.llm_client import CircuitBreaker, CircuitOpenError, get_llm_pool
+from ..utils.metrics import DURATION_BUCKETS, SIZE_BUCKETS, get_metrics
+from ..utils.token_budget import estimate_tokens, fit_chunk_rows, get_token_meter
+from .rules_compiler import UNIT_COLUMN_CANDIDATES, CompiledRules, compile_rules, normalize_column_name
+
+# Progress hook for transformed rows: (chunk_index, rows)
+RowsCallback = Callable[[int, List[List[str]]], None]
+# on_chunk(chunk_index, total_chunks) after each row batch finished (or fell back)
+ChunkCallback = Callable[[int, int], None]
+# on_fallback(reason) whenever rows fell back to deterministic rules (see `llm_fallbacks_total`)
+FallbackCallback = Callable[[str], None]
 
 
 # Prompts (adapted from test/llm.py)
@@ -79,156 +97,688 @@ def _call_openai_csv(system_prompt: str, user_prompt: str, model: str = "gpt-4o-
                      max_retries: int = 2, timeout: int = 30) -> str:
     """Call OpenAI ChatCompletion and expect text output containing a CSV.
 
-    Retries on failure with small backoff. Raises if unable to call.
+    Uses the shared pooled client (`llm_client.get_llm_pool`): connections are reused,
+    retries back off with jitter without blocking, and `CircuitOpenError` is raised
+    immediately while the provider is considered down. Raises if unable to call.
+    Prompt and completion tokens are recorded in the token meter.
     """
+    estimated_prompt = estimate_tokens(system_prompt + user_prompt, model)
+    started = time.perf_counter()
+    resp = get_llm_pool().complete(
+        [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt},
+        ],
+        model=model,
+        timeout=timeout,
+        max_retries=max_retries,
+        temperature=0,
+    )
+    _llm_call_seconds().observe(time.perf_counter() - started, mode="complete")
+    content = resp.choices[0].message.content
+    usage = getattr(resp, "usage", None)
+    if usage is not None:
+        get_token_meter().record(model, usage.prompt_tokens, usage.completion_tokens,
+                                 estimated_prompt_tokens=estimated_prompt)
+    else:
+        get_token_meter().record(model, estimated_prompt, estimate_tokens(content or "", model), estimated=True)
+    return content
+
+
+def _llm_call_seconds():
+    return get_metrics().histogram("llm_call_seconds", "Duration of successful LLM completions",
+                                   DURATION_BUCKETS, ("mode",))
+
+
+def _count_fallback(reason: str, n: int = 1, on_fallback: Optional[FallbackCallback] = None) -> None:
+    get_metrics().counter("llm_fallbacks_total", "Row batches or sheets that fell back to deterministic rules",
+                          ("reason",)).inc(n, reason=reason)
+    if on_fallback is not None:
+        on_fallback(reason)
+
+
+def _observe_rules(engine: str, started: float, rows: int) -> None:
+    """Record one `transform_sheet_with_rules` outcome (`compiled`, `llm` or `fallback`)."""
+    metrics = get_metrics()
+    metrics.histogram("rules_seconds", "Duration of rule application per table", DURATION_BUCKETS,
+                      ("engine",)).observe(time.perf_counter() - started, engine=engine)
+    metrics.histogram("rules_rows", "Rows per table by the engine that transformed them", SIZE_BUCKETS,
+                      ("engine",)).observe(rows, engine=engine)
+
+
+FALLBACK_LIMIT_COLUMNS = ("DANOS MATERIALES LIMITES", "ROBO TOTAL LIMITES")
+FALLBACK_DEDUCTIBLE_COLUMNS = ("DANOS MATERIALES DEDUCIBLES", "ROBO TOTAL DEDUCIBLES")
+
+
+def _infer_limits(u: Any) -> str:
+    """Legacy limit heuristic for units the rules don't cover."""
+    if pd.isna(u):
+        return "25000"
     try:
-        # lazy import to keep module import safe when openai not installed
-        import openai
+        s = str(u).lower()
     except Exception:
-        raise RuntimeError("openai package not available")
+        return "25000"
+    if "camion" in s or "truck" in s:
+        return "100000"
+    if "auto" in s or "car" in s or "vehiculo" in s:
+        return "50000"
+    return "25000"
 
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise RuntimeError("OPENAI_API_KEY not configured")
-    openai.api_key = api_key
 
-    attempt = 0
-    last_err = None
-    while attempt <= max_retries:
-        try:
-            from openai import OpenAI
-
-            # instantiate client with API key from environment (validated above)
-            client = OpenAI(api_key=api_key)
-
-            resp = client.chat.completions.create(
-                model=model,
-                temperature=0,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt},
-                ],
-                timeout=timeout,
-            )
-            text = resp.choices[0].message.content
-            return text
-        except Exception as e:
-            last_err = e
-            attempt += 1
-            time.sleep(1 + attempt * 0.5)
-    raise last_err
-
-
-def _mock_apply_rules(df: pd.DataFrame, rules: Dict[str, Any]) -> pd.DataFrame:
+def _fallback_value(column: str, unit: Any) -> str:
+    """Value for a unit that matches no rule type (keeps the historical defaults)."""
+    name = str(column).upper()
+    if name.endswith("LIMITES"):
+        return _infer_limits(unit)
+    if name.endswith("DEDUCIBLES"):
+        return "10 %"
+    return ""
+
+
+def _mock_apply_rules(df: pd.DataFrame, rules: Dict[str, Any],
+                      compiled: Optional[CompiledRules] = None) -> pd.DataFrame:
     """Deterministic fallback used when LLM is not available or fails.
 
-    This preserves existing heuristic logic previously implemented in apply_rules_to_df.
+    Rules with a `coberturas_por_tipo` table are applied through the compiled lookup
+    (LIMITES and DEDUCIBLES come from the rules); units the rules don't cover, and
+    rules without such a table, get the historical heuristic values. Every lookup
+    is done once per distinct unit value. Pass `compiled` to reuse a precompiled
+    form of `rules`.
     """
+    if compiled is None:
+        compiled = compile_rules(rules)
+    if compiled is not None:
+        out = compiled.apply(df, default=_fallback_value)
+        if out is None:
+            # no unit column: constant defaults per output column
+            out = df.copy()
+            for col in compiled.output_columns:
+                name = str(col).upper()
+                out[col] = "VALOR CONVENIDO" if name.endswith("LIMITES") else _fallback_value(col, None)
+        return out
+
     df = df.copy()
+    unit_col = next((c for c in df.columns if c and str(c).lower() in UNIT_COLUMN_CANDIDATES), None)
+    if unit_col is not None:
+        units = df[unit_col]
+        limits = units.map({u: _infer_limits(u) for u in pd.unique(units)})
+        for col in FALLBACK_LIMIT_COLUMNS:
+            df[col] = limits
+    else:
+        for col in FALLBACK_LIMIT_COLUMNS:
+            df[col] = "VALOR CONVENIDO"
+    return df
 
-    # find candidate column that describes unit type
-    col_candidates = [c for c in df.columns if c and str(c).lower() in ("unidad", "unit_type", "tipo_unidad", "tipo")]
-    unit_col = col_candidates[0] if col_candidates else None
 
-    def infer_limits(u):
-        if pd.isna(u):
-            return "25000"
+def _apply_compiled_rules(df: pd.DataFrame, rules: Dict[str, Any], engine: str,
+                          compiled: Optional[CompiledRules] = None) -> Optional[pd.DataFrame]:
+    """Apply the rules without the LLM when `engine` allows it.
+
+    `compiled` always uses the lookup (with fallback values for unknown units);
+    `auto` only when the rules are fully expressible as a lookup and every unit in
+    the sheet resolves to a rule type.
+    """
+    if engine not in ("auto", "compiled"):
+        return None
+    if compiled is None:
+        compiled = compile_rules(rules)
+    if compiled is None:
+        return None
+    unit_col = compiled.find_unit_column(df)
+    if unit_col is None:
+        return None
+    if engine == "compiled":
+        return compiled.apply(df, default=_fallback_value, unit_col=unit_col)
+    if compiled.complete and compiled.covers(pd.unique(df[unit_col])):
+        return compiled.apply(df, unit_col=unit_col)
+    return None
+
+
+def _save_llm_debug(raw: Optional[str], user_prompt: str, err: Exception, tag: str = "") -> None:
+    """Queue the raw LLM output (or the prompt and error) for data/llm_debug/; never blocks."""
+    logger = logging.getLogger(__name__)
+    logger.warning("LLM transform failed: %s", err, exc_info=True)
+    writer = get_debug_writer()
+    if writer is None:
+        return
+    text = raw if raw else f"{user_prompt}\n\n--ERROR: \n{err}"
+    writer.submit(text, tag=tag)
+
+
+# Rule keys that only describe the rules; they are not sent to the LLM
+DESCRIPTIVE_RULE_KEYS = ("descripcion",)
+# Example rows whose input side is cut down to the reference columns
+EXAMPLE_INPUT_KEY = "fila_original"
+# Bumped whenever compaction changes what the model is sent (part of `engine_fingerprint`)
+COMPACT_PROMPT_VERSION = 2
+# Expected completion tokens per column the rules add to every row
+ADDED_COLUMN_TOKENS = 8
+
+
+def _reference_names(rules: Any) -> List[str]:
+    """Column names in `reglas_asignacion.mapeo_columnas.columna_referencia` (a name or a list)."""
+    if not isinstance(rules, dict):
+        return []
+    mapping = (rules.get("reglas_asignacion") or {}).get("mapeo_columnas") or {}
+    refs = mapping.get("columna_referencia")
+    if not refs:
+        return []
+    return [refs] if isinstance(refs, str) else list(refs)
+
+
+def compact_rules(rules: Any, reference: Optional[set] = None) -> Any:
+    """`rules` without `DESCRIPTIVE_RULE_KEYS` (at any depth) and with shortened examples.
+
+    Example rows (`EXAMPLE_INPUT_KEY`) keep only their reference columns, so
+    mappings that exist only as examples (e.g. TANQUE -> 5 %) are still sent.
+    Notes and every other section are kept: they can carry instructions.
+    """
+    if reference is None:
+        reference = {normalize_column_name(r) for r in _reference_names(rules)}
+    if isinstance(rules, dict):
+        out = {}
+        for k, v in rules.items():
+            if k in DESCRIPTIVE_RULE_KEYS:
+                continue
+            if k == EXAMPLE_INPUT_KEY and isinstance(v, dict) and reference:
+                v = {c: x for c, x in v.items() if normalize_column_name(c) in reference} or v
+            out[k] = compact_rules(v, reference)
+        return out
+    if isinstance(rules, list):
+        return [compact_rules(v, reference) for v in rules]
+    return rules
+
+
+def _rule_terms(rules: Any, terms: Optional[set] = None) -> set:
+    """Normalized strings (keys and values) of `rules`; "A: TIPO DE UNIDAD" also yields its name."""
+    if terms is None:
+        terms = set()
+    if isinstance(rules, dict):
+        for k, v in rules.items():
+            _rule_terms(k, terms)
+            _rule_terms(v, terms)
+    elif isinstance(rules, list):
+        for v in rules:
+            _rule_terms(v, terms)
+    elif isinstance(rules, str):
+        terms.add(normalize_column_name(rules))
+        m = re.match(r"^\s*[A-Z]{1,3}\s*:\s*(.+)$", rules)
+        if m:
+            terms.add(normalize_column_name(m.group(1)))
+    return terms
+
+
+def _prompt_columns(df: pd.DataFrame, rules: Any) -> List[Any]:
+    """Columns of `df` the rules mention; all columns when the rules name none of them."""
+    terms = _rule_terms(rules)
+    used = [c for c in df.columns if normalize_column_name(c) in terms]
+    return used or list(df.columns)
+
+
+def _reattach_columns(df: pd.DataFrame, out: pd.DataFrame, dropped: List[Any]) -> Optional[pd.DataFrame]:
+    """Put the `dropped` columns of `df` back into the LLM result `out` at their original positions.
+
+    Needs the rows to have come back 1:1 and in order; None otherwise.
+    """
+    if len(out) != len(df):
+        logging.getLogger(__name__).warning(
+            "LLM returned %d rows for %d input rows; dropped columns cannot be re-attached", len(out), len(df))
+        return None
+    out = out.reset_index(drop=True)
+    positions = {c: i for i, c in enumerate(df.columns)}
+    for col in sorted(dropped, key=positions.get):
+        if col not in out.columns:
+            out.insert(min(positions[col], out.shape[1]), col, df[col].to_numpy())
+    return out
+
+
+def _budget_chunk_rows(df: pd.DataFrame, rules: Dict[str, Any], instructions_json: str, model: str,
+                       chunk_rows: int) -> int:
+    """`chunk_rows` lowered, if needed, so every request fits the model's context and output limits.
+
+    Row sizes are estimated on a sample of up to 200 rows; the completion is assumed
+    to repeat each row plus `ADDED_COLUMN_TOKENS` per column the rules add.
+    """
+    if df.empty:
+        return chunk_rows
+    sample = df.sample(n=min(200, len(df)), random_state=0) if len(df) > 200 else df
+    sample_csv = sample.to_csv(index=False)
+    header, _, body = sample_csv.partition("\n")
+    row_tokens = estimate_tokens(body, model) / len(sample)
+    fixed = estimate_tokens(PROMPT_SYSTEM, model) + estimate_tokens(
+        PROMPT_USER_TEMPLATE.format(instructions_json=instructions_json, csv_content=header,
+                                    sheet_name="sheet, parte 000/000"), model)
+    added = None
+    if isinstance(rules, dict):
+        added = (rules.get("reglas_asignacion") or {}).get("columnas_a_agregar")
+    out_row_tokens = row_tokens + ADDED_COLUMN_TOKENS * (len(added) if isinstance(added, list) else 4)
+    rows = fit_chunk_rows(fixed, row_tokens, out_row_tokens, model, configured=chunk_rows)
+    if rows and (chunk_rows <= 0 or rows < chunk_rows):
+        logging.getLogger(__name__).info(
+            "Sending %d rows per LLM request (~%.1f prompt tokens per row) to fit %s", rows, row_tokens, model)
+    return rows
+
+
+def _row_batches(df: pd.DataFrame, chunk_rows: int) -> List[pd.DataFrame]:
+    """Split `df` into consecutive row batches of at most `chunk_rows` rows (one batch if <= 0)."""
+    if chunk_rows <= 0 or len(df) <= chunk_rows:
+        return [df]
+    return [df.iloc[i : i + chunk_rows] for i in range(0, len(df), chunk_rows)]
+
+
+def _stream_openai_csv(system_prompt: str, user_prompt: str, model: str = "gpt-4o-mini",
+                       max_retries: int = 2, timeout: int = 30) -> Iterator[str]:
+    """Streaming variant of `_call_openai_csv`: yields completion text as it arrives."""
+    return get_llm_pool().stream(
+        [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt},
+        ],
+        model=model,
+        timeout=timeout,
+        max_retries=max_retries,
+        temperature=0,
+    )
+
+
+def iter_llm_csv_rows(system_prompt: str, user_prompt: str, model: str = "gpt-4o-mini",
+                      timeout: int = 30) -> Iterator[List[str]]:
+    """Stream a completion and yield its CSV rows as soon as each one is complete.
+
+    The first item is the header. Code fences are stripped on the fly and every row
+    is validated against the header width (`CsvStreamError` on a malformed row), so
+    consumers can start writing or reporting progress before the model finishes.
+    Streamed completions carry no usage figures, so tokens are recorded as estimates.
+    """
+    parser = CsvStreamParser()
+    header_sent = False
+    received: List[str] = []
+    started = time.perf_counter()
+    for delta in _stream_openai_csv(system_prompt, user_prompt, model=model, timeout=timeout):
+        received.append(delta)
+        rows = parser.feed(delta)
+        if not header_sent and parser.header is not None:
+            header_sent = True
+            yield parser.header
+        yield from rows
+    _llm_call_seconds().observe(time.perf_counter() - started, mode="stream")
+    get_token_meter().record(model, estimate_tokens(system_prompt + user_prompt, model),
+                             estimate_tokens("".join(received), model), estimated=True)
+    rows = parser.close()
+    if not header_sent:
+        yield parser.header
+    yield from rows
+
+
+def _frame_from_csv_rows(header: List[str], rows: List[List[str]]) -> pd.DataFrame:
+    """Build a DataFrame from parsed CSV rows with `read_csv`-like typing.
+
+    Empty fields become NaN and columns whose values are all numeric become numbers.
+    """
+    values = np.array(rows, dtype=object).reshape(len(rows), len(header))
+    values[values == ""] = np.nan
+    df = pd.DataFrame(values, columns=header)
+    for i in range(df.shape[1]):
         try:
-            s = str(u).lower()
-        except Exception:
-            return "25000"
-        if "camion" in s or "truck" in s:
-            return "100000"
-        if "auto" in s or "car" in s or "vehiculo" in s:
-            return "50000"
-        return "25000"
+            df.isetitem(i, pd.to_numeric(df.iloc[:, i]))
+        except (ValueError, TypeError):
+            pass
+    return df
 
-    if unit_col:
-        df["DANOS MATERIALES LIMITES"] = df[unit_col].apply(infer_limits)
-        df["ROBO TOTAL LIMITES"] = df[unit_col].apply(infer_limits)
-    else:
-        df["DANOS MATERIALES LIMITES"] = "VALOR CONVENIDO"
-        df["ROBO TOTAL LIMITES"] = "VALOR CONVENIDO"
 
-    # Deductibles heuristic: fallback to rules dict if present
+def _csv_rows(text: str) -> Tuple[List[str], List[List[str]]]:
+    """Header and rows of a whole CSV reply, parsed like a streamed one (`CsvStreamParser`)."""
+    parser = CsvStreamParser()
+    rows = parser.feed(text)
+    rows.extend(parser.close())
+    return parser.header, rows
+
+
+def _csv_text(header: List[str], rows: List[List[str]]) -> str:
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    writer.writerow(header)
+    writer.writerows(rows)
+    return buf.getvalue()
+
+
+def _transform_chunk(chunk: pd.DataFrame, instructions_json: str, sheet_name: str,
+                     model: str, timeout: int, tag: str = "", stream: bool = False,
+                     on_rows: Optional[RowsCallback] = None, chunk_index: int = 0) -> pd.DataFrame:
+    """Send one row batch (with its own header) to the LLM and parse the CSV reply.
+
+    Parsed replies are stored in the persistent LLM cache; an identical request
+    (same model, system prompt, rules and rows) is answered from it without a call.
+    With `stream` the reply is parsed row by row while it is generated and
+    `on_rows(chunk_index, rows)` is called for every group of completed rows;
+    otherwise (and for cached replies) once with all rows. Every path builds the
+    frame with `_frame_from_csv_rows`, so cached, streamed and whole replies
+    come back with the same dtypes. Raises on any failure after saving a debug artifact.
+    """
+    csv_content = chunk.to_csv(index=False)
+    cache = get_llm_cache()
+    cache_key = None
+    if cache is not None:
+        cache_key = cache.make_key(model, PROMPT_SYSTEM, instructions_json, csv_content)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            header, rows = _csv_rows(cached)
+            if on_rows is not None:
+                on_rows(chunk_index, rows)
+            return _frame_from_csv_rows(header, rows)
+
+    user_prompt = PROMPT_USER_TEMPLATE.format(instructions_json=instructions_json,
+                                              csv_content=csv_content,
+                                              sheet_name=sheet_name)
+    raw = None
     try:
-        # rules may contain mapping per unit type in a nested structure
-        if isinstance(rules, dict) and "coberturas_por_tipo" in rules:
-            def ded_for_unit(unit, key):
-                try:
-                    tu = str(unit).upper()
-                except Exception:
-                    tu = ""
-                for k, v in rules.get("coberturas_por_tipo", {}).items():
-                    if k in tu or k in str(unit):
-                        cov = v.get("coberturas", {})
-                        item = cov.get(key, {})
-                        return item.get("DEDUCIBLES") or item.get("DEDUCIBLES", "")
-                return ""
-
-            if unit_col:
-                df["DANOS MATERIALES DEDUCIBLES"] = df[unit_col].apply(lambda u: ded_for_unit(u, "DANOS MATERIALES") or "10 %")
-                df["ROBO TOTAL DEDUCIBLES"] = df[unit_col].apply(lambda u: ded_for_unit(u, "ROBO TOTAL") or "10 %")
-            else:
-                df["DANOS MATERIALES DEDUCIBLES"] = "10 %"
-                df["ROBO TOTAL DEDUCIBLES"] = "10 %"
-    except Exception:
-        df["DANOS MATERIALES DEDUCIBLES"] = "10 %"
-        df["ROBO TOTAL DEDUCIBLES"] = "10 %"
+        if stream:
+            rows_iter = iter_llm_csv_rows(PROMPT_SYSTEM, user_prompt, model=model, timeout=timeout)
+            header = next(rows_iter)
+            rows: List[List[str]] = []
+            for row in rows_iter:
+                rows.append(row)
+                if on_rows is not None:
+                    on_rows(chunk_index, [row])
+        else:
+            raw = _call_openai_csv(PROMPT_SYSTEM, user_prompt, model=model, timeout=timeout)
+            header, rows = _csv_rows(_sanitize_llm_text_to_csv(raw))
+            if on_rows is not None:
+                on_rows(chunk_index, rows)
+        out_df = _frame_from_csv_rows(header, rows)
+    except CircuitOpenError:
+        # provider considered down: nothing worth saving
+        raise
+    except Exception as e:
+        _save_llm_debug(raw, user_prompt, e, tag=tag)
+        raise
+    if cache is not None:
+        # only replies that parsed are worth replaying
+        cache.put(cache_key, _csv_text(header, rows))
+    return out_df
+
+
+def _assemble_chunks(chunks: List[pd.DataFrame], results: List[Optional[pd.DataFrame]],
+                     rules: Dict[str, Any],
+                     on_fallback: Optional[FallbackCallback] = None) -> Optional[pd.DataFrame]:
+    """Concatenate per-chunk LLM results in order, enforcing one consistent column set.
+
+    The first successful chunk defines the columns; chunks that failed or came back
+    with different columns are recomputed with `_mock_apply_rules` and aligned to
+    those columns. Returns None when no chunk succeeded.
+    """
+    logger = logging.getLogger(__name__)
+    reference = next((r for r in results if r is not None), None)
+    if reference is None:
+        return None
+    columns = list(reference.columns)
+    parts = []
+    for idx, (chunk, res) in enumerate(zip(chunks, results)):
+        if res is not None and list(res.columns) != columns:
+            logger.warning("LLM chunk %d returned columns %s, expected %s; using fallback rules",
+                           idx, list(res.columns), columns)
+            _count_fallback("columns", on_fallback=on_fallback)
+            res = None
+        if res is None:
+            res = _mock_apply_rules(chunk, rules).reindex(columns=columns)
+        elif len(res) != len(chunk):
+            logger.warning("LLM chunk %d returned %d rows for %d input rows", idx, len(res), len(chunk))
+        parts.append(res)
+    return pd.concat(parts, ignore_index=True)
+
+
+_chunk_pool: Optional[ThreadPoolExecutor] = None
+_chunk_pool_lock = threading.Lock()
+
+
+def _get_chunk_pool() -> ThreadPoolExecutor:
+    """Threads shared by the row batches of every table (`LLM_MAX_IN_FLIGHT` of them).
+
+    Separate from the I/O pool: `_llm_transform` already runs on an I/O thread and
+    would deadlock waiting for batches queued behind it in the same pool.
+    """
+    global _chunk_pool
+    with _chunk_pool_lock:
+        if _chunk_pool is None:
+            _chunk_pool = ThreadPoolExecutor(max_workers=max(1, env_int("LLM_MAX_IN_FLIGHT", 16)),
+                                             thread_name_prefix="llm-chunk")
+        return _chunk_pool
+
+
+def _map_bounded(fn: Callable[[int], Any], total: int, limit: int) -> List[Any]:
+    """`[fn(0), ..., fn(total - 1)]` on the chunk pool, at most `limit` running at once."""
+    pool = _get_chunk_pool()
+    results: List[Any] = [None] * total
+    pending: Dict[Future, int] = {}
+    submitted = 0
+    while submitted < total or pending:
+        while submitted < total and len(pending) < limit:
+            pending[pool.submit(fn, submitted)] = submitted
+            submitted += 1
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for fut in done:
+            results[pending.pop(fut)] = fut.result()
+    return results
+
+
+def _llm_transform(df: pd.DataFrame, rules: Dict[str, Any], instructions_json: str, model: str,
+                   timeout: int, chunk_rows: int, max_concurrency: int, stream: bool = False,
+                   on_rows: Optional[RowsCallback] = None,
+                   on_chunk: Optional[ChunkCallback] = None,
+                   adaptive: bool = False,
+                   on_fallback: Optional[FallbackCallback] = None) -> Optional[pd.DataFrame]:
+    """Run `df` through the LLM in row batches; None when every batch failed.
+
+    With `adaptive` the batch size is lowered to what fits the model (`_budget_chunk_rows`).
+    """
+    if adaptive:
+        chunk_rows = _budget_chunk_rows(df, rules, instructions_json, model, chunk_rows)
+    chunks = _row_batches(df, chunk_rows)
+    total = len(chunks)
+
+    def run(idx: int) -> Optional[pd.DataFrame]:
+        sheet_name = "sheet" if total == 1 else f"sheet, parte {idx + 1}/{total}"
+        tag = "" if total == 1 else f"_part{idx + 1}"
+        try:
+            return _transform_chunk(chunks[idx], instructions_json, sheet_name, model, timeout, tag=tag,
+                                    stream=stream, on_rows=on_rows, chunk_index=idx)
+        except CircuitOpenError:
+            _count_fallback("breaker_open", on_fallback=on_fallback)
+            return None
+        except Exception:
+            _count_fallback("error", on_fallback=on_fallback)
+            return None
+        finally:
+            if on_chunk is not None:
+                on_chunk(idx, total)
+
+    if total == 1:
+        results = [run(0)]
+    else:
+        results = _map_bounded(run, total, max(1, max_concurrency))
 
-    return df
+    return _assemble_chunks(chunks, results, rules, on_fallback)
+
+
+def _reference_columns(df: pd.DataFrame, rules: Dict[str, Any]) -> List[Any]:
+    """Columns of `df` named by `reglas_asignacion.mapeo_columnas.columna_referencia`.
+
+    Returns [] unless every referenced column is present in `df`.
+    """
+    refs = _reference_names(rules)
+    if not refs:
+        return []
+    by_name = {normalize_column_name(c): c for c in df.columns}
+    cols = [by_name.get(normalize_column_name(r)) for r in refs]
+    if any(c is None for c in cols):
+        return []
+    return list(dict.fromkeys(cols))
+
+
+def _key_frame(frame: pd.DataFrame, cols: List[Any]) -> pd.DataFrame:
+    """String-normalized join keys (trimmed, upper-cased, NaN as "") for `cols`."""
+    return pd.DataFrame({
+        f"__key{i}": frame[c].astype(str).where(frame[c].notna(), "").str.strip().str.upper()
+        for i, c in enumerate(cols)
+    }, index=frame.index)
+
+
+def _join_projection(df: pd.DataFrame, keys: List[Any], distinct: pd.DataFrame,
+                     projected: pd.DataFrame) -> Optional[pd.DataFrame]:
+    """Attach the columns the LLM added for each distinct key back onto every row of `df`.
+
+    Returns None when the reply can't be matched back to the keys.
+    """
+    reply_by_name = {normalize_column_name(c): c for c in projected.columns}
+    reply_keys = [reply_by_name.get(normalize_column_name(k)) for k in keys]
+    existing = {normalize_column_name(c) for c in df.columns}
+    new_cols = [c for c in projected.columns if normalize_column_name(c) not in existing]
+    if not new_cols:
+        return None
+
+    if any(k is None for k in reply_keys):
+        # keys renamed/dropped by the model: only usable if rows came back 1:1 in order
+        if len(projected) != len(distinct):
+            return None
+        lookup = pd.concat([_key_frame(distinct, keys).reset_index(drop=True),
+                            projected[new_cols].reset_index(drop=True)], axis=1)
+    else:
+        lookup = pd.concat([_key_frame(projected, reply_keys), projected[new_cols]], axis=1)
+    key_names = [f"__key{i}" for i in range(len(keys))]
+    lookup = lookup.drop_duplicates(subset=key_names)
+
+    merged = _key_frame(df, keys).merge(lookup, on=key_names, how="left")
+    out = df.reset_index(drop=True)
+    for c in new_cols:
+        out[c] = merged[c].to_numpy()
+    return out
 
 
 def transform_sheet_with_rules(df: pd.DataFrame, rules: Dict[str, Any], model: Optional[str] = None,
-                               use_llm: bool = True, timeout: int = 30) -> pd.DataFrame:
+                               use_llm: bool = True, timeout: int = 30,
+                               chunk_rows: Optional[int] = None,
+                               max_concurrency: Optional[int] = None,
+                               project_keys: Optional[bool] = None,
+                               engine: Optional[str] = None,
+                               compiled: Optional[CompiledRules] = None,
+                               stream: Optional[bool] = None,
+                               on_rows: Optional[RowsCallback] = None,
+                               on_chunk: Optional[ChunkCallback] = None,
+                               compact: Optional[bool] = None,
+                               on_fallback: Optional[FallbackCallback] = None) -> pd.DataFrame:
     """Transform a single DataFrame (sheet) according to rules.
 
     Tries to use the LLM to produce a CSV-only response. If that fails or OPENAI_API_KEY
     is missing, falls back to deterministic `_mock_apply_rules`.
+
+    Large sheets are sent as row batches of `chunk_rows` rows (env `LLM_CHUNK_ROWS`,
+    0 disables chunking), each repeating the header, with at most `max_concurrency`
+    (env `LLM_MAX_CONCURRENCY`) calls in flight. Results are reassembled in order;
+    a failed batch only falls back to deterministic rules for its own rows.
+
+    With `project_keys` (env `LLM_KEY_PROJECTION`, on by default) and rules whose
+    `mapeo_columnas.columna_referencia` names columns of the sheet, only the distinct
+    combinations of those columns are sent; the columns the model adds are joined
+    back onto every row locally.
+
+    `engine` (env `RULES_ENGINE`) picks the rules engine: `auto` (default) applies
+    the compiled lookup and skips the LLM when the rules fully cover the sheet,
+    `compiled` never calls the LLM, `llm` always tries it first. `compiled` may carry
+    a precompiled form of `rules` (see `rules_registry`).
+
+    With `stream` (env `LLM_STREAM`) completions are consumed token by token and
+    parsed incrementally; `on_rows(chunk_index, rows)` reports rows as they arrive.
+    `on_chunk(chunk_index, total)` is called whenever an LLM row batch is done, and
+    `on_fallback(reason)` whenever the LLM was meant to run but deterministic rules
+    replaced (part of) its output.
+
+    With `compact` (env `LLM_COMPACT_PROMPT`, on by default) descriptions are not
+    sent, example rows keep only their reference columns (see `compact_rules`),
+    columns the rules never mention are left out of the prompt and re-attached
+    locally, and row batches are shrunk to fit the model's context and output
+    limits (see `token_budget`).
     """
     df = df.copy()
+    started = time.perf_counter()
+
+    engine = (engine or env_str("RULES_ENGINE", "auto")).lower()
+    compiled_df = _apply_compiled_rules(df, rules, engine, compiled=compiled)
+    if compiled_df is not None:
+        _observe_rules("compiled", started, len(df))
+        return compiled_df
 
     openai_key = os.getenv("OPENAI_API_KEY")
-    if use_llm and openai_key:
-        csv_content = df.to_csv(index=False)
+    breaker_open = get_llm_pool().breaker.state == CircuitBreaker.OPEN
+    if use_llm and openai_key and breaker_open:
+        _count_fallback("breaker_open", on_fallback=on_fallback)
+    # while the circuit breaker is open go straight to the deterministic rules
+    if use_llm and openai_key and not breaker_open:
         # inline import to avoid heavy deps at import time
         import json
-        logger = logging.getLogger(__name__)
-        user_prompt = PROMPT_USER_TEMPLATE.format(instructions_json=(rules and json.dumps(rules, ensure_ascii=False) or ""),
-                                                  csv_content=csv_content,
-                                                  sheet_name="sheet")
-        raw = None
-        try:
-            raw = _call_openai_csv(PROMPT_SYSTEM, user_prompt, model=(model or "gpt-4o-mini"), timeout=timeout)
-            csv_text = _sanitize_llm_text_to_csv(raw)
-            out_df = pd.read_csv(io.StringIO(csv_text))
+        if compact is None:
+            compact = env_bool("LLM_COMPACT_PROMPT", True)
+        prompt_rules = compact_rules(rules) if compact else rules
+        instructions_json = prompt_rules and json.dumps(prompt_rules, ensure_ascii=False) or ""
+        model = model or "gpt-4o-mini"
+        if chunk_rows is None:
+            chunk_rows = env_int("LLM_CHUNK_ROWS", 500)
+        if max_concurrency is None:
+            max_concurrency = env_int("LLM_MAX_CONCURRENCY", 4)
+        if project_keys is None:
+            project_keys = env_bool("LLM_KEY_PROJECTION", True)
+        if stream is None:
+            stream = env_bool("LLM_STREAM", False)
+
+        keys = _reference_columns(df, rules) if project_keys else []
+        if keys:
+            # one representative row per normalized key combination
+            distinct = df.loc[~_key_frame(df, keys).duplicated(), keys].reset_index(drop=True)
+            projected = _llm_transform(distinct, rules, instructions_json, model, timeout,
+                                       chunk_rows, max_concurrency, stream=stream, on_rows=on_rows,
+                                       on_chunk=on_chunk, adaptive=compact, on_fallback=on_fallback)
+            out_df = _join_projection(df, keys, distinct, projected) if projected is not None else None
+            if out_df is None and projected is not None:
+                logging.getLogger(__name__).warning(
+                    "LLM reply for %d distinct keys could not be joined back; using fallback rules", len(distinct))
+        else:
+            sent_cols = _prompt_columns(df, prompt_rules) if compact else list(df.columns)
+            dropped = [c for c in df.columns if c not in sent_cols]
+            frame = df[sent_cols] if dropped else df
+            out_df = _llm_transform(frame, rules, instructions_json, model, timeout, chunk_rows, max_concurrency,
+                                    stream=stream, on_rows=on_rows, on_chunk=on_chunk, adaptive=compact,
+                                    on_fallback=on_fallback)
+            if out_df is not None and dropped:
+                out_df = _reattach_columns(df, out_df, dropped)
+        if out_df is not None:
+            _observe_rules("llm", started, len(df))
             return out_df
-        except Exception as e:
-            # Save raw output for debugging if available
-            try:
-                BASE_DIR = Path(__file__).resolve().parents[2]
-                debug_dir = BASE_DIR / "data" / "llm_debug"
-                debug_dir.mkdir(parents=True, exist_ok=True)
-                timestamp = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
-                fname = debug_dir / f"llm_raw_{timestamp}.txt"
-                with open(fname, "w", encoding="utf-8") as fh:
-                    if raw:
-                        fh.write(raw)
-                    else:
-                        fh.write(user_prompt)
-                        fh.write("\n\n--ERROR: \n")
-                        fh.write(str(e))
-                logger.exception("LLM transform failed; raw output saved to %s", str(fname))
-            except Exception:
-                # If saving fails, just log
-                logger.exception("Failed saving LLM raw output for debugging")
-            # On any failure, move to fallback deterministic rules
-            pass
+        # On any failure, move to fallback deterministic rules
+        _count_fallback("sheet", on_fallback=on_fallback)
 
     # As last resort, deterministic mock
-    return _mock_apply_rules(df, rules)
+    out_df = _mock_apply_rules(df, rules, compiled=compiled)
+    _observe_rules("fallback", started, len(df))
+    return out_df
 
 
-def apply_rules_to_df(df: pd.DataFrame, rules: Dict[str, Any]) -> pd.DataFrame:
+def apply_rules_to_df(df: pd.DataFrame, rules: Dict[str, Any],
+                      compiled: Optional[CompiledRules] = None,
+                      on_chunk: Optional[ChunkCallback] = None,
+                      on_fallback: Optional[FallbackCallback] = None) -> pd.DataFrame:
     """Public wrapper kept for backward compatibility. Uses transform_sheet_with_rules."""
-    return transform_sheet_with_rules(df, rules, use_llm=True)
+    return transform_sheet_with_rules(df, rules, use_llm=True, compiled=compiled, on_chunk=on_chunk,
+                                      on_fallback=on_fallback)
+
+
+def engine_fingerprint() -> str:
+    """Identify the engine settings that shape `apply_rules_to_df` output (for result caches).
+
+    Covers `RULES_ENGINE` and, when an OpenAI key is configured, the model and the
+    batching/projection settings that change what the model is sent.
+    """
+    engine = env_str("RULES_ENGINE", "auto").lower()
+    if engine == "compiled" or not os.getenv("OPENAI_API_KEY"):
+        return f"{engine}|deterministic"
+    return (f"{engine}|llm:gpt-4o-mini|base={env_str('OPENAI_BASE_URL', '')}"
+            f"|chunk={env_int('LLM_CHUNK_ROWS', 500)}|keys={int(env_bool('LLM_KEY_PROJECTION', True))}"
+            f"|compact={COMPACT_PROMPT_VERSION if env_bool('LLM_COMPACT_PROMPT', True) else 0}")
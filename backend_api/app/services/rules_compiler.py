@@ -0,0 +1,217 @@
+"""Compile coverage rule documents into vectorized lookup transforms.
+
+A rules document such as `sample3_test.json` assigns coverage values per unit type:
+`coberturas_por_tipo[TIPO].coberturas[COBERTURA][CAMPO]`, and
+`reglas_asignacion.columnas_a_agregar` names the output columns as
+"<COBERTURA> <CAMPO>". `compile_rules` turns that into a lookup table keyed by
+a normalized unit type, so applying the rules is one `map` per output column over
+the distinct unit values of the sheet instead of per-row Python work.
+"""
+import re
+import threading
+import unicodedata
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Columns that describe the unit type when the rules don't name one
+UNIT_COLUMN_CANDIDATES = ("unidad", "unit_type", "tipo_unidad", "tipo_de_unidad", "tipo")
+
+# Values returned for a unit that matches no type: (column, unit) -> value
+DefaultFn = Callable[[str, Any], Any]
+
+_MEMO_LIMIT = 50_000
+
+
+def normalize_column_name(name: Any) -> str:
+    """Comparable form of a column name: "TIPO DE UNIDAD" and "tipo_de_unidad" match."""
+    return re.sub(r"[^\w]+", "_", _strip_accents(str(name)), flags=re.UNICODE).strip("_").lower()
+
+
+def normalize_unit(value: Any) -> str:
+    """Comparable form of a unit type: accents removed, upper case, simple singular.
+
+    "Tractos", "TRACTO " and "tracto" all normalize to "TRACTO".
+    """
+    if value is None or value is pd.NA or (isinstance(value, float) and value != value):
+        return ""
+    words = re.findall(r"\w+", _strip_accents(str(value)).upper())
+    return " ".join(w[:-1] if len(w) > 3 and w.endswith("S") else w for w in words)
+
+
+def _strip_accents(text: str) -> str:
+    return "".join(ch for ch in unicodedata.normalize("NFKD", text) if not unicodedata.combining(ch))
+
+
+class CompiledRules:
+    """Lookup-table form of a coverage rules document.
+
+    `values[column][type_key]` holds the value of each output column per normalized
+    unit type. `complete` is True when every output column has a value for every
+    type, i.e. the document is fully expressible as a lookup and needs no LLM.
+    """
+
+    def __init__(self, reference_columns: List[str], output_columns: List[str],
+                 values: Dict[str, Dict[str, Any]], aliases: Dict[str, str],
+                 defaults: Dict[str, Any], complete: bool):
+        self.reference_columns = reference_columns
+        self.output_columns = output_columns
+        self.values = values
+        self.aliases = aliases
+        self.defaults = defaults
+        self.complete = complete
+        self.type_keys = sorted({k for col in values.values() for k in col} | set(aliases.values()),
+                                key=len, reverse=True)
+        self._memo: Dict[Any, Optional[str]] = {}
+        self._memo_lock = threading.Lock()
+
+    def find_unit_column(self, df: pd.DataFrame) -> Optional[Any]:
+        """The sheet column holding the unit type (rule reference first, then common names)."""
+        by_name = {normalize_column_name(c): c for c in df.columns}
+        for name in list(self.reference_columns) + list(UNIT_COLUMN_CANDIDATES):
+            col = by_name.get(normalize_column_name(name))
+            if col is not None:
+                return col
+        return None
+
+    def resolve(self, unit: Any) -> Optional[str]:
+        """Type key for a raw unit value, or None when no type matches. Memoized."""
+        try:
+            return self._memo[unit]
+        except KeyError:
+            pass
+        except TypeError:
+            # unhashable cell value
+            return self._resolve(unit)
+        key = self._resolve(unit)
+        with self._memo_lock:
+            if len(self._memo) >= _MEMO_LIMIT:
+                self._memo.clear()
+            self._memo[unit] = key
+        return key
+
+    def _resolve(self, unit: Any) -> Optional[str]:
+        norm = normalize_unit(unit)
+        if not norm:
+            return None
+        if norm in self.aliases:
+            return self.aliases[norm]
+        if norm in self.type_keys:
+            return norm
+        # "TRACTO CAMION" -> TRACTO; "TRACTOCAMION" -> TRACTO (longest key first)
+        tokens = norm.split()
+        for key in self.type_keys:
+            if key in tokens or norm.startswith(key) or (" " in key and key in norm):
+                return key
+        return None
+
+    def covers(self, units: Iterable[Any]) -> bool:
+        """True when every non-empty unit value resolves to a known type."""
+        return all(self.resolve(u) is not None for u in units if normalize_unit(u))
+
+    def apply(self, df: pd.DataFrame, default: Optional[DefaultFn] = None,
+              unit_col: Optional[Any] = None) -> Optional[pd.DataFrame]:
+        """Add the output columns to a copy of `df`; None when no unit column is found.
+
+        Units matching no type get `defaults[column]` from the rules, else
+        `default(column, unit)`, else an empty cell.
+        """
+        if unit_col is None:
+            unit_col = self.find_unit_column(df)
+        if unit_col is None:
+            return None
+        out = df.copy()
+        # factorize once; every output column is then a single take over the codes.
+        # Code -1 (missing unit) picks the extra last slot, which holds the NaN value.
+        codes, uniques = pd.factorize(out[unit_col])
+        units = list(uniques) + [None]
+        types = [self.resolve(u) for u in units]
+        for col in self.output_columns:
+            table = self.values.get(col, {})
+            fallback = self.defaults.get(col)
+            per_unit = np.empty(len(units), dtype=object)
+            for i, (unit, key) in enumerate(zip(units, types)):
+                value = table.get(key) if key is not None else None
+                if value is None:
+                    if fallback is not None:
+                        value = fallback
+                    elif default is not None:
+                        value = default(col, unit)
+                per_unit[i] = value
+            out[col] = per_unit[codes]
+        return out
+
+
+def _split_output_column(column: str, coverages: Iterable[str]) -> Optional[Tuple[str, str]]:
+    """Split "DANOS MATERIALES LIMITES" into ("DANOS MATERIALES", "LIMITES")."""
+    col_norm = normalize_unit(column)
+    for cov in sorted(coverages, key=len, reverse=True):
+        cov_norm = normalize_unit(cov)
+        if col_norm.startswith(cov_norm + " "):
+            return cov, col_norm[len(cov_norm) + 1:]
+    return None
+
+
+def compile_rules(rules: Dict[str, Any]) -> Optional[CompiledRules]:
+    """Compile a `coberturas_por_tipo` / `reglas_asignacion` document.
+
+    Returns None when the document has no per-type coverage table. Optional
+    extensions: `coberturas_por_tipo[T].sinonimos` (list of unit names meaning T),
+    `reglas_asignacion.sinonimos` ({unit name: T}) and
+    `reglas_asignacion.valores_por_defecto` ({output column: value}).
+    """
+    if not isinstance(rules, dict):
+        return None
+    per_type = rules.get("coberturas_por_tipo")
+    if not isinstance(per_type, dict) or not per_type:
+        return None
+    assignment = rules.get("reglas_asignacion") or {}
+
+    coverages = {cov for spec in per_type.values() if isinstance(spec, dict)
+                 for cov in (spec.get("coberturas") or {})}
+    output_columns = list(assignment.get("columnas_a_agregar") or [])
+    if not output_columns:
+        output_columns = sorted({f"{cov} {field}" for spec in per_type.values() if isinstance(spec, dict)
+                                 for cov, item in (spec.get("coberturas") or {}).items()
+                                 if isinstance(item, dict) for field in item})
+
+    values: Dict[str, Dict[str, Any]] = {col: {} for col in output_columns}
+    aliases: Dict[str, str] = {}
+    complete = True
+    for type_name, spec in per_type.items():
+        key = normalize_unit(type_name)
+        if not isinstance(spec, dict) or not key:
+            complete = False
+            continue
+        for alias in spec.get("sinonimos") or spec.get("aliases") or []:
+            aliases[normalize_unit(alias)] = key
+        cov_table = spec.get("coberturas") or {}
+        for col in output_columns:
+            split = _split_output_column(col, coverages)
+            item = cov_table.get(split[0]) if split else None
+            field = next((f for f in (item or {}) if normalize_unit(f) == split[1]), None) if split else None
+            if field is None:
+                complete = False
+                continue
+            values[col][key] = item[field]
+    for alias, type_name in (assignment.get("sinonimos") or {}).items():
+        aliases[normalize_unit(alias)] = normalize_unit(type_name)
+
+    mapping = assignment.get("mapeo_columnas") or {}
+    refs = mapping.get("columna_referencia") or []
+    if isinstance(refs, str):
+        refs = [refs]
+
+    defaults = dict(assignment.get("valores_por_defecto") or {})
+    return CompiledRules(reference_columns=list(refs), output_columns=output_columns, values=values,
+                         aliases=aliases, defaults=defaults, complete=complete and bool(output_columns))
+
+
+__all__ = [
+    "CompiledRules",
+    "compile_rules",
+    "normalize_column_name",
+    "normalize_unit",
+    "UNIT_COLUMN_CANDIDATES",
+]
@@ -0,0 +1,165 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..utils.config import env_float, env_str
+from ..utils.export_cache import get_export_cache
+from .rules_compiler import CompiledRules, compile_rules
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parents[3]
+DATA_DIR = BASE_DIR / "data"
+DEFAULT_RULES_ID = "sample3_test"
+
+
+class RuleSet:
+    """A validated, precompiled rules document.
+
+    `version` is a short content hash: it changes whenever the file contents change
+    and is meant to be part of any cache key derived from these rules.
+    """
+
+    def __init__(self, rules_id: str, rules: Dict[str, Any], version: str,
+                 path: Optional[Path] = None, mtime: float = 0.0, size: int = 0):
+        self.id = rules_id
+        self.rules = rules
+        self.version = version
+        self.path = path
+        self.mtime = mtime
+        self.size = size
+        self.compiled: Optional[CompiledRules] = compile_rules(rules)
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "version": self.version,
+            "compiled": self.compiled is not None,
+            "complete": bool(self.compiled and self.compiled.complete),
+        }
+
+
+EMPTY_RULESET = RuleSet("none", {}, version="0")
+
+
+def validate_rules(rules: Any) -> Dict[str, Any]:
+    """Raise ValueError unless `rules` looks like a rules document."""
+    if not isinstance(rules, dict):
+        raise ValueError("rules document must be a JSON object")
+    per_type = rules.get("coberturas_por_tipo")
+    if per_type is not None and not isinstance(per_type, dict):
+        raise ValueError("'coberturas_por_tipo' must be an object")
+    assignment = rules.get("reglas_asignacion")
+    if assignment is not None and not isinstance(assignment, dict):
+        raise ValueError("'reglas_asignacion' must be an object")
+    return rules
+
+
+def _invalidate_exports(rules_id: str, keep_version: Optional[str] = None) -> None:
+    """Drop cached exports made with outdated versions of rule set `rules_id`."""
+    cache = get_export_cache()
+    if cache is None:
+        return
+    try:
+        removed = cache.invalidate(rules_id, keep_version=keep_version)
+    except Exception as e:
+        logger.warning("Could not invalidate cached exports of rules '%s': %s", rules_id, e)
+        return
+    if removed:
+        logger.info("Invalidated %d cached export(s) of rules '%s'", removed, rules_id)
+
+
+class RulesRegistry:
+    """Rule documents (`*.json` in `directory`) loaded once and hot-reloaded.
+
+    Files are re-checked at most every `reload_interval` seconds (a `stat` per file);
+    a document is only re-read, validated and recompiled when its mtime or size
+    changed, so lookups on the request path do no file I/O or JSON parsing. A file
+    that fails validation keeps serving its last good version.
+    """
+
+    def __init__(self, directory: Path, reload_interval: float = 2.0):
+        self.directory = Path(directory)
+        self.reload_interval = reload_interval
+        self._sets: Dict[str, RuleSet] = {}
+        self._last_scan = 0.0
+        self._lock = threading.Lock()
+
+    def _scan(self) -> None:
+        seen = set()
+        for path in sorted(self.directory.glob("*.json")):
+            rules_id = path.stem
+            seen.add(rules_id)
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            current = self._sets.get(rules_id)
+            if current is not None and (current.mtime, current.size) == (st.st_mtime, st.st_size):
+                continue
+            try:
+                raw = path.read_bytes()
+                rules = validate_rules(json.loads(raw.decode("utf-8")))
+            except Exception as e:
+                logger.warning("Ignoring invalid rules file %s: %s", path, e)
+                continue
+            version = hashlib.sha256(raw).hexdigest()[:12]
+            self._sets[rules_id] = RuleSet(rules_id, rules, version, path=path,
+                                           mtime=st.st_mtime, size=st.st_size)
+            logger.info("Loaded rules '%s' version %s from %s", rules_id, version, path)
+            if current is not None and current.version != version:
+                _invalidate_exports(rules_id, keep_version=version)
+        for rules_id in set(self._sets) - seen:
+            logger.info("Rules '%s' removed", rules_id)
+            del self._sets[rules_id]
+            _invalidate_exports(rules_id)
+
+    def _refresh(self) -> None:
+        now = time.monotonic()
+        if now - self._last_scan < self.reload_interval and self._last_scan:
+            return
+        with self._lock:
+            if now - self._last_scan < self.reload_interval and self._last_scan:
+                return
+            self._scan()
+            self._last_scan = now
+
+    def get(self, rules_id: Optional[str] = None) -> RuleSet:
+        """Return rule set `rules_id` (default: `RULES_DEFAULT_ID`, else "sample3_test").
+
+        Raises ValueError for an unknown id. Without an explicit id and without any
+        rules on disk an empty rule set is returned.
+        """
+        self._refresh()
+        wanted = rules_id or env_str("RULES_DEFAULT_ID", DEFAULT_RULES_ID)
+        ruleset = self._sets.get(wanted)
+        if ruleset is not None:
+            return ruleset
+        if rules_id:
+            raise ValueError(f"Unknown rules id '{rules_id}'. Available: {sorted(self._sets)}")
+        return EMPTY_RULESET
+
+    def list(self) -> List[RuleSet]:
+        self._refresh()
+        return [self._sets[k] for k in sorted(self._sets)]
+
+
+_registry: Optional[RulesRegistry] = None
+_registry_config: Optional[Tuple[str, float]] = None
+
+
+def get_rules_registry() -> RulesRegistry:
+    """Shared registry over `RULES_DIR` (default: the repository `data/` directory)."""
+    global _registry, _registry_config
+    config = (env_str("RULES_DIR", str(DATA_DIR)), env_float("RULES_RELOAD_INTERVAL", 2.0))
+    if _registry is None or _registry_config != config:
+        _registry = RulesRegistry(Path(config[0]), reload_interval=config[1])
+        _registry_config = config
+    return _registry
+
+
+__all__ = ["RuleSet", "RulesRegistry", "EMPTY_RULESET", "get_rules_registry", "validate_rules"]
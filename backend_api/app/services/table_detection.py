@@ -0,0 +1,113 @@
+"""Occupancy-bitmap table detection.
+
+A sheet is reduced once to a boolean occupancy matrix (cell has a value or not);
+edge trimming, row segments and side-by-side column blocks are all derived from
+that matrix with NumPy run-length logic, so detection is linear in the number of
+cells instead of re-scanning the DataFrame for every trimmed row or column.
+"""
+from typing import List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+# (first_row, last_row, first_col, last_col), inclusive, positional
+Region = Tuple[int, int, int, int]
+
+
+def occupancy_matrix(df: pd.DataFrame) -> np.ndarray:
+    """Boolean matrix with True where the cell holds a value."""
+    return df.notna().to_numpy()
+
+
+def bounding_box(occ: np.ndarray) -> Optional[Region]:
+    """Smallest region containing every occupied cell, or None for an empty matrix."""
+    rows = np.flatnonzero(occ.any(axis=1))
+    if not len(rows):
+        return None
+    cols = np.flatnonzero(occ.any(axis=0))
+    return int(rows[0]), int(rows[-1]), int(cols[0]), int(cols[-1])
+
+
+def true_runs(mask: Union[np.ndarray, Sequence[bool]], min_len: int = 1, max_gap: int = 0) -> List[Tuple[int, int]]:
+    """Inclusive (start, end) runs of True values in a 1-D mask.
+
+    Runs separated by at most `max_gap` False values are merged; runs shorter
+    than `min_len` (after merging) are dropped.
+    """
+    mask = np.asarray(mask, dtype=bool)
+    if not mask.any():
+        return []
+    padded = np.concatenate(([False], mask, [False]))
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    starts, ends = edges[0::2], edges[1::2] - 1
+    if max_gap > 0 and len(starts) > 1:
+        keep = np.concatenate(([True], starts[1:] - ends[:-1] - 1 > max_gap))
+        starts = starts[keep]
+        ends = ends[np.concatenate((keep[1:], [True]))]
+    lengths = ends - starts + 1
+    sel = lengths >= min_len
+    return [(int(s), int(e)) for s, e in zip(starts[sel], ends[sel])]
+
+
+def row_segments(row_counts: Union[np.ndarray, Sequence[int]], min_non_null: int = 2,
+                 min_rows: int = 2) -> List[Tuple[int, int]]:
+    """Runs of consecutive rows with at least `min_non_null` occupied cells."""
+    counts = np.asarray(row_counts)
+    return true_runs(counts >= min_non_null, min_len=min_rows)
+
+
+def detect_regions(occ: np.ndarray, min_non_null: int = 2, min_rows: int = 2,
+                   min_col_gap: int = 2, max_depth: int = 8) -> List[Region]:
+    """Split an occupancy matrix into table regions (recursive XY-cut).
+
+    Each region is first trimmed to its bounding box, then split into column blocks
+    separated by at least `min_col_gap` fully empty columns (side-by-side tables;
+    the default of 2 keeps a table with one blank spacer column whole), then into
+    row segments of rows with >= `min_non_null` cells (stacked tables).
+    Sub-regions are cut again until nothing changes. A region without any qualifying
+    row segment is returned whole, as a last-resort table candidate.
+    """
+    regions: List[Region] = []
+    _cut(occ, 0, occ.shape[0] - 1, 0, occ.shape[1] - 1, 0,
+         min_non_null, min_rows, min_col_gap, max_depth, regions)
+    return regions
+
+
+def _cut(occ: np.ndarray, r0: int, r1: int, c0: int, c1: int, depth: int,
+         min_non_null: int, min_rows: int, min_col_gap: int, max_depth: int,
+         out: List[Region]) -> None:
+    if r1 < r0 or c1 < c0:
+        return
+    box = bounding_box(occ[r0 : r1 + 1, c0 : c1 + 1])
+    if box is None:
+        return
+    r0, r1, c0, c1 = r0 + box[0], r0 + box[1], c0 + box[2], c0 + box[3]
+    sub = occ[r0 : r1 + 1, c0 : c1 + 1]
+    if depth >= max_depth:
+        out.append((r0, r1, c0, c1))
+        return
+
+    # Side-by-side tables: column blocks separated by empty columns
+    col_blocks = true_runs(sub.any(axis=0), max_gap=min_col_gap - 1)
+    if len(col_blocks) > 1:
+        for a, b in col_blocks:
+            _cut(occ, r0, r1, c0 + a, c0 + b, depth + 1, min_non_null, min_rows, min_col_gap, max_depth, out)
+        return
+
+    # Stacked tables: runs of sufficiently filled rows
+    segs = row_segments(sub.sum(axis=1), min_non_null=min_non_null, min_rows=min_rows)
+    if not segs or segs == [(0, r1 - r0)]:
+        out.append((r0, r1, c0, c1))
+        return
+    for a, b in segs:
+        _cut(occ, r0 + a, r0 + b, c0, c1, depth + 1, min_non_null, min_rows, min_col_gap, max_depth, out)
+
+
+__all__ = [
+    "Region",
+    "occupancy_matrix",
+    "bounding_box",
+    "true_runs",
+    "row_segments",
+    "detect_regions",
+]
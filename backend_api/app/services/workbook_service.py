@@ -0,0 +1,113 @@
+"""Upload-once workbooks: store an upload, preview its sheets page by page, export by id.
+
+`POST /workbooks` spools the upload into `WORKBOOKS_DIR` and reads its sheet
+names; previews and exports then work on the stored file. Preview windows are
+cut in the CPU pool from the raw sheet or the cleaned tables, both of which come
+from the sheet cache after the first request (see `sheet_cache`), so only the
+requested rows travel back to the app process and to the browser.
+"""
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+from fastapi import UploadFile
+
+from ..utils.config import env_int
+from ..utils.excel_utils import ExcelWorkbook
+from ..utils.executors import run_cpu
+from ..utils.uploads import spool_upload
+from ..utils.workbook_store import get_workbook_store, workbooks_dir
+from .batch_export import workbook_sheet_names
+from .excel_service import prepare_export_tables
+
+PREVIEW_VIEWS = ("raw", "cleaned")
+# earlier name of the `cleaned` view, still accepted
+VIEW_ALIASES = {"tables": "cleaned"}
+
+
+def describe_workbook(workbook: Dict[str, Any]) -> Dict[str, Any]:
+    return {"id": workbook["id"], "filename": workbook["filename"], "size": workbook["size"],
+            "sheets": workbook["sheet_names"]}
+
+
+async def create_workbook(file: UploadFile) -> Dict[str, Any]:
+    """Store the upload and return its description (id, filename, size, sheets).
+
+    Raises ValueError when the file cannot be read as a workbook.
+    """
+    store = get_workbook_store()
+    store.purge()
+    upload = await spool_upload(file, directory=str(workbooks_dir()))
+    try:
+        try:
+            names = await run_cpu(workbook_sheet_names, str(upload.path), upload.sha256)
+        except Exception as e:
+            raise ValueError(f"Could not read workbook '{upload.filename}': {e}")
+        workbook = store.create(upload.filename, str(upload.path), upload.sha256, upload.size, names)
+    except BaseException:
+        upload.cleanup()
+        raise
+    return describe_workbook(workbook)
+
+
+def _column_letters(n: int) -> List[str]:
+    letters = []
+    for i in range(n):
+        name, i = "", i + 1
+        while i:
+            i, rem = divmod(i - 1, 26)
+            name = chr(65 + rem) + name
+        letters.append(name)
+    return letters
+
+
+def _json_rows(df: pd.DataFrame) -> List[List[Any]]:
+    """Rows as JSON values: NaN/NaT -> null, dates as ISO strings, other objects as str."""
+    return json.loads(df.to_json(orient="values", date_format="iso", default_handler=str))
+
+
+def preview_window(path: str, digest: str, sheet: str, view: str, table: Optional[str],
+                   offset: int, limit: int) -> Dict[str, Any]:
+    """Rows `offset`..`offset + limit` of the raw sheet or of one cleaned table.
+
+    Runs in the CPU executor (module-level and picklable); only the window is returned.
+    """
+    if view == "raw":
+        with ExcelWorkbook(path, digest=digest) as wb:
+            df = wb.sheet(sheet)
+        window = df.iloc[offset:offset + limit]
+        return {"sheet": sheet, "view": view, "columns": _column_letters(df.shape[1]),
+                "total_rows": len(df), "offset": offset, "limit": limit, "rows": _json_rows(window)}
+
+    tables = prepare_export_tables(path, sheet, digest)
+    names = list(tables)
+    name = table if table is not None else names[0]
+    if name not in tables:
+        raise ValueError(f"Table '{name}' not found. Available: {names}")
+    df = tables[name]
+    window = df.iloc[offset:offset + limit]
+    return {"sheet": sheet, "view": view, "tables": [{"name": n, "rows": len(t)} for n, t in tables.items()],
+            "table": name, "columns": [str(c) for c in df.columns], "total_rows": len(df),
+            "offset": offset, "limit": limit, "rows": _json_rows(window)}
+
+
+async def sheet_preview(workbook: Dict[str, Any], sheet: str, view: str = "raw", table: Optional[str] = None,
+                        offset: int = 0, limit: int = 100) -> Dict[str, Any]:
+    """A page of `sheet`: `view` is `raw` (cells as in the file, columns A, B, ...) or
+    `cleaned` (the cleaned tables the rules are applied to; `table` picks one, default
+    the first; `tables` is accepted as an alias). `limit` is capped by `PREVIEW_MAX_ROWS`
+    (default 1000).
+    """
+    view = VIEW_ALIASES.get(view, view)
+    if view not in PREVIEW_VIEWS:
+        raise ValueError(f"Unknown view '{view}'. Use one of {list(PREVIEW_VIEWS)}")
+    if sheet not in workbook["sheet_names"]:
+        raise ValueError(f"Sheet '{sheet}' not found. Available: {workbook['sheet_names']}")
+    offset = max(0, offset)
+    limit = max(1, min(limit, env_int("PREVIEW_MAX_ROWS", 1000)))
+    return await run_cpu(preview_window, str(Path(workbook["path"])), workbook["sha256"], sheet, view,
+                         table, offset, limit)
+
+
+__all__ = ["PREVIEW_VIEWS", "VIEW_ALIASES", "create_workbook", "describe_workbook", "preview_window", "sheet_preview"]
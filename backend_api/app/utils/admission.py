@@ -0,0 +1,323 @@
+"""Admission control for exports: estimate what a request costs, admit it within global budgets.
+
+Every export (`/export`, `/export/batch`, `/jobs`) is estimated before any parsing
+starts: the sheet dimensions recorded in the `.xlsx` (`<dimension ref="A1:M5004">`)
+or, when a file does not record them, its size (`EXPORT_FILE_BYTES_PER_CELL`,
+default 4 bytes per cell), times the peak memory of the pipeline per cell
+(`EXPORT_BYTES_PER_CELL`, default 256; `benchmarks` sheets peak at 180-350).
+
+`ResourceGovernor` then admits exports while both budgets hold:
+
+- memory: the estimates of running exports stay within `EXPORT_MEMORY_BUDGET_MB`
+  (default: `EXPORT_MEMORY_FRACTION` of the memory of the host or its cgroup limit,
+  0.5; 2048 when neither is known). An export estimated above the budget is not
+  refused: it waits until nothing else runs and has the worker to itself, so the
+  1M-row, 12-column `benchmarks` sheets (about 13M cells, 3.1 GB at 256 bytes per
+  cell) run on any worker with more memory than that. Only exports over
+  `EXPORT_MAX_MEMORY_MB` (default: all the memory of the host) are rejected right
+  away with `ExportTooLargeError` instead of being parsed and killing the worker
+- CPU slots: at most `EXPORT_MAX_CONCURRENCY` exports run at once
+
+Exports that do not fit wait in a queue of at most `EXPORT_MAX_QUEUE` requests for
+at most `EXPORT_MAX_WAIT_SECONDS`; beyond that they fail with
+`ExecutorSaturatedError` (503 + Retry-After), so latency under load grows to a
+known bound instead of without one. The smallest estimate is served first; a
+request's priority improves the longer it waits (`EXPORT_QUEUE_AGING_SECONDS`), so
+large exports are delayed, never starved. Background jobs wait without those limits.
+
+In-flight LLM calls have their own process-wide limit, `LLM_MAX_IN_FLIGHT`, in
+`llm_client`.
+"""
+import asyncio
+import os
+import posixpath
+import re
+import time
+import xml.etree.ElementTree as ET
+import zipfile
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Union
+
+from .config import env_float, env_int
+from .executors import ExecutorSaturatedError, default_cpu_workers
+from .metrics import DURATION_BUCKETS, get_metrics
+
+_DIMENSION_RE = re.compile(rb'<(?:\w+:)?dimension\s+ref="(?:[A-Z]+\d+:)?([A-Z]+)(\d+)"')
+_REL_ID = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+
+
+class ExportCost:
+    """Estimated size of an export: sheet `cells` and peak `memory_bytes`.
+
+    `source` tells where the cell count came from: `dimension` or `size`.
+    """
+
+    def __init__(self, cells: int, memory_bytes: int, source: str = "size"):
+        self.cells = cells
+        self.memory_bytes = memory_bytes
+        self.source = source
+
+    def __add__(self, other: "ExportCost") -> "ExportCost":
+        source = self.source if self.source == other.source else "mixed"
+        return ExportCost(self.cells + other.cells, self.memory_bytes + other.memory_bytes, source)
+
+    def __repr__(self) -> str:
+        return f"ExportCost(cells={self.cells}, memory_bytes={self.memory_bytes}, source={self.source!r})"
+
+
+class ExportTooLargeError(ValueError):
+    """Raised for an export whose estimated memory exceeds what one export may use on this worker."""
+
+    def __init__(self, cost: ExportCost, limit: int):
+        super().__init__(
+            f"Export too large for this server: about {cost.cells:,} cells need an estimated "
+            f"{cost.memory_bytes / 1024 ** 2:.0f} MB, over the {limit / 1024 ** 2:.0f} MB limit of one export. "
+            f"Export fewer sheets or split the workbook."
+        )
+        self.cost = cost
+        self.limit = limit
+
+
+def _column_number(letters: bytes) -> int:
+    n = 0
+    for c in letters:
+        n = n * 26 + c - 64
+    return n
+
+
+def sheet_dimensions(path: Union[str, Path]) -> Dict[str, int]:
+    """Cells (rows x columns from A1) of every sheet of an `.xlsx`, as recorded in the file.
+
+    Only the workbook index and the first bytes of each sheet part are read. Sheets
+    without a usable dimension (missing, or just `A1`) are left out, as is
+    everything when the file is not a readable `.xlsx`.
+    """
+    dims: Dict[str, int] = {}
+    try:
+        with zipfile.ZipFile(path) as zf:
+            book = ET.fromstring(zf.read("xl/workbook.xml"))
+            rels = ET.fromstring(zf.read("xl/_rels/workbook.xml.rels"))
+            targets = {rel.get("Id"): rel.get("Target", "") for rel in rels}
+            for sheet in book.iter():
+                if not sheet.tag.endswith("}sheet"):
+                    continue
+                target = targets.get(sheet.get(_REL_ID), "")
+                part = target.lstrip("/") if target.startswith("/") else posixpath.normpath("xl/" + target)
+                try:
+                    with zf.open(part) as fh:
+                        head = fh.read(64 * 1024)
+                except KeyError:
+                    continue
+                match = _DIMENSION_RE.search(head.split(b"<sheetData", 1)[0])
+                if match:
+                    cells = _column_number(match.group(1)) * int(match.group(2))
+                    if cells > 1:
+                        dims[sheet.get("name")] = cells
+    except (OSError, zipfile.BadZipFile, ET.ParseError, KeyError):
+        return {}
+    return dims
+
+
+def estimate_export(path: Union[str, Path], size: int, sheets: Optional[Sequence[str]] = None) -> ExportCost:
+    """Estimate the cost of exporting `sheets` (None = every sheet) of the workbook at `path`.
+
+    Uses the recorded dimensions of the sheets when all of them have one, else the
+    file `size`. Blocking (reads the file): call it through `run_io`.
+    """
+    dims = sheet_dimensions(path)
+    wanted = list(sheets) if sheets is not None else list(dims)
+    if wanted and all(name in dims for name in wanted):
+        cells, source = sum(dims[name] for name in wanted), "dimension"
+    else:
+        cells, source = size // max(1, env_int("EXPORT_FILE_BYTES_PER_CELL", 4)), "size"
+    cells = max(1, cells)
+    return ExportCost(cells, cells * max(1, env_int("EXPORT_BYTES_PER_CELL", 256)), source)
+
+
+def _admissions():
+    return get_metrics().counter("export_admissions_total", "Export admission decisions", ("outcome",))
+
+
+class _Waiter:
+    def __init__(self, future: asyncio.Future, cost: ExportCost):
+        self.future = future
+        self.cost = cost
+        self.since = time.monotonic()
+
+    def priority(self, now: float, aging_seconds: float) -> float:
+        # smallest first; waiting shrinks the effective size so big requests get their turn
+        if aging_seconds <= 0:
+            return self.cost.memory_bytes
+        return self.cost.memory_bytes / (1 + (now - self.since) / aging_seconds)
+
+
+class ResourceGovernor:
+    """Admits exports within a memory budget (`memory_bytes`) and `max_active` CPU slots.
+
+    Exports estimated above the budget run alone, up to `max_export_bytes` (default:
+    the budget, so they are refused). See the module docs for the policy. Waiters
+    are plain futures of the running loop, so the governor is not bound to a single
+    event loop.
+    """
+
+    def __init__(self, memory_bytes: int, max_active: int, max_queued: int,
+                 max_wait: float = 60.0, aging_seconds: float = 10.0,
+                 max_export_bytes: Optional[int] = None):
+        self.memory_bytes = max(1, memory_bytes)
+        self.max_export_bytes = max(self.memory_bytes, max_export_bytes or 0)
+        self.max_active = max(1, max_active)
+        self.max_queued = max(0, max_queued)
+        self.max_wait = max_wait
+        self.aging_seconds = aging_seconds
+        self._active = 0
+        self._reserved = 0
+        self._waiters: List[_Waiter] = []
+
+    def check(self, cost: ExportCost) -> None:
+        """Raise `ExportTooLargeError` when `cost` could never be admitted."""
+        if cost.memory_bytes > self.max_export_bytes:
+            _admissions().inc(outcome="too_large")
+            raise ExportTooLargeError(cost, self.max_export_bytes)
+
+    def _reservation(self, cost: ExportCost) -> int:
+        # an export over the budget takes all of it: it only fits when nothing else runs
+        return min(cost.memory_bytes, self.memory_bytes)
+
+    def _fits(self, cost: ExportCost) -> bool:
+        return self._active < self.max_active and self._reserved + self._reservation(cost) <= self.memory_bytes
+
+    def _grant(self, cost: ExportCost) -> None:
+        self._active += 1
+        self._reserved += self._reservation(cost)
+
+    def _dispatch(self) -> None:
+        """Hand free resources to the best waiters, in priority order."""
+        self._waiters = [w for w in self._waiters if not w.future.done()]
+        now = time.monotonic()
+        while self._waiters:
+            best = min(self._waiters, key=lambda w: w.priority(now, self.aging_seconds))
+            if not self._fits(best.cost):
+                # nobody overtakes the best waiter, or large exports could starve
+                return
+            self._waiters.remove(best)
+            self._grant(best.cost)
+            best.future.set_result(None)
+
+    async def acquire(self, cost: ExportCost, interactive: bool = True) -> None:
+        """Wait until `cost` fits, then reserve it (release with `release(cost)`).
+
+        Raises `ExportTooLargeError` when it never fits, and for `interactive`
+        requests `ExecutorSaturatedError` when the queue is full or the wait exceeds
+        `max_wait`.
+        """
+        self.check(cost)
+        if not self._waiters and self._fits(cost):
+            self._grant(cost)
+            _admissions().inc(outcome="admitted")
+            return
+        if interactive and len(self._waiters) >= self.max_queued:
+            _admissions().inc(outcome="queue_full")
+            raise ExecutorSaturatedError(
+                f"Server busy: {self._active} exports running and {len(self._waiters)} queued"
+            )
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), cost)
+        self._waiters.append(waiter)
+        self._dispatch()
+        try:
+            if interactive and self.max_wait > 0:
+                await asyncio.wait_for(waiter.future, self.max_wait)
+            else:
+                await waiter.future
+        except BaseException as e:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # resources were handed to us right before we gave up; pass them on
+                self.release(cost)
+            else:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                self._dispatch()
+            if isinstance(e, asyncio.TimeoutError):
+                _admissions().inc(outcome="timeout")
+                raise ExecutorSaturatedError(
+                    f"Server busy: no capacity for this export within {self.max_wait:.0f}s",
+                    retry_after=max(1, int(self.max_wait)),
+                )
+            raise
+        _admissions().inc(outcome="admitted")
+        get_metrics().histogram("export_admission_wait_seconds", "Time exports waited for admission",
+                                DURATION_BUCKETS).observe(time.monotonic() - waiter.since)
+
+    def release(self, cost: ExportCost) -> None:
+        self._active = max(0, self._active - 1)
+        self._reserved = max(0, self._reserved - self._reservation(cost))
+        self._dispatch()
+
+    @asynccontextmanager
+    async def admit(self, cost: ExportCost, interactive: bool = True) -> AsyncIterator[None]:
+        await self.acquire(cost, interactive=interactive)
+        try:
+            yield
+        finally:
+            self.release(cost)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "active": self._active,
+            "queued": len(self._waiters),
+            "reserved_bytes": self._reserved,
+            "memory_budget_bytes": self.memory_bytes,
+            "max_export_bytes": self.max_export_bytes,
+            "max_active": self.max_active,
+            "max_queued": self.max_queued,
+        }
+
+
+def host_memory_bytes() -> Optional[int]:
+    """Physical memory of the host, or the cgroup memory limit when lower; None when unknown."""
+    sizes = []
+    try:
+        sizes.append(os.sysconf("SC_PHYS_PAGES") * os.sysconf("SC_PAGE_SIZE"))
+    except (AttributeError, OSError, ValueError):
+        pass
+    for limit_file in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        try:
+            sizes.append(int(Path(limit_file).read_text().strip()))
+        except (OSError, ValueError):
+            # missing, or "max" (no limit)
+            continue
+    sizes = [size for size in sizes if size > 0]
+    return min(sizes) if sizes else None
+
+
+_governor: Optional[ResourceGovernor] = None
+
+
+def get_governor() -> ResourceGovernor:
+    """Return the process-wide governor admitting exports (see module docs for the settings)."""
+    global _governor
+    if _governor is None:
+        host = host_memory_bytes()
+        budget = env_int("EXPORT_MEMORY_BUDGET_MB", 0) * 1024 ** 2
+        if budget <= 0:
+            budget = int(host * env_float("EXPORT_MEMORY_FRACTION", 0.5)) if host else 2048 * 1024 ** 2
+        _governor = ResourceGovernor(
+            memory_bytes=budget,
+            max_export_bytes=env_int("EXPORT_MAX_MEMORY_MB", 0) * 1024 ** 2 or host,
+            max_active=env_int("EXPORT_MAX_CONCURRENCY", default_cpu_workers() * 2),
+            max_queued=env_int("EXPORT_MAX_QUEUE", 16),
+            max_wait=env_float("EXPORT_MAX_WAIT_SECONDS", 60.0),
+            aging_seconds=env_float("EXPORT_QUEUE_AGING_SECONDS", 10.0),
+        )
+    return _governor
+
+
+__all__ = [
+    "ExportCost",
+    "ExportTooLargeError",
+    "ResourceGovernor",
+    "estimate_export",
+    "get_governor",
+    "host_memory_bytes",
+    "sheet_dimensions",
+]
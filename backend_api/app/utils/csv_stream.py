@@ -0,0 +1,86 @@
+import csv
+import re
+from typing import List, Optional
+
+_FENCE_RE = re.compile(r"^\s*```[\w-]*")
+
+
+class CsvStreamError(ValueError):
+    """Raised when streamed model output is not a consistent CSV."""
+
+
+class CsvStreamParser:
+    """Incremental CSV parser for model output that arrives in arbitrary fragments.
+
+    `feed()` accepts text as it streams in and returns the data rows completed by
+    it; `close()` flushes the last row. Markdown code fences are dropped on the fly
+    and lines before the first line containing a comma are treated as preamble (as
+    `_sanitize_llm_text_to_csv` does for whole replies). Quoted fields may span
+    lines. Every row is checked against the header width: short rows are padded
+    like `pandas.read_csv` does, longer rows raise `CsvStreamError`.
+    """
+
+    def __init__(self):
+        self.header: Optional[List[str]] = None
+        self.rows_parsed = 0
+        self._pending = ""
+        self._record: List[str] = []
+        self._quotes = 0
+
+    def feed(self, text: str) -> List[List[str]]:
+        self._pending += text
+        rows: List[List[str]] = []
+        while True:
+            nl = self._pending.find("\n")
+            if nl < 0:
+                break
+            line, self._pending = self._pending[:nl], self._pending[nl + 1:]
+            self._take_line(line, rows)
+        return rows
+
+    def close(self) -> List[List[str]]:
+        rows: List[List[str]] = []
+        if self._pending:
+            line, self._pending = self._pending, ""
+            self._take_line(line, rows)
+        if self._record:
+            raise CsvStreamError("unterminated quoted field at end of CSV")
+        if self.header is None:
+            raise CsvStreamError("no CSV content in model output")
+        return rows
+
+    def _take_line(self, line: str, rows: List[List[str]]) -> None:
+        line = line.rstrip("\r")
+        if not self._record:
+            fence = _FENCE_RE.match(line)
+            if fence:
+                line = line[fence.end():]
+                if not line.strip():
+                    return
+            if self.header is None and "," not in line:
+                # preamble before the CSV starts
+                return
+            if not line.strip():
+                return
+        self._record.append(line)
+        self._quotes += line.count('"')
+        if self._quotes % 2:
+            # inside a quoted field that continues on the next line
+            return
+        record = "\n".join(self._record)
+        self._record, self._quotes = [], 0
+        row = next(csv.reader([record]), [])
+        if self.header is None:
+            self.header = row
+            return
+        width = len(self.header)
+        if len(row) > width:
+            raise CsvStreamError(
+                f"row {self.rows_parsed + 1}: expected {width} columns, got {len(row)}")
+        if len(row) < width:
+            row = row + [""] * (width - len(row))
+        self.rows_parsed += 1
+        rows.append(row)
+
+
+__all__ = ["CsvStreamParser", "CsvStreamError"]
@@ -0,0 +1,190 @@
+"""LLM debug artifacts written off the request path.
+
+When an LLM reply cannot be used, the raw reply (or the prompt, which holds the
+sheet CSV, and the error) is worth keeping for debugging. `DebugArtifactWriter`
+hands it to one background thread that writes it gzip-compressed, so a failing
+request never waits on disk I/O. Bursts are bounded: at most `max_per_minute`
+artifacts are accepted (after `sample_rate` sampling), a small queue drops the
+overflow, each artifact is truncated to `max_chars`, and after every write the
+directory is pruned to `max_bytes` and `max_age_seconds`.
+"""
+import gzip
+import logging
+import queue
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Optional, Tuple
+
+from .config import env_bool, env_float, env_int, env_str
+from .metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DEBUG_DIR = Path(__file__).resolve().parents[2] / "data" / "llm_debug"
+ARTIFACT_GLOB = "llm_raw_*"
+
+
+def _dropped(reason: str) -> None:
+    get_metrics().counter("llm_debug_dropped_total", "LLM debug artifacts not written",
+                          ("reason",)).inc(reason=reason)
+
+
+class DebugArtifactWriter:
+    def __init__(self, directory: Path, max_bytes: int = 100 * 1024 * 1024,
+                 max_age_seconds: float = 7 * 24 * 3600, sample_rate: float = 1.0,
+                 max_per_minute: int = 10, max_chars: int = 2 * 1024 * 1024, queue_size: int = 16):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.sample_rate = sample_rate
+        self.max_per_minute = max_per_minute
+        self.max_chars = max_chars
+        self._queue: "queue.Queue[Optional[Tuple[str, str]]]" = queue.Queue(maxsize=max(1, queue_size))
+        self._lock = threading.Lock()
+        self._window_start = 0.0
+        self._window_count = 0
+        self._thread: Optional[threading.Thread] = None
+
+    def _admit(self) -> bool:
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            _dropped("sampled")
+            return False
+        now = time.monotonic()
+        with self._lock:
+            if now - self._window_start >= 60:
+                self._window_start, self._window_count = now, 0
+            if self.max_per_minute > 0 and self._window_count >= self.max_per_minute:
+                _dropped("rate")
+                return False
+            self._window_count += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="llm-debug-writer", daemon=True)
+                self._thread.start()
+        return True
+
+    def submit(self, text: str, tag: str = "") -> bool:
+        """Queue `text` to be saved as `llm_raw_<UTC-timestamp><tag>.txt.gz`; never blocks.
+
+        Returns False when the artifact was sampled out, rate limited or the queue was full.
+        """
+        if not self._admit():
+            return False
+        if len(text) > self.max_chars:
+            text = text[:self.max_chars] + f"\n\n--TRUNCATED: {len(text) - self.max_chars} more characters\n"
+        timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+        try:
+            self._queue.put_nowait((f"llm_raw_{timestamp}{tag}.txt.gz", text))
+        except queue.Full:
+            _dropped("queue_full")
+            return False
+        return True
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued artifact is written; False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def close(self, timeout: float = 5.0) -> None:
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout)
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                self._write(*item)
+            except Exception:
+                logger.exception("Failed saving LLM debug artifact")
+            finally:
+                self._queue.task_done()
+
+    def _write(self, name: str, text: str) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / name
+        with gzip.open(path, "wt", encoding="utf-8", compresslevel=6) as fh:
+            fh.write(text)
+        logger.info("LLM debug artifact saved to %s", path)
+        self.prune()
+
+    def prune(self) -> int:
+        """Drop artifacts older than `max_age_seconds`, then the oldest beyond `max_bytes`.
+
+        The newest artifact is always kept.
+        """
+        entries = []
+        for path in self.directory.glob(ARTIFACT_GLOB):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        entries.sort()
+        now = time.time()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for mtime, size, path in entries[:-1]:
+            if now - mtime <= self.max_age_seconds and total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+
+_writer: Optional[DebugArtifactWriter] = None
+_writer_config: Optional[Tuple[Any, ...]] = None
+_writer_lock = threading.Lock()
+
+
+def get_debug_writer() -> Optional[DebugArtifactWriter]:
+    """Return the shared debug artifact writer, or None when disabled (`LLM_DEBUG_ENABLED=0`).
+
+    Configured with `LLM_DEBUG_DIR`, `LLM_DEBUG_MAX_MB`, `LLM_DEBUG_TTL_SECONDS`,
+    `LLM_DEBUG_SAMPLE_RATE`, `LLM_DEBUG_MAX_PER_MINUTE` and `LLM_DEBUG_MAX_CHARS`.
+    """
+    global _writer, _writer_config
+    if not env_bool("LLM_DEBUG_ENABLED", True):
+        return None
+    config = (
+        env_str("LLM_DEBUG_DIR", str(DEFAULT_DEBUG_DIR)),
+        env_int("LLM_DEBUG_MAX_MB", 100) * 1024 * 1024,
+        env_float("LLM_DEBUG_TTL_SECONDS", 7 * 24 * 3600),
+        env_float("LLM_DEBUG_SAMPLE_RATE", 1.0),
+        env_int("LLM_DEBUG_MAX_PER_MINUTE", 10),
+        env_int("LLM_DEBUG_MAX_CHARS", 2 * 1024 * 1024),
+    )
+    with _writer_lock:
+        if _writer is None or _writer_config != config:
+            if _writer is not None:
+                _writer.close()
+            _writer = DebugArtifactWriter(Path(config[0]), max_bytes=config[1], max_age_seconds=config[2],
+                                          sample_rate=config[3], max_per_minute=config[4], max_chars=config[5])
+            _writer_config = config
+        return _writer
+
+
+def close_debug_writer() -> None:
+    """Write what is still queued and stop the writer thread (app shutdown)."""
+    global _writer, _writer_config
+    with _writer_lock:
+        writer, _writer, _writer_config = _writer, None, None
+    if writer is not None:
+        writer.close()
+
+
+__all__ = ["DebugArtifactWriter", "close_debug_writer", "get_debug_writer"]
@@ -0,0 +1,194 @@
+"""Compact column types for cleaned tables.
+
+Cleaned tables come out of the sheet parse as Python-object columns: every cell a
+boxed str, int, float or datetime. `compact_table` looks at an evenly spaced
+sample of each column (`TABLE_TYPES_SAMPLE_ROWS`, default 1000 non-empty cells)
+to guess its type, then converts the whole column, keeping the original when the
+full column disagrees with the sample:
+
+- numbers: the smallest nullable integer type that holds them (`MOD` years ->
+  `Int16`), else `float64`; numeric text converts like `pd.to_numeric` would
+- dates: `datetime64[ns]`; booleans: `boolean`
+- text: `category` when the sample has few distinct values (`TIPO DE UNIDAD`,
+  `ZONA`; at most `TABLE_CATEGORY_RATIO` distinct per row, default 0.5), else
+  Arrow-backed `string[pyarrow]` (object when `pyarrow` is not installed)
+- mixed columns stay object
+
+Values are unchanged, only their storage: rule application, CSV prompts and the
+xlsx writer see the same cells.
+
+Exports compact their tables unless `TABLE_COMPACT_TYPES=0`. Detection often splits
+a sheet into hundreds of small tables, so `compact_tables` stacks the tables of a
+sheet that have the same width, infers each column once over the whole block and
+splits it again: the tables of a sheet share their column types (and categories).
+"""
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from pandas.api.extensions import ExtensionArray
+from pandas.api.types import infer_dtype
+
+from .config import env_bool, env_float, env_int
+
+try:
+    import pyarrow  # noqa: F401 (backs the string dtype)
+    STRING_DTYPE: Optional[pd.StringDtype] = pd.StringDtype("pyarrow")
+except Exception:
+    STRING_DTYPE = None
+
+_NUMBER_KINDS = ("integer", "floating", "mixed-integer-float", "decimal")
+_DATE_KINDS = ("datetime", "datetime64", "date")
+_INT_TYPES = ("Int8", "Int16", "Int32", "Int64")
+
+ArrayLike = Union[np.ndarray, ExtensionArray]
+
+
+def _sample(values: np.ndarray, rows: int) -> np.ndarray:
+    """Up to `rows` evenly spaced values (deterministic, covers the whole column)."""
+    if len(values) <= rows:
+        return values
+    return values[np.linspace(0, len(values) - 1, rows).astype(np.intp)]
+
+
+def _compact_number(values: np.ndarray) -> ArrayLike:
+    """Integral numbers as the smallest nullable integer type; other floats as float64."""
+    if values.dtype.kind == "f":
+        present = values[~np.isnan(values)]
+        if not len(present) or not np.isfinite(present).all() or (present != np.floor(present)).any():
+            return values
+    elif values.dtype.kind in "iu":
+        present = values
+    else:
+        return values
+    if not len(present):
+        return values
+    lo, hi = present.min(), present.max()
+    for dtype in _INT_TYPES:
+        info = np.iinfo(dtype.lower())
+        if info.min <= lo and hi <= info.max:
+            return pd.array(values, dtype=dtype)
+    return values
+
+
+def _numeric(values: np.ndarray) -> Optional[ArrayLike]:
+    """`values` as numbers when every one parses as a number, else None."""
+    try:
+        numbers = pd.to_numeric(values)
+    except (ValueError, TypeError):
+        return None
+    return _compact_number(numbers) if numbers.dtype.kind in "iuf" else None
+
+
+def _text(values: np.ndarray, present: int, sample: np.ndarray, category_ratio: float) -> ArrayLike:
+    if len(pd.unique(sample)) <= category_ratio * len(sample):
+        categorical = pd.Categorical(values)
+        if len(categorical.categories) <= category_ratio * present:
+            return categorical
+    return pd.array(values, dtype=STRING_DTYPE) if STRING_DTYPE is not None else values
+
+
+def _infer(values: np.ndarray, sample_rows: int, category_ratio: float) -> ArrayLike:
+    if values.dtype.kind in "iuf":
+        return _compact_number(values)
+    if values.dtype != object:
+        return values
+    present = values[~pd.isna(values)]
+    if not len(present):
+        return values
+    sample = _sample(present, sample_rows)
+    kind = infer_dtype(sample, skipna=False)
+
+    def confirmed(kinds: Tuple[str, ...]) -> bool:
+        # the sample only proposes a type; the whole column must agree
+        return len(sample) == len(present) or infer_dtype(present, skipna=False) in kinds
+
+    if kind in _NUMBER_KINDS:
+        numbers = _numeric(values) if confirmed(_NUMBER_KINDS) else None
+        return values if numbers is None else numbers
+    if kind == "boolean":
+        return pd.array(values, dtype="boolean") if confirmed(("boolean",)) else values
+    if kind in _DATE_KINDS:
+        if not confirmed(_DATE_KINDS):
+            return values
+        try:
+            return pd.to_datetime(values).array
+        except (ValueError, TypeError, OverflowError):
+            # mixed time zones or out-of-range dates
+            return values
+    if kind != "string" or not confirmed(("string",)):
+        return values
+    if pd.notna(pd.to_numeric(sample, errors="coerce")).all():
+        numbers = _numeric(values)
+        if numbers is not None:
+            return numbers
+    return _text(values, len(present), sample, category_ratio)
+
+
+def infer_column(col: pd.Series, sample_rows: int = 1000, category_ratio: float = 0.5) -> pd.Series:
+    """`col` converted to the most compact dtype that keeps every value (see module docs)."""
+    return pd.Series(_infer(col.to_numpy(), sample_rows, category_ratio), index=col.index, name=col.name)
+
+
+def compact_table(df: pd.DataFrame, sample_rows: Optional[int] = None,
+                  category_ratio: Optional[float] = None) -> pd.DataFrame:
+    """A copy of `df` with every column converted by `infer_column`."""
+    if sample_rows is None:
+        sample_rows = max(1, env_int("TABLE_TYPES_SAMPLE_ROWS", 1000))
+    if category_ratio is None:
+        category_ratio = env_float("TABLE_CATEGORY_RATIO", 0.5)
+    # work on the column arrays: cleaned sheets often hold hundreds of small tables,
+    # where per-column Series overhead would dominate
+    arrays = {i: _infer(col.to_numpy(), sample_rows, category_ratio) for i, (_, col) in enumerate(df.items())}
+    out = pd.DataFrame(arrays, index=df.index)
+    out.columns = df.columns
+    return out
+
+
+def memory_bytes(df: pd.DataFrame) -> int:
+    """Bytes held by `df`, including the Python objects of object columns."""
+    return int(df.memory_usage(deep=True).sum())
+
+
+def shallow_memory_bytes(df: pd.DataFrame) -> int:
+    """Bytes of the column arrays of `df`, not of the objects they point to (cheap)."""
+    return int(sum(col.nbytes for _, col in df.items()))
+
+
+def compact_types_enabled() -> bool:
+    """Whether exports compact their tables (`TABLE_COMPACT_TYPES`, default on; see module docs)."""
+    return env_bool("TABLE_COMPACT_TYPES", True)
+
+
+def compact_tables(tables: Dict[str, pd.DataFrame], sample_rows: Optional[int] = None,
+                   category_ratio: Optional[float] = None
+                   ) -> Tuple[Dict[str, pd.DataFrame], Dict[str, int]]:
+    """`compact_table` over the tables of a sheet, with their memory `before` and `after`.
+
+    Tables of the same width are typed as one stacked block (see module docs); the
+    memory is measured on the blocks, so shared categories count once.
+    """
+    blocks: Dict[int, List[str]] = defaultdict(list)
+    for name, df in tables.items():
+        blocks[df.shape[1]].append(name)
+    out: Dict[str, pd.DataFrame] = {}
+    memory = {"before": 0, "after": 0}
+    for width, names in blocks.items():
+        parts = [tables[name] for name in names]
+        block = pd.concat([df.set_axis(range(width), axis=1) for df in parts], ignore_index=True)
+        memory["before"] += memory_bytes(block)
+        block = compact_table(block, sample_rows, category_ratio)
+        memory["after"] += memory_bytes(block)
+        start = 0
+        for name, df in zip(names, parts):
+            # row slices do not overlap, so the tables can share the block's arrays
+            typed = block.iloc[start:start + len(df)].copy(deep=False)
+            typed.index, typed.columns = df.index, df.columns
+            out[name] = typed
+            start += len(df)
+    return {name: out[name] for name in tables}, memory
+
+
+__all__ = ["STRING_DTYPE", "compact_table", "compact_tables", "compact_types_enabled", "infer_column",
+           "memory_bytes", "shallow_memory_bytes"]
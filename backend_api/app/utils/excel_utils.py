@@ -1,7 +1,171 @@
+import numpy as np
 import pandas as pd
 from fastapi import UploadFile
 import io
-from typing import Dict
+import logging
+import re
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple, Union
+
+from .config import env_int
+from .dtype_inference import compact_table, compact_types_enabled
+from .excel_readers import SpreadsheetReader, open_reader
+from .sheet_cache import get_sheet_cache
+from .uploads import spool_upload
+
+logger = logging.getLogger(__name__)
+
+
+class ExcelWorkbook:
+    """A workbook opened once and parsed lazily, one sheet at a time.
+
+    Opening only reads the workbook index (sheet names); a sheet is parsed the first
+    time it is requested and the resulting DataFrame is cached, so detection, the
+    `normalize_dataframe` fallback and any later stage share a single parse.
+    Returned frames are shared: callers must copy before mutating. Parsing is done
+    by the backend `reader` (see `excel_readers`; default `EXCEL_READER`, `auto`).
+
+    With `digest` (the workbook's SHA-256) sheet names and raw sheets are read from
+    and written to the sheet cache (see `sheet_cache`); the file itself is only
+    opened when something is not cached yet.
+    """
+
+    def __init__(self, source: Union[bytes, bytearray, str, Path, BinaryIO], reader: Optional[str] = None,
+                 digest: Optional[str] = None):
+        if isinstance(source, (bytes, bytearray)):
+            source = io.BytesIO(source)
+        self._source = source
+        self._reader_name = reader
+        self._reader: Optional[SpreadsheetReader] = None
+        self._sheets: Dict[Tuple[str, Any], pd.DataFrame] = {}
+        self._cache = get_sheet_cache() if digest else None
+        self._digest = digest
+        self._names: Optional[List[str]] = None
+
+    def _open(self) -> SpreadsheetReader:
+        if self._reader is None:
+            self._reader = open_reader(self._source, self._reader_name)
+        return self._reader
+
+    def _cached(self, kind: str, name: str = "",
+                variant: str = "") -> Optional[Tuple[Dict[str, pd.DataFrame], Dict[str, Any]]]:
+        if self._cache is None:
+            return None
+        return self._cache.load(self._cache.make_key(self._digest, kind, name, variant))
+
+    def _store(self, kind: str, name: str, frames: Dict[str, pd.DataFrame], meta: Dict[str, Any],
+               variant: str = "") -> None:
+        if self._cache is None:
+            return
+        try:
+            self._cache.store(self._cache.make_key(self._digest, kind, name, variant), self._digest, frames, meta)
+        except Exception as e:
+            # caching is an optimisation: never fail the parse because of it
+            logger.warning("Could not cache %s '%s' of workbook %s: %s", kind, name, self._digest[:12], e)
+
+    @property
+    def sheet_names(self) -> List[str]:
+        if self._names is None:
+            entry = self._cached("sheet_names")
+            if entry is not None:
+                self._names = list(entry[1]["sheet_names"])
+            else:
+                self._names = self._open().sheet_names
+                self._store("sheet_names", "", {}, {"sheet_names": self._names})
+        return self._names
+
+    def has_sheet(self, name: str) -> bool:
+        return name in self.sheet_names
+
+    def sheet(self, name: str, dtype: Optional[Any] = None) -> pd.DataFrame:
+        """Return the raw (header-less) contents of sheet `name`, parsing it on first use.
+
+        Raises ValueError if the sheet does not exist.
+        """
+        if not self.has_sheet(name):
+            raise ValueError(f"Sheet '{name}' not found. Available sheets: {self.sheet_names}")
+        key = (name, dtype)
+        if key not in self._sheets:
+            entry = self._cached("raw", name, str(dtype))
+            if entry is not None:
+                self._sheets[key] = entry[0]["sheet"]
+            else:
+                self._sheets[key] = self._open().read_sheet(name, dtype=dtype)
+                self._store("raw", name, {"sheet": self._sheets[key]}, {}, str(dtype))
+        return self._sheets[key]
+
+    def close(self) -> None:
+        self._sheets.clear()
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+    def __enter__(self) -> "ExcelWorkbook":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+SUMMARY_KEYWORDS = ("total", "resumen", "subtotal", "desglose")
+_SUMMARY_RE = re.compile("|".join(re.escape(k) for k in SUMMARY_KEYWORDS), flags=re.IGNORECASE)
+
+
+def _object_columns(df: pd.DataFrame) -> List[int]:
+    """Positions of object-dtype columns (the only ones that can hold strings)."""
+    return [i for i, dt in enumerate(df.dtypes) if dt == object]
+
+
+def blank_mask(df: pd.DataFrame) -> np.ndarray:
+    """Boolean matrix marking cells that are NaN/None or whitespace-only strings.
+
+    Computed column-wise: only object columns are inspected for blank strings.
+    """
+    mask = df.isna().to_numpy()
+    for i in _object_columns(df):
+        col = df.iloc[:, i]
+        try:
+            stripped = col.str.strip()
+        except AttributeError:
+            # object column without any strings
+            continue
+        mask[:, i] |= (stripped == "").to_numpy(dtype=bool, na_value=False)
+    return mask
+
+
+def strip_strings(df: pd.DataFrame) -> pd.DataFrame:
+    """Strip surrounding whitespace from string cells, column by column (in place)."""
+    for i in _object_columns(df):
+        col = df.iloc[:, i]
+        try:
+            stripped = col.str.strip()
+        except AttributeError:
+            continue
+        # non-string cells become NaN under .str; keep their original value
+        df.isetitem(i, stripped.where(stripped.notna(), col))
+    return df
+
+
+def summary_row_mask(df: pd.DataFrame, col_count: Optional[int] = None) -> np.ndarray:
+    """Rows that look like totals: a summary keyword in some cell and a sparse row.
+
+    A row is a summary when any string cell matches `SUMMARY_KEYWORDS` and it has at
+    most `max(3, 25% of col_count)` non-empty cells.
+    """
+    if col_count is None:
+        col_count = df.shape[1]
+    has_keyword = np.zeros(len(df), dtype=bool)
+    for i in _object_columns(df):
+        col = df.iloc[:, i]
+        try:
+            hits = col.str.contains(_SUMMARY_RE, na=False)
+        except AttributeError:
+            continue
+        has_keyword |= hits.to_numpy(dtype=bool, na_value=False)
+    if not has_keyword.any():
+        return has_keyword
+    non_null = df.notna().to_numpy().sum(axis=1)
+    return has_keyword & (non_null <= max(3, int(0.25 * col_count)))
 
 
 async def read_excel_from_upload(file: UploadFile, sheet: str) -> pd.DataFrame:
@@ -11,15 +175,63 @@ async def read_excel_from_upload(file: UploadFile, sheet: str) -> pd.DataFrame:
 
     This function reads the sheet without inferring headers so we can detect and
     normalize the header row (promote header), drop empty rows/columns and trim strings.
+    The upload is spooled to disk (see `spool_upload`) and parsed from the file.
+    Cells are read as objects so header rows above numbers keep their text; the
+    normalized table then gets compact column types unless `TABLE_COMPACT_TYPES=0`
+    (see `dtype_inference`).
     """
-    contents = await file.read()
-    with io.BytesIO(contents) as b:
-        xl = pd.ExcelFile(b)
-        if sheet not in xl.sheet_names:
-            raise ValueError(f"Sheet '{sheet}' not found. Available sheets: {xl.sheet_names}")
-        df = pd.read_excel(xl, sheet_name=sheet, header=None, dtype=object)
+    upload = await spool_upload(file)
+    with upload, ExcelWorkbook(upload.path, digest=upload.sha256) as wb:
+        df = wb.sheet(sheet, dtype=object)
         df = normalize_dataframe(df)
-        return df
+        return compact_table(df) if compact_types_enabled() else df
+
+
+def _excel_rows(df: pd.DataFrame, chunk_rows: int) -> Iterator[tuple]:
+    """Rows of `df` as plain tuples, converted one chunk at a time (NaN/NaT -> None)."""
+    for start in range(0, len(df), chunk_rows):
+        chunk = df.iloc[start:start + chunk_rows].astype(object)
+        chunk = chunk.where(chunk.notna(), None)
+        yield from chunk.itertuples(index=False, name=None)
+
+
+def write_excel(sheets: Dict[str, pd.DataFrame], dest: Union[str, Path, BinaryIO],
+                chunk_rows: Optional[int] = None) -> None:
+    """Write {sheet_name: DataFrame} as an .xlsx to `dest` (path or binary file).
+
+    Uses openpyxl's write-only mode: rows are streamed to the workbook part files
+    `chunk_rows` at a time (`EXCEL_WRITE_CHUNK_ROWS`, default 10000) instead of
+    building every cell object in memory first, so memory stays flat for large
+    exports. Headers are written in bold, like `DataFrame.to_excel`.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+
+    if chunk_rows is None:
+        chunk_rows = max(1, env_int("EXCEL_WRITE_CHUNK_ROWS", 10_000))
+    wb = Workbook(write_only=True)
+    bold = Font(bold=True)
+    for name, df in sheets.items():
+        ws = wb.create_sheet(title=name[:31])
+        header = []
+        for col in df.columns:
+            value = col if isinstance(col, (str, int, float)) else str(col)
+            cell = WriteOnlyCell(ws, value=None if pd.isna(value) else value)
+            cell.font = bold
+            header.append(cell)
+        ws.append(header)
+        for row in _excel_rows(df, chunk_rows):
+            ws.append(row)
+    if not sheets:
+        wb.create_sheet(title="Sheet1")
+    wb.save(dest)
+
+
+def dataframe_to_excel_file(sheets: Dict[str, pd.DataFrame], path: Union[str, Path]) -> str:
+    """Write the .xlsx to `path` and return it (picklable, for the CPU executor)."""
+    write_excel(sheets, path)
+    return str(path)
 
 
 def dataframe_to_excel_bytes(sheets: Dict[str, pd.DataFrame]) -> bytes:
@@ -27,9 +239,7 @@ def dataframe_to_excel_bytes(sheets: Dict[str, pd.DataFrame]) -> bytes:
     Given a dict of {sheet_name: DataFrame}, return bytes of an .xlsx file.
     """
     with io.BytesIO() as out:
-        with pd.ExcelWriter(out, engine="openpyxl") as writer:
-            for name, df in sheets.items():
-                df.to_excel(writer, sheet_name=name[:31], index=False)
+        write_excel(sheets, out)
         return out.getvalue()
 
 
@@ -93,25 +303,10 @@ def normalize_dataframe(df: pd.DataFrame) -> pd.DataFrame:
     df = df.dropna(axis=1, how='all')
 
     # Trim whitespace in string cells
-    df = df.applymap(lambda v: v.strip() if isinstance(v, str) else v)
-
-    # Remove obvious summary rows
-    keywords = ("total", "resumen", "subtotal", "desglose", "resumen")
-    def is_summary_row(row):
-        non_null = row.notna().sum()
-        # if row contains any keyword and is relatively sparse, consider it summary
-        for v in row.tolist():
-            try:
-                s = str(v).strip().lower()
-            except Exception:
-                s = ""
-            if any(k in s for k in keywords):
-                if non_null <= max(3, int(0.25 * col_count)):
-                    return True
-        return False
-
-    mask = df.apply(lambda r: not is_summary_row(r), axis=1)
-    df = df.loc[mask].reset_index(drop=True)
+    df = strip_strings(df)
+
+    # Remove obvious summary rows (keyword in some cell and sparse row)
+    df = df.loc[~summary_row_mask(df, col_count)].reset_index(drop=True)
 
     # Drop fully empty rows again if any
     df = df.dropna(axis=0, how='all').reset_index(drop=True)
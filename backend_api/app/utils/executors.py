@@ -0,0 +1,111 @@
+import asyncio
+import functools
+import logging
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+from .config import env_int, env_str
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutorSaturatedError(RuntimeError):
+    """Raised when a worker has no free export slot and its wait queue is full."""
+
+    def __init__(self, message: str, retry_after: int = 5):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+_lock = threading.Lock()
+_cpu_executor: Optional[Executor] = None
+_io_executor: Optional[ThreadPoolExecutor] = None
+
+
+def default_cpu_workers() -> int:
+    """CPU pool size when `EXPORT_CPU_WORKERS` is not set: the CPU count, capped at 4."""
+    return max(1, min(4, os.cpu_count() or 1))
+
+
+def get_cpu_executor() -> Executor:
+    """Return the shared executor for CPU-bound work (parse/clean/write).
+
+    `EXPORT_CPU_EXECUTOR=process` (default) uses a process pool so pandas/openpyxl work
+    does not hold the GIL of the serving process; `thread` is handy for debugging.
+    """
+    global _cpu_executor
+    with _lock:
+        if _cpu_executor is None:
+            workers = max(1, env_int("EXPORT_CPU_WORKERS", default_cpu_workers()))
+            kind = (env_str("EXPORT_CPU_EXECUTOR", "process") or "process").lower()
+            if kind == "thread":
+                _cpu_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="export-cpu")
+            else:
+                _cpu_executor = ProcessPoolExecutor(max_workers=workers)
+            logger.debug("CPU executor created kind=%s workers=%d", kind, workers)
+        return _cpu_executor
+
+
+def get_io_executor() -> ThreadPoolExecutor:
+    """Return the shared thread pool for blocking I/O such as LLM calls."""
+    global _io_executor
+    with _lock:
+        if _io_executor is None:
+            workers = max(1, env_int("EXPORT_IO_WORKERS", 8))
+            _io_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="export-io")
+        return _io_executor
+
+
+def _reset_cpu_executor(broken: Executor) -> None:
+    global _cpu_executor
+    with _lock:
+        if _cpu_executor is broken:
+            _cpu_executor = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+async def run_cpu(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Run `fn(*args, **kwargs)` in the CPU executor without blocking the event loop.
+
+    `fn` and its arguments must be picklable when the process pool is used.
+    """
+    executor = get_cpu_executor()
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM kill); drop the pool so the next request gets a fresh one
+        logger.exception("CPU process pool is broken; it will be recreated")
+        _reset_cpu_executor(executor)
+        raise
+
+
+async def run_io(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Run a blocking I/O callable in the shared thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_io_executor(), functools.partial(fn, *args, **kwargs))
+
+
+def shutdown_executors(wait: bool = True) -> None:
+    """Shut down the shared executors (called on application shutdown)."""
+    global _cpu_executor, _io_executor
+    with _lock:
+        cpu, io_ = _cpu_executor, _io_executor
+        _cpu_executor = _io_executor = None
+    for ex in (cpu, io_):
+        if ex is not None:
+            ex.shutdown(wait=wait, cancel_futures=True)
+
+
+__all__ = [
+    "ExecutorSaturatedError",
+    "default_cpu_workers",
+    "get_cpu_executor",
+    "get_io_executor",
+    "run_cpu",
+    "run_io",
+    "shutdown_executors",
+]
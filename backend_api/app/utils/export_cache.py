@@ -0,0 +1,209 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+
+from .config import env_bool, env_float, env_int, env_str
+from .uploads import link_or_copy
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+DEFAULT_CACHE_DIR = BASE_DIR / "data" / "cache" / "exports"
+
+
+class ExportCache:
+    """Disk cache of finished export workbooks.
+
+    Each entry is one xlsx file in `directory`, indexed in a SQLite file next to
+    it and keyed by a SHA-256 of everything that determines the output (see
+    `make_key`). Files are handed out as hard links (copies across filesystems),
+    so callers may delete what they get. Eviction drops entries older than
+    `max_age_seconds` and then the least recently used ones until the stored
+    files fit in `max_bytes`. Hit/miss counters are kept per process.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int = 512 * 1024 * 1024,
+                 max_age_seconds: float = 24 * 3600):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.directory / "index.sqlite3"), timeout=10,
+                                     check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS export_cache ("
+            " key TEXT PRIMARY KEY, rules_id TEXT NOT NULL, rules_version TEXT NOT NULL,"
+            " size INTEGER NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS export_cache_accessed ON export_cache(accessed)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS export_cache_rules ON export_cache(rules_id)")
+
+    @staticmethod
+    def make_key(workbook_sha256: str, sheet: str, rules_id: str, rules_version: str, engine: str) -> str:
+        """Hash of workbook content hash, sheet, rule set id and version and engine/model."""
+        h = hashlib.sha256()
+        for part in (workbook_sha256, sheet, rules_id, rules_version, engine):
+            data = (part or "").encode("utf-8")
+            # length-prefix every part so field boundaries can't collide
+            h.update(len(data).to_bytes(8, "big"))
+            h.update(data)
+        return h.hexdigest()
+
+    def _file(self, key: str) -> Path:
+        return self.directory / f"{key}.xlsx"
+
+    def fetch(self, key: str, dest: Union[str, Path]) -> bool:
+        """Place the cached workbook for `key` at `dest`; False on a miss."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT created FROM export_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.max_age_seconds > 0 and now - row[0] > self.max_age_seconds:
+                self._delete_locked(key)
+                row = None
+            if row is not None:
+                try:
+                    link_or_copy(self._file(key), Path(dest))
+                except FileNotFoundError:
+                    # file removed behind the index (e.g. by another process)
+                    self._delete_locked(key)
+                    row = None
+            if row is None:
+                self.misses += 1
+                return False
+            self._conn.execute("UPDATE export_cache SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return True
+
+    def store(self, key: str, src: Union[str, Path], rules_id: str, rules_version: str) -> None:
+        """Add the workbook at `src` under `key` (`src` itself is left in place)."""
+        now = time.time()
+        size = Path(src).stat().st_size
+        if self.max_bytes > 0 and size > self.max_bytes:
+            return
+        tmp = self.directory / f".{key}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            link_or_copy(Path(src), tmp)
+            os.replace(tmp, self._file(key))
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO export_cache (key, rules_id, rules_version, size, created, accessed)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, rules_id, rules_version, size, now, now),
+            )
+            self._evict_locked(now)
+
+    def invalidate(self, rules_id: Optional[str] = None, keep_version: Optional[str] = None) -> int:
+        """Drop the entries of rule set `rules_id` (all entries if None), except `keep_version`.
+
+        Returns the number of entries removed.
+        """
+        query, params = "SELECT key FROM export_cache WHERE 1 = 1", []
+        if rules_id is not None:
+            query += " AND rules_id = ?"
+            params.append(rules_id)
+        if keep_version is not None:
+            query += " AND rules_version != ?"
+            params.append(keep_version)
+        with self._lock:
+            keys = [k for (k,) in self._conn.execute(query, params).fetchall()]
+            for key in keys:
+                self._delete_locked(key)
+        return len(keys)
+
+    def evict(self) -> None:
+        with self._lock:
+            self._evict_locked(time.time())
+
+    def _delete_locked(self, key: str) -> None:
+        self._conn.execute("DELETE FROM export_cache WHERE key = ?", (key,))
+        self._file(key).unlink(missing_ok=True)
+
+    def _evict_locked(self, now: float) -> None:
+        if self.max_age_seconds > 0:
+            expired = self._conn.execute("SELECT key FROM export_cache WHERE created < ?",
+                                         (now - self.max_age_seconds,)).fetchall()
+            for (key,) in expired:
+                self._delete_locked(key)
+        if self.max_bytes <= 0:
+            return
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM export_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        freed = 0
+        victims = []
+        for key, size in self._conn.execute("SELECT key, size FROM export_cache ORDER BY accessed ASC"):
+            victims.append(key)
+            freed += size
+            if freed >= excess:
+                break
+        for key in victims:
+            self._delete_locked(key)
+
+    def clear(self) -> None:
+        self.invalidate()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM export_cache").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "max_age_seconds": self.max_age_seconds,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_cache: Optional[ExportCache] = None
+_cache_config: Optional[Tuple[str, int, float]] = None
+_cache_lock = threading.Lock()
+
+
+def get_export_cache() -> Optional[ExportCache]:
+    """Return the shared export cache, or None when disabled (`EXPORT_CACHE_ENABLED=0`).
+
+    Configured with `EXPORT_CACHE_DIR`, `EXPORT_CACHE_MAX_MB` and `EXPORT_CACHE_TTL_SECONDS`.
+    """
+    global _cache, _cache_config
+    if not env_bool("EXPORT_CACHE_ENABLED", True):
+        return None
+    config = (
+        env_str("EXPORT_CACHE_DIR", str(DEFAULT_CACHE_DIR)),
+        env_int("EXPORT_CACHE_MAX_MB", 512) * 1024 * 1024,
+        env_float("EXPORT_CACHE_TTL_SECONDS", 24 * 3600),
+    )
+    with _cache_lock:
+        if _cache is None or _cache_config != config:
+            if _cache is not None:
+                _cache.close()
+            try:
+                _cache = ExportCache(Path(config[0]), max_bytes=config[1], max_age_seconds=config[2])
+                _cache_config = config
+            except Exception:
+                logger.exception("Could not open export cache at %s; caching disabled", config[0])
+                _cache = _cache_config = None
+        return _cache
+
+
+__all__ = ["ExportCache", "get_export_cache"]
@@ -0,0 +1,169 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import env_float, env_str
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+DEFAULT_JOBS_DIR = BASE_DIR / "data" / "jobs"
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+_COLUMNS = ("id", "status", "stage", "progress", "params", "filename", "input_path",
+            "result_path", "result_name", "error", "created", "updated")
+
+
+class JobStore:
+    """SQLite-backed queue and state of background jobs.
+
+    Several app processes may share one store: `claim_next` hands every queued job
+    to exactly one worker. `progress` and `params` are JSON objects. Finished jobs
+    and their files are removed by `purge` once older than `ttl_seconds`.
+    """
+
+    def __init__(self, path: Path, ttl_seconds: float = 24 * 3600):
+        self.path = Path(path)
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), timeout=10, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, status TEXT NOT NULL, stage TEXT NOT NULL,"
+            " progress TEXT NOT NULL, params TEXT NOT NULL, filename TEXT,"
+            " input_path TEXT, result_path TEXT, result_name TEXT, error TEXT,"
+            " created REAL NOT NULL, updated REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs(status, created)")
+
+    @staticmethod
+    def _row(row: Optional[tuple]) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        job = dict(zip(_COLUMNS, row))
+        job["progress"] = json.loads(job["progress"])
+        job["params"] = json.loads(job["params"])
+        return job
+
+    def create(self, params: Dict[str, Any], filename: str, input_path: str) -> Dict[str, Any]:
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, stage, progress, params, filename, input_path,"
+                " created, updated) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED, QUEUED, "{}", json.dumps(params), filename, input_path, now, now),
+            )
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ?",
+                                     (job_id,)).fetchone()
+        return self._row(row)
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        """Set columns of a job; `progress` is stored as JSON."""
+        if "progress" in fields:
+            fields["progress"] = json.dumps(fields["progress"])
+        fields["updated"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def claim_next(self) -> Optional[Dict[str, Any]]:
+        """Mark the oldest queued job as running and return it (None if none is queued)."""
+        with self._lock:
+            while True:
+                row = self._conn.execute("SELECT id FROM jobs WHERE status = ? ORDER BY created LIMIT 1",
+                                         (QUEUED,)).fetchone()
+                if row is None:
+                    return None
+                claimed = self._conn.execute(
+                    "UPDATE jobs SET status = ?, updated = ? WHERE id = ? AND status = ?",
+                    (RUNNING, time.time(), row[0], QUEUED),
+                ).rowcount
+                if claimed:
+                    break
+                # another process claimed it first
+            job = self._conn.execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ?",
+                                     (row[0],)).fetchone()
+        return self._row(job)
+
+    def count(self, status: str) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)).fetchone()[0]
+
+    def requeue_stale(self, stale_seconds: float) -> int:
+        """Put running jobs without progress for `stale_seconds` back in the queue.
+
+        Such jobs belonged to a worker that stopped (restart, crash) mid-run.
+        """
+        cutoff = time.time() - stale_seconds
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE jobs SET status = ?, stage = ?, progress = ?, updated = ? WHERE status = ? AND updated < ?",
+                (QUEUED, QUEUED, "{}", time.time(), RUNNING, cutoff)).rowcount
+
+    def purge(self) -> int:
+        """Delete finished jobs older than `ttl_seconds` together with their files."""
+        if self.ttl_seconds <= 0:
+            return 0
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, input_path, result_path FROM jobs WHERE status IN (?, ?) AND updated < ?",
+                (DONE, FAILED, cutoff)).fetchall()
+            self._conn.executemany("DELETE FROM jobs WHERE id = ?", [(r[0],) for r in rows])
+        for _, *paths in rows:
+            for p in paths:
+                if p:
+                    Path(p).unlink(missing_ok=True)
+        return len(rows)
+
+    def list(self, limit: int = 50) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs ORDER BY created DESC LIMIT ?",
+                                      (limit,)).fetchall()
+        return [self._row(r) for r in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def jobs_dir() -> Path:
+    """Directory for job inputs, results and the store (`JOBS_DIR`)."""
+    path = Path(env_str("JOBS_DIR", str(DEFAULT_JOBS_DIR)))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+_store: Optional[JobStore] = None
+_store_config: Optional[Tuple[str, float]] = None
+_store_lock = threading.Lock()
+
+
+def get_job_store() -> JobStore:
+    """Shared job store at `JOBS_DIR/jobs.sqlite3`; finished jobs kept `JOBS_TTL_SECONDS`."""
+    global _store, _store_config
+    config = (str(jobs_dir() / "jobs.sqlite3"), env_float("JOBS_TTL_SECONDS", 24 * 3600))
+    with _store_lock:
+        if _store is None or _store_config != config:
+            if _store is not None:
+                _store.close()
+            _store = JobStore(Path(config[0]), ttl_seconds=config[1])
+            _store_config = config
+        return _store
+
+
+__all__ = ["JobStore", "get_job_store", "jobs_dir", "QUEUED", "RUNNING", "DONE", "FAILED"]
@@ -0,0 +1,157 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from .config import env_bool, env_float, env_int, env_str
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+DEFAULT_CACHE_PATH = BASE_DIR / "data" / "cache" / "llm_cache.sqlite3"
+
+
+class LLMCache:
+    """Disk-backed, content-addressed cache of LLM transformation results.
+
+    Entries live in a SQLite file and are keyed by a SHA-256 of everything that
+    determines the model output (see `make_key`). Eviction drops entries older than
+    `max_age_seconds` and then the least recently used ones until the stored text
+    fits in `max_bytes`. Hit/miss counters are kept per process.
+    """
+
+    def __init__(self, path: Path, max_bytes: int = 256 * 1024 * 1024,
+                 max_age_seconds: float = 7 * 24 * 3600):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), timeout=10, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+            " created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache(accessed)")
+
+    @staticmethod
+    def make_key(model: str, system_prompt: str, rules_json: str, payload: str) -> str:
+        """Hash of model, system prompt, rules JSON and CSV payload."""
+        h = hashlib.sha256()
+        for part in (model, system_prompt, rules_json, payload):
+            data = (part or "").encode("utf-8")
+            # length-prefix every part so field boundaries can't collide
+            h.update(len(data).to_bytes(8, "big"))
+            h.update(data)
+        return h.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None or (self.max_age_seconds > 0 and now - row[1] > self.max_age_seconds):
+                if row is not None:
+                    self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE llm_cache SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, value: str) -> None:
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        if self.max_bytes > 0 and size > self.max_bytes:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now),
+            )
+            self._evict_locked(now)
+
+    def evict(self) -> None:
+        with self._lock:
+            self._evict_locked(time.time())
+
+    def _evict_locked(self, now: float) -> None:
+        if self.max_age_seconds > 0:
+            self._conn.execute("DELETE FROM llm_cache WHERE created < ?", (now - self.max_age_seconds,))
+        if self.max_bytes <= 0:
+            return
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        freed = 0
+        victims = []
+        for key, size in self._conn.execute("SELECT key, size FROM llm_cache ORDER BY accessed ASC"):
+            victims.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self._conn.executemany("DELETE FROM llm_cache WHERE key = ?", victims)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "max_age_seconds": self.max_age_seconds,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_cache: Optional[LLMCache] = None
+_cache_config: Optional[Tuple[str, int, float]] = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> Optional[LLMCache]:
+    """Return the shared LLM cache, or None when disabled (`LLM_CACHE_ENABLED=0`).
+
+    Configured with `LLM_CACHE_PATH`, `LLM_CACHE_MAX_MB` and `LLM_CACHE_TTL_SECONDS`.
+    """
+    global _cache, _cache_config
+    if not env_bool("LLM_CACHE_ENABLED", True):
+        return None
+    config = (
+        env_str("LLM_CACHE_PATH", str(DEFAULT_CACHE_PATH)),
+        env_int("LLM_CACHE_MAX_MB", 256) * 1024 * 1024,
+        env_float("LLM_CACHE_TTL_SECONDS", 7 * 24 * 3600),
+    )
+    with _cache_lock:
+        if _cache is None or _cache_config != config:
+            if _cache is not None:
+                _cache.close()
+            try:
+                _cache = LLMCache(Path(config[0]), max_bytes=config[1], max_age_seconds=config[2])
+                _cache_config = config
+            except Exception:
+                logger.exception("Could not open LLM cache at %s; caching disabled", config[0])
+                _cache = _cache_config = None
+        return _cache
+
+
+__all__ = ["LLMCache", "get_llm_cache"]
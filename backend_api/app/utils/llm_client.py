@@ -1,13 +1,335 @@
+import asyncio
+import logging
 import os
 import json
-from typing import Any
+import random
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Coroutine, Dict, Iterator, List, Optional
 import pandas as pd
 
+from .config import env_float, env_int, env_str
+from .metrics import get_metrics
+
 try:
     import openai
 except Exception:
     openai = None
 
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling the provider while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker.
+
+    After `failure_threshold` consecutive failures the breaker opens and calls are
+    refused for `reset_timeout` seconds. Then a single trial call is let through
+    (half-open): success closes the breaker, failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = 0.0
+        self._state = self.CLOSED
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        """Whether a call may go to the provider now (claims the half-open trial)."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and time.monotonic() - self._opened_at < self.reset_timeout:
+                return False
+            if self._trial_in_flight:
+                return False
+            self._state = self.HALF_OPEN
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._state = self.CLOSED
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning("LLM circuit breaker opened after %d consecutive failures", self._failures)
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"state": self.state, "consecutive_failures": self._failures}
+
+
+class _StreamError:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def _is_retryable(err: Exception) -> bool:
+    """Connection problems, timeouts, 429 and 5xx are retried; other 4xx are not."""
+    if openai is None:
+        return True
+    if isinstance(err, (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)):
+        return True
+    if isinstance(err, openai.APIStatusError):
+        return err.status_code >= 500
+    return True
+
+
+def _count_retry(err: Exception) -> None:
+    get_metrics().counter("llm_retries_total", "LLM calls retried after a retryable error",
+                          ("error",)).inc(error=type(err).__name__)
+
+
+class LLMClientPool:
+    """One lazily created `AsyncOpenAI` client shared by the whole process.
+
+    The client and its keep-alive connection pool live on a dedicated event-loop
+    thread, so synchronous callers (rule-application threads) and async callers
+    share connections and TLS sessions. Every call goes through a circuit breaker
+    and retries with jittered exponential backoff that never blocks a thread.
+    At most `LLM_MAX_IN_FLIGHT` requests (default 16) are sent at once across the
+    whole process, whatever the number of exports and row batches asking; the
+    others wait their turn (`llm_queue_seconds`) instead of tripping the
+    provider's rate limits.
+    """
+
+    def __init__(self):
+        self.breaker = CircuitBreaker(
+            failure_threshold=env_int("LLM_BREAKER_THRESHOLD", 5),
+            reset_timeout=env_float("LLM_BREAKER_RESET_SECONDS", 30.0),
+        )
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._client: Any = None
+        self._client_key: Optional[tuple] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="llm-client-loop", daemon=True)
+                thread.start()
+                self._loop, self._thread = loop, thread
+            return self._loop
+
+    def submit(self, coro: Coroutine) -> Future:
+        """Schedule `coro` on the client loop; returns a concurrent future."""
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    def _get_client(self) -> Any:
+        # runs on the client loop thread only
+        if openai is None:
+            raise RuntimeError("openai package not available")
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise RuntimeError("OPENAI_API_KEY not configured")
+        base_url = env_str("OPENAI_BASE_URL")
+        key = (api_key, base_url)
+        if self._client is None or self._client_key != key:
+            import httpx
+
+            limits = httpx.Limits(max_connections=env_int("LLM_MAX_CONNECTIONS", 20),
+                                  max_keepalive_connections=env_int("LLM_MAX_KEEPALIVE", 10),
+                                  keepalive_expiry=env_float("LLM_KEEPALIVE_SECONDS", 60.0))
+            http_client = httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(60.0, connect=10.0))
+            # retries are handled here (breaker-aware), not inside the SDK
+            self._client = openai.AsyncOpenAI(api_key=api_key, base_url=base_url,
+                                              http_client=http_client, max_retries=0)
+            self._client_key = key
+        return self._client
+
+    @asynccontextmanager
+    async def _in_flight_slot(self) -> AsyncIterator[None]:
+        # runs on the client loop thread only
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(max(1, env_int("LLM_MAX_IN_FLIGHT", 16)))
+        queued = time.perf_counter()
+        async with self._slots:
+            get_metrics().histogram("llm_queue_seconds", "Time LLM calls waited for an in-flight slot"
+                                    ).observe(time.perf_counter() - queued)
+            self.in_flight += 1
+            try:
+                yield
+            finally:
+                self.in_flight -= 1
+
+    async def _complete(self, messages: List[Dict[str, str]], model: str, timeout: float,
+                        max_retries: int, **params: Any) -> Any:
+        base_delay = env_float("LLM_RETRY_BASE_SECONDS", 0.5)
+        attempt = 0
+        while True:
+            # configuration errors (no key / no SDK) propagate without touching the breaker
+            client = self._get_client()
+            if not self.breaker.allow():
+                raise CircuitOpenError("LLM circuit breaker is open")
+            try:
+                async with self._in_flight_slot():
+                    resp = await client.chat.completions.create(model=model, messages=messages,
+                                                                timeout=timeout, **params)
+            except Exception as e:
+                if not _is_retryable(e):
+                    # the provider answered (e.g. 400 for this prompt): it is not down
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                if attempt >= max_retries:
+                    raise
+                attempt += 1
+                _count_retry(e)
+                # full jitter: sleep uniformly in [0, base * 2^attempt]
+                await asyncio.sleep(random.uniform(0, base_delay * (2 ** attempt)))
+                continue
+            self.breaker.record_success()
+            return resp
+
+    async def acomplete(self, messages: List[Dict[str, str]], model: str = "gpt-4o-mini",
+                        timeout: float = 30, max_retries: int = 2, **params: Any) -> Any:
+        """Async chat completion usable from any event loop."""
+        return await asyncio.wrap_future(self.submit(self._complete(messages, model, timeout, max_retries, **params)))
+
+    def complete(self, messages: List[Dict[str, str]], model: str = "gpt-4o-mini",
+                 timeout: float = 30, max_retries: int = 2, **params: Any) -> Any:
+        """Blocking chat completion for worker threads (must not run on the client loop)."""
+        return self.submit(self._complete(messages, model, timeout, max_retries, **params)).result()
+
+    async def _stream(self, messages: List[Dict[str, str]], model: str, timeout: float,
+                      max_retries: int, **params: Any) -> AsyncIterator[str]:
+        base_delay = env_float("LLM_RETRY_BASE_SECONDS", 0.5)
+        attempt = 0
+        while True:
+            client = self._get_client()
+            if not self.breaker.allow():
+                raise CircuitOpenError("LLM circuit breaker is open")
+            started = False
+            try:
+                async with self._in_flight_slot():
+                    stream = await client.chat.completions.create(model=model, messages=messages,
+                                                                  timeout=timeout, stream=True, **params)
+                    async for event in stream:
+                        delta = event.choices[0].delta.content if event.choices else None
+                        if delta:
+                            started = True
+                            yield delta
+            except Exception as e:
+                if not _is_retryable(e):
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                # once text was handed out a retry would duplicate it
+                if started or attempt >= max_retries:
+                    raise
+                attempt += 1
+                _count_retry(e)
+                await asyncio.sleep(random.uniform(0, base_delay * (2 ** attempt)))
+                continue
+            self.breaker.record_success()
+            return
+
+    def stream(self, messages: List[Dict[str, str]], model: str = "gpt-4o-mini",
+               timeout: float = 30, max_retries: int = 2, **params: Any) -> Iterator[str]:
+        """Blocking generator of completion text fragments as the model produces them.
+
+        Retries only happen before the first fragment. Closing the generator early
+        cancels the underlying request.
+        """
+        q: "queue.Queue[Any]" = queue.Queue()
+        done = object()
+
+        async def pump() -> None:
+            try:
+                async for delta in self._stream(messages, model, timeout, max_retries, **params):
+                    q.put_nowait(delta)
+            except BaseException as e:
+                q.put_nowait(_StreamError(e))
+                if not isinstance(e, Exception):
+                    raise
+            else:
+                q.put_nowait(done)
+
+        fut = self.submit(pump())
+        try:
+            while True:
+                item = q.get()
+                if item is done:
+                    return
+                if isinstance(item, _StreamError):
+                    raise item.error
+                yield item
+        finally:
+            if not fut.done():
+                fut.cancel()
+
+    def close(self) -> None:
+        """Close the HTTP client and stop the loop thread."""
+        with self._lock:
+            loop, thread, client = self._loop, self._thread, self._client
+            self._loop = self._thread = self._client = None
+            self._client_key = self._slots = None
+        if loop is None:
+            return
+        if client is not None:
+            try:
+                asyncio.run_coroutine_threadsafe(client.close(), loop).result(timeout=5)
+            except Exception:
+                logger.debug("Error closing LLM client", exc_info=True)
+        loop.call_soon_threadsafe(loop.stop)
+        if thread is not None:
+            thread.join(timeout=5)
+        loop.close()
+
+
+_pool: Optional[LLMClientPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_llm_pool() -> LLMClientPool:
+    """Return the process-wide LLM client pool (created on first use)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = LLMClientPool()
+        return _pool
+
+
+def close_llm_pool() -> None:
+    """Close and forget the shared pool (application shutdown, tests)."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
+
 
 def call_openai_for_enrichment(df: pd.DataFrame, rules: Any) -> Any:
     """
@@ -21,8 +343,6 @@ def call_openai_for_enrichment(df: pd.DataFrame, rules: Any) -> Any:
     if openai is None:
         raise RuntimeError("openai package not available")
 
-    openai.api_key = api_key
-
     # Prepare small sample of data to include in prompt
     sample_rows = df.head(50).to_dict(orient="records")
     prompt = (
@@ -30,28 +350,27 @@ def call_openai_for_enrichment(df: pd.DataFrame, rules: Any) -> Any:
         "Given a JSON rule set and a list of rows, apply the rules and return the updated rows as JSON array.\n"
         "Rules: " + json.dumps(rules) + "\n"
         "Rows: " + json.dumps(sample_rows, default=str) + "\n"
-        "Return only valid JSON: an array of row objects with the same or new columns. Do not include any explanatory text."
+        "Return only valid JSON: an array of row objects with the same or new columns. "
+        "Do not include any explanatory text."
     )
 
-    try:
-        from openai import OpenAI
+    # shared pooled client; errors bubble up to caller
+    resp = get_llm_pool().complete([{"role": "user", "content": prompt}], model="gpt-4o-mini",
+                                   temperature=0.0, max_tokens=1500)
+    text = resp.choices[0].message.content
+    # parse JSON
+    parsed = json.loads(text)
+    # If parsed is list of dicts, try convert to DataFrame
+    if isinstance(parsed, list):
+        return pd.DataFrame(parsed)
+    return parsed
 
-        # instantiate client with API key from environment (validated above)
-        client = OpenAI(api_key=api_key)
 
-        resp = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.0,
-            max_tokens=1500,
-        )
-        text = resp.choices[0].message.content
-        # parse JSON
-        parsed = json.loads(text)
-        # If parsed is list of dicts, try convert to DataFrame
-        if isinstance(parsed, list):
-            return pd.DataFrame(parsed)
-        return parsed
-    except Exception as e:
-        # bubble up to caller
-        raise
+__all__ = [
+    "CircuitBreaker",
+    "CircuitOpenError",
+    "LLMClientPool",
+    "get_llm_pool",
+    "close_llm_pool",
+    "call_openai_for_enrichment",
+]
@@ -1,42 +1,112 @@
+import atexit
 import logging
-from logging.handlers import RotatingFileHandler
+import os
+import queue
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
+from typing import List, Optional
 
+from .config import env_int, env_str
+from .metrics import get_metrics
 
-def configure_logging(log_level: str = "INFO"):
-    """Configure module-level logging for the backend.
+DEFAULT_LOG_DIR = Path(__file__).resolve().parents[2] / "data" / "logs"
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(name)s - %(message)s"
 
-    - Creates `backend_api/data/logs/app.log` with rotation.
-    - Leaves LLM raw debug files in `backend_api/data/llm_debug/` (created by llm_service when needed).
-    Call this early from the application entrypoint (main.py).
-    """
-    base = Path(__file__).resolve().parents[3]
-    data_dir = base / "data"
-    logs_dir = data_dir / "logs"
-    logs_dir.mkdir(parents=True, exist_ok=True)
+_lock = threading.Lock()
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional["_DroppingQueueHandler"] = None
+_sinks: List[logging.Handler] = []
 
-    logger = logging.getLogger()
-    logger.setLevel(getattr(logging, log_level.upper(), logging.INFO))
 
-    # Console handler (stream)
-    ch = logging.StreamHandler()
-    ch.setLevel(getattr(logging, log_level.upper(), logging.INFO))
-    ch_formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(name)s - %(message)s")
-    ch.setFormatter(ch_formatter)
-    logger.addHandler(ch)
+class _DroppingQueueHandler(QueueHandler):
+    """Hands records to the listener thread; drops (and counts) them when the queue is full."""
 
-    # Rotating file handler for general logs
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            get_metrics().counter("log_records_dropped_total",
+                                  "Log records dropped because the logging queue was full").inc()
+
+
+def _start(level: int) -> None:
+    global _listener, _queue_handler, _sinks
+    logs_dir = Path(env_str("LOG_DIR", str(DEFAULT_LOG_DIR)))
+    logs_dir.mkdir(parents=True, exist_ok=True)
+    formatter = logging.Formatter(LOG_FORMAT)
+
+    console = logging.StreamHandler()
     fh = RotatingFileHandler(logs_dir / "app.log", maxBytes=5 * 1024 * 1024, backupCount=5, encoding="utf-8")
-    fh.setLevel(getattr(logging, log_level.upper(), logging.INFO))
-    fh_formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(name)s - %(message)s")
-    fh.setFormatter(fh_formatter)
-    logger.addHandler(fh)
+    for handler in (console, fh):
+        handler.setFormatter(formatter)
+    _sinks = [console, fh]
+
+    _queue_handler = _DroppingQueueHandler(queue.Queue(maxsize=max(1, env_int("LOG_QUEUE_SIZE", 10_000))))
+    _listener = QueueListener(_queue_handler.queue, *_sinks, respect_handler_level=True)
+    _listener.start()
+    root = logging.getLogger()
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+
+
+def _stop() -> None:
+    global _listener, _queue_handler, _sinks
+    root = logging.getLogger()
+    if _queue_handler is not None:
+        root.removeHandler(_queue_handler)
+    if _listener is not None:
+        _listener.stop()
+    for handler in _sinks:
+        handler.close()
+    _listener, _queue_handler, _sinks = None, None, []
+
+
+def configure_logging(log_level: Optional[str] = None) -> None:
+    """Configure logging for the backend; safe to call more than once.
+
+    - Log calls only put the record on a bounded queue (`LOG_QUEUE_SIZE`, default
+      10000; records beyond it are dropped and counted in `/metrics`). A listener
+      thread writes them to the console and to `backend_api/data/logs/app.log`
+      (rotating; `LOG_DIR` overrides the directory).
+    - Repeated calls only update the level (`log_level`, else `LOG_LEVEL`, default INFO).
+    - LLM debug artifacts go to `backend_api/data/llm_debug/` (see `debug_artifacts`).
+    Call this early from the application entrypoint (main.py).
+    """
+    level = getattr(logging, (log_level or env_str("LOG_LEVEL", "INFO")).upper(), logging.INFO)
+    with _lock:
+        if _listener is None:
+            _start(level)
+            atexit.register(shutdown_logging)
+        else:
+            logging.getLogger().setLevel(level)
 
     # Silence overly verbose libraries if desired
     for noisy in ("uvicorn.error", "uvicorn.access", "asyncio"):
         logging.getLogger(noisy).setLevel(logging.WARNING)
 
-    logger.debug("Logging configured. Logs dir=%s", str(logs_dir))
+    logging.getLogger(__name__).debug("Logging configured. Logs dir=%s", env_str("LOG_DIR", str(DEFAULT_LOG_DIR)))
+
+
+def shutdown_logging() -> None:
+    """Write the queued records and stop the listener thread."""
+    with _lock:
+        _stop()
+
+
+def _restart_in_child() -> None:
+    # a forked worker (process pool) inherits the queue but not the listener thread
+    global _listener
+    if _listener is None:
+        return
+    level = logging.getLogger().level
+    logging.getLogger().removeHandler(_queue_handler)
+    _listener = None
+    _start(level)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_in_child)
 
 
-__all__ = ["configure_logging"]
+__all__ = ["configure_logging", "shutdown_logging"]
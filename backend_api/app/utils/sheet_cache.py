@@ -0,0 +1,406 @@
+"""Columnar disk cache of parsed and cleaned sheets, keyed by workbook content.
+
+Parsing the workbook is the slowest fixed cost of every export. Raw sheets
+(what `ExcelWorkbook.sheet` returns), the workbook's sheet names and the tables
+prepared for rule application are stored once per workbook SHA-256 and loaded
+from there by any later export, batch run or preview of the same file.
+
+With `pyarrow` installed an entry is a directory of Arrow IPC files, read
+memory-mapped: numeric columns come back without parsing and mostly without
+copying. Object columns that mix types (raw sheets: header text above numbers,
+dates, blanks) are stored as dense unions, so every cell keeps its Python type.
+Without `pyarrow` entries are pickled frames.
+"""
+import datetime as dt
+import hashlib
+import json
+import logging
+import os
+import pickle
+import shutil
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from .config import env_bool, env_float, env_int, env_str
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+except Exception:
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+DEFAULT_CACHE_DIR = BASE_DIR / "data" / "cache" / "sheets"
+# bump when the on-disk layout or the codec changes
+FORMAT_VERSION = "1"
+
+# dense-union type codes of mixed object columns; None is a null slot
+_STR, _INT, _FLOAT, _BOOL, _DATETIME, _OTHER = range(6)
+
+
+def file_sha256(source: Union[bytes, bytearray, str, Path, BinaryIO]) -> str:
+    """SHA-256 of a workbook given as bytes or a path, read in 1 MB blocks."""
+    digest = hashlib.sha256()
+    if isinstance(source, (bytes, bytearray)):
+        digest.update(source)
+        return digest.hexdigest()
+    with open(source, "rb") as fh:
+        for block in iter(lambda: fh.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _kind_of_type(t: type, cells: np.ndarray) -> int:
+    """Union type code for the cells of Python type `t` in a column (-1 for None)."""
+    if t is type(None):
+        return -1
+    if issubclass(t, (bool, np.bool_)):
+        return _BOOL
+    if issubclass(t, (int, np.integer)):
+        try:
+            cells.astype(np.int64)
+            return _INT
+        except OverflowError:
+            return _OTHER
+    if issubclass(t, (float, np.floating)):
+        return _FLOAT
+    if issubclass(t, str):
+        return _STR
+    if issubclass(t, dt.datetime) and all(v.tzinfo is None for v in cells):
+        return _DATETIME
+    return _OTHER
+
+
+def _encode_mixed(values: np.ndarray) -> "pa.Array":
+    """Object cells as a dense union of string, int64, float64, bool, timestamp and pickled children.
+
+    Children hold their cells in row order; None cells are nulls of the string child.
+    """
+    # classify by distinct Python type, not cell by cell
+    type_codes, types = pd.factorize(pd.Series(values, dtype=object).map(type), use_na_sentinel=False)
+    kinds = np.array([_kind_of_type(t, values[type_codes == i]) for i, t in enumerate(types)], dtype=np.int8)
+    tags = kinds[type_codes] if len(values) else np.zeros(0, dtype=np.int8)
+    nulls = tags < 0
+    tags[nulls] = _STR
+    offsets = np.zeros(len(values), dtype=np.int32)
+    children = []
+    for code in range(6):
+        mask = tags == code
+        offsets[mask] = np.arange(int(mask.sum()), dtype=np.int32)
+        cells = values[mask]
+        if code == _STR:
+            children.append(pa.array(np.where(nulls[mask], None, cells), type=pa.string()))
+        elif code == _INT:
+            children.append(pa.array(cells.astype(np.int64), type=pa.int64()))
+        elif code == _FLOAT:
+            children.append(pa.array(cells.astype(np.float64), type=pa.float64()))
+        elif code == _BOOL:
+            children.append(pa.array(cells.astype(bool), type=pa.bool_()))
+        elif code == _DATETIME:
+            children.append(pa.array(list(cells), type=pa.timestamp("us")))
+        else:
+            children.append(pa.array([pickle.dumps(v, protocol=5) for v in cells], type=pa.binary()))
+    return pa.UnionArray.from_dense(pa.array(tags, type=pa.int8()), pa.array(offsets, type=pa.int32()),
+                                    children, ["str", "int", "float", "bool", "datetime", "other"])
+
+
+def _decode_mixed(arr: "pa.Array") -> np.ndarray:
+    tags = arr.type_codes.to_numpy(zero_copy_only=False)
+    offsets = arr.offsets.to_numpy(zero_copy_only=False)
+    out = np.empty(len(arr), dtype=object)
+    for code in range(6):
+        mask = tags == code
+        if not mask.any():
+            continue
+        child = arr.field(code).take(pa.array(offsets[mask]))
+        if code == _DATETIME:
+            cells = child.to_pylist()
+        elif code == _OTHER:
+            cells = [pickle.loads(v) for v in child.to_pylist()]
+        else:
+            cells = child.to_numpy(zero_copy_only=False).astype(object)
+        target = np.flatnonzero(mask)
+        if isinstance(cells, list):
+            for pos, value in zip(target, cells):
+                out[pos] = value
+        else:
+            out[target] = cells
+    return out
+
+
+def _dtype_name(dtype: Any) -> str:
+    """Name that `astype` maps back to `dtype` (`str` of string dtypes drops the storage)."""
+    if isinstance(dtype, pd.StringDtype):
+        return f"string[{dtype.storage}]"
+    return str(dtype)
+
+
+def _encode_column(series: pd.Series) -> Tuple["pa.Array", Dict[str, Any]]:
+    if series.dtype != object:
+        return pa.Array.from_pandas(series), {"codec": "native", "dtype": _dtype_name(series.dtype)}
+    values = series.to_numpy()
+    # only columns of nothing but str: blanks (NaN or None) must come back as they were
+    if pd.api.types.infer_dtype(values, skipna=False) == "string":
+        return pa.array(values, type=pa.string()), {"codec": "string"}
+    return _encode_mixed(values), {"codec": "mixed"}
+
+
+def _decode_column(arr: "pa.ChunkedArray", spec: Dict[str, Any]) -> Any:
+    if spec["codec"] == "native":
+        values = arr.to_pandas()
+        if str(values.dtype) != spec["dtype"]:
+            values = values.astype(spec["dtype"])
+        # the array, not the Series: callers position it by row, not by index label
+        return values.values
+    chunks = arr.chunks
+    if spec["codec"] == "string":
+        parts = [c.to_numpy(zero_copy_only=False) for c in chunks]
+    else:
+        parts = [_decode_mixed(c) for c in chunks]
+    return np.concatenate(parts) if len(parts) != 1 else parts[0]
+
+
+def _frame_to_table(df: pd.DataFrame) -> Tuple["pa.Table", Dict[str, Any]]:
+    arrays, specs = [], []
+    for i in range(df.shape[1]):
+        arr, spec = _encode_column(df.iloc[:, i])
+        arrays.append(arr)
+        specs.append(spec)
+    meta: Dict[str, Any] = {"columns": list(df.columns), "specs": specs,
+                            "range_columns": isinstance(df.columns, pd.RangeIndex)}
+    if isinstance(df.index, pd.RangeIndex):
+        meta["index"] = [df.index.start, df.index.stop, df.index.step]
+    else:
+        arr, spec = _encode_column(df.index.to_series())
+        arrays.append(arr)
+        meta["index"] = spec
+    names = [f"c{i}" for i in range(len(arrays))]
+    return pa.Table.from_arrays(arrays, names=names), meta
+
+
+def _table_to_frame(table: "pa.Table", meta: Dict[str, Any]) -> pd.DataFrame:
+    n_cols = len(meta["columns"])
+    if isinstance(meta["index"], list):
+        index: Any = pd.RangeIndex(*meta["index"])
+    else:
+        index = pd.Index(_decode_column(table.column(n_cols), meta["index"]))
+    df = pd.DataFrame({i: _decode_column(table.column(i), spec) for i, spec in enumerate(meta["specs"])},
+                      index=index)
+    df.columns = pd.RangeIndex(n_cols) if meta["range_columns"] else pd.Index(meta["columns"])
+    return df
+
+
+class SheetCache:
+    """Disk cache of DataFrames derived from workbooks.
+
+    An entry is a named set of frames plus JSON metadata under `make_key(...)`,
+    stored as a directory (Arrow IPC files and `manifest.json`) and indexed in a
+    SQLite file, like `ExportCache`. Lookups happen in process-pool workers, each
+    with its own connection, so hits are not counted here: an export served from
+    the cache reports a `sheet_cache` stage instead of `parse`/`detect`.
+    Eviction drops entries older than `max_age_seconds` and then the least
+    recently used ones until the cache fits in `max_bytes`.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int = 1024 * 1024 * 1024,
+                 max_age_seconds: float = 24 * 3600):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.format = "arrow" if pa is not None else "pickle"
+        self._lock = threading.Lock()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.directory / "index.sqlite3"), timeout=10,
+                                     check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sheet_cache ("
+            " key TEXT PRIMARY KEY, workbook TEXT NOT NULL,"
+            " size INTEGER NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sheet_cache_accessed ON sheet_cache(accessed)")
+
+    def make_key(self, workbook_sha256: str, kind: str, name: str = "", variant: str = "") -> str:
+        """Hash of workbook content hash, entry kind (`raw`, `tables`, ...), sheet and variant.
+
+        `variant` covers whatever else shapes the frames (parse dtype, cleaning version).
+        """
+        h = hashlib.sha256()
+        for part in (FORMAT_VERSION, self.format, pd.__version__, workbook_sha256, kind, name, variant):
+            data = (part or "").encode("utf-8")
+            h.update(len(data).to_bytes(8, "big"))
+            h.update(data)
+        return h.hexdigest()
+
+    def _dir(self, key: str) -> Path:
+        return self.directory / key
+
+    def load(self, key: str) -> Optional[Tuple[Dict[str, pd.DataFrame], Dict[str, Any]]]:
+        """(frames, metadata) stored under `key`, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT created FROM sheet_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.max_age_seconds > 0 and now - row[0] > self.max_age_seconds:
+                self._delete_locked(key)
+                row = None
+        entry = None
+        if row is not None:
+            try:
+                entry = self._read(self._dir(key))
+            except (OSError, ValueError, KeyError, pickle.UnpicklingError) as e:
+                logger.warning("Dropping unreadable sheet cache entry %s: %s", key, e)
+                with self._lock:
+                    self._delete_locked(key)
+        if entry is None:
+            return None
+        with self._lock:
+            self._conn.execute("UPDATE sheet_cache SET accessed = ? WHERE key = ?", (now, key))
+        return entry
+
+    def store(self, key: str, workbook_sha256: str, frames: Dict[str, pd.DataFrame],
+              meta: Optional[Dict[str, Any]] = None) -> None:
+        """Store `frames` (and JSON-serialisable `meta`) under `key`."""
+        now = time.time()
+        tmp = self.directory / f".{key}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            size = self._write(tmp, frames, meta or {})
+            if self.max_bytes > 0 and size > self.max_bytes:
+                return
+            dest = self._dir(key)
+            shutil.rmtree(dest, ignore_errors=True)
+            try:
+                os.replace(tmp, dest)
+            except OSError:
+                # another worker stored the same entry first
+                return
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sheet_cache (key, workbook, size, created, accessed)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, workbook_sha256, size, now, now),
+            )
+            self._evict_locked(now)
+
+    def _write(self, path: Path, frames: Dict[str, pd.DataFrame], meta: Dict[str, Any]) -> int:
+        path.mkdir(parents=True)
+        manifest: Dict[str, Any] = {"format": self.format, "meta": meta, "frames": []}
+        for i, (name, df) in enumerate(frames.items()):
+            if self.format == "arrow":
+                table, frame_meta = _frame_to_table(df)
+                with pa_ipc.new_file(str(path / f"{i}.arrow"), table.schema) as writer:
+                    writer.write_table(table)
+                manifest["frames"].append({"name": name, "file": f"{i}.arrow", **frame_meta})
+            else:
+                with open(path / f"{i}.pkl", "wb") as fh:
+                    pickle.dump(df, fh, protocol=5)
+                manifest["frames"].append({"name": name, "file": f"{i}.pkl"})
+        # labels that JSON cannot round-trip would come back different: don't cache them
+        (path / "manifest.json").write_text(json.dumps(manifest, allow_nan=False), encoding="utf-8")
+        return sum(p.stat().st_size for p in path.iterdir())
+
+    def _read(self, path: Path) -> Tuple[Dict[str, pd.DataFrame], Dict[str, Any]]:
+        manifest = json.loads((path / "manifest.json").read_text(encoding="utf-8"))
+        frames: Dict[str, pd.DataFrame] = {}
+        for entry in manifest["frames"]:
+            if manifest["format"] == "arrow":
+                with pa.memory_map(str(path / entry["file"]), "r") as source:
+                    table = pa_ipc.open_file(source).read_all()
+                frames[entry["name"]] = _table_to_frame(table, entry)
+            else:
+                with open(path / entry["file"], "rb") as fh:
+                    frames[entry["name"]] = pickle.load(fh)
+        return frames, manifest["meta"]
+
+    def _delete_locked(self, key: str) -> None:
+        self._conn.execute("DELETE FROM sheet_cache WHERE key = ?", (key,))
+        shutil.rmtree(self._dir(key), ignore_errors=True)
+
+    def _evict_locked(self, now: float) -> None:
+        if self.max_age_seconds > 0:
+            expired = self._conn.execute("SELECT key FROM sheet_cache WHERE created < ?",
+                                         (now - self.max_age_seconds,)).fetchall()
+            for (key,) in expired:
+                self._delete_locked(key)
+        if self.max_bytes <= 0:
+            return
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM sheet_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        freed = 0
+        victims = []
+        for key, size in self._conn.execute("SELECT key, size FROM sheet_cache ORDER BY accessed ASC"):
+            victims.append(key)
+            freed += size
+            if freed >= excess:
+                break
+        for key in victims:
+            self._delete_locked(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            keys = [k for (k,) in self._conn.execute("SELECT key FROM sheet_cache").fetchall()]
+            for key in keys:
+                self._delete_locked(key)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM sheet_cache").fetchone()
+        return {
+            "format": self.format,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "max_age_seconds": self.max_age_seconds,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_cache: Optional[SheetCache] = None
+_cache_config: Optional[Tuple[Any, ...]] = None
+_cache_lock = threading.Lock()
+
+
+def get_sheet_cache() -> Optional[SheetCache]:
+    """Return this process's sheet cache, or None when disabled (`SHEET_CACHE_ENABLED=0`).
+
+    Configured with `SHEET_CACHE_DIR`, `SHEET_CACHE_MAX_MB` and `SHEET_CACHE_TTL_SECONDS`.
+    Process-pool workers each open their own SQLite connection to the shared index.
+    """
+    global _cache, _cache_config
+    if not env_bool("SHEET_CACHE_ENABLED", True):
+        return None
+    config = (
+        env_str("SHEET_CACHE_DIR", str(DEFAULT_CACHE_DIR)),
+        env_int("SHEET_CACHE_MAX_MB", 1024) * 1024 * 1024,
+        env_float("SHEET_CACHE_TTL_SECONDS", 24 * 3600),
+        os.getpid(),
+    )
+    with _cache_lock:
+        if _cache is None or _cache_config != config:
+            if _cache is not None and _cache_config[3] == config[3]:
+                _cache.close()
+            try:
+                _cache = SheetCache(Path(config[0]), max_bytes=config[1], max_age_seconds=config[2])
+                _cache_config = config
+            except Exception:
+                logger.exception("Could not open sheet cache at %s; caching disabled", config[0])
+                _cache = _cache_config = None
+        return _cache
+
+
+__all__ = ["SheetCache", "file_sha256", "get_sheet_cache"]
@@ -0,0 +1,138 @@
+import logging
+import math
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from .config import env_int
+from .metrics import TOKEN_BUCKETS, get_metrics
+
+try:
+    import tiktoken
+except Exception:
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# (context window, max completion tokens) of the models we call
+MODEL_LIMITS = {
+    "gpt-4o-mini": (128_000, 16_384),
+    "gpt-4o": (128_000, 16_384),
+    "gpt-4-turbo": (128_000, 4_096),
+    "gpt-3.5-turbo": (16_385, 4_096),
+}
+DEFAULT_LIMITS = (16_385, 4_096)
+
+_encodings: Dict[str, Any] = {}
+
+
+def _encoding(model: str) -> Any:
+    if tiktoken is None:
+        return None
+    if model not in _encodings:
+        try:
+            _encodings[model] = tiktoken.encoding_for_model(model)
+        except Exception:
+            _encodings[model] = tiktoken.get_encoding("o200k_base")
+    return _encodings[model]
+
+
+def estimate_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    """Token count of `text` for `model`.
+
+    Exact with the optional `tiktoken` package; otherwise a conservative estimate of
+    one token per 3 characters (CSV cells and Spanish text average closer to 4).
+    """
+    if not text:
+        return 0
+    enc = _encoding(model)
+    if enc is not None:
+        return len(enc.encode(text, disallowed_special=()))
+    return math.ceil(len(text) / 3)
+
+
+def model_limits(model: str) -> Tuple[int, int]:
+    """(context tokens, max completion tokens) for `model`.
+
+    `LLM_CONTEXT_TOKENS` / `LLM_MAX_OUTPUT_TOKENS` override the built-in table.
+    """
+    context, output = MODEL_LIMITS.get(model, DEFAULT_LIMITS)
+    return env_int("LLM_CONTEXT_TOKENS", context), env_int("LLM_MAX_OUTPUT_TOKENS", output)
+
+
+def fit_chunk_rows(fixed_tokens: int, row_tokens: float, out_row_tokens: float, model: str,
+                   configured: int = 0) -> int:
+    """Rows per LLM request that keep prompt and completion inside the model limits.
+
+    `fixed_tokens` is the prompt without rows (system prompt, instructions, header),
+    `row_tokens` the average prompt tokens per input row and `out_row_tokens` the
+    expected completion tokens per row. The result never exceeds `configured` when
+    that is positive; 0 means "everything fits in one request".
+    """
+    context, max_output = model_limits(model)
+    prompt_room = context - max_output - fixed_tokens
+    rows_by_prompt = prompt_room / row_tokens if row_tokens > 0 else math.inf
+    # keep a 10% margin on the completion: the model may write more than we estimate
+    rows_by_output = 0.9 * max_output / out_row_tokens if out_row_tokens > 0 else math.inf
+    fit = max(1, int(min(rows_by_prompt, rows_by_output)))
+    if configured > 0:
+        return min(configured, fit)
+    return 0 if math.isinf(min(rows_by_prompt, rows_by_output)) else fit
+
+
+class TokenMeter:
+    """Per-model token counters of LLM calls made by this process.
+
+    `estimated_prompt_tokens` is what the budget layer predicted before each call;
+    `prompt_tokens` / `completion_tokens` are the provider's usage figures, or
+    estimates for calls that did not report usage (streamed completions), which are
+    also counted in `estimated_calls`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models: Dict[str, Dict[str, int]] = {}
+
+    def _entry(self, model: str) -> Dict[str, int]:
+        return self._models.setdefault(model, {
+            "calls": 0, "estimated_calls": 0, "estimated_prompt_tokens": 0,
+            "prompt_tokens": 0, "completion_tokens": 0,
+        })
+
+    def record(self, model: str, prompt_tokens: int, completion_tokens: int,
+               estimated_prompt_tokens: Optional[int] = None, estimated: bool = False) -> None:
+        with self._lock:
+            entry = self._entry(model)
+            entry["calls"] += 1
+            entry["prompt_tokens"] += prompt_tokens
+            entry["completion_tokens"] += completion_tokens
+            entry["estimated_prompt_tokens"] += (estimated_prompt_tokens
+                                                 if estimated_prompt_tokens is not None else prompt_tokens)
+            if estimated:
+                entry["estimated_calls"] += 1
+        tokens = get_metrics().histogram("llm_tokens", "Prompt and completion tokens per LLM call",
+                                         TOKEN_BUCKETS, ("kind",))
+        tokens.observe(prompt_tokens, kind="prompt")
+        tokens.observe(completion_tokens, kind="completion")
+        logger.debug("LLM call on %s: %d prompt + %d completion tokens%s", model, prompt_tokens,
+                     completion_tokens, " (estimated)" if estimated else "")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            models = {m: dict(v) for m, v in self._models.items()}
+        totals = {k: sum(v[k] for v in models.values())
+                  for k in ("calls", "prompt_tokens", "completion_tokens", "estimated_prompt_tokens")}
+        return {"models": models, "totals": totals, "exact_counts": tiktoken is not None}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._models.clear()
+
+
+_meter = TokenMeter()
+
+
+def get_token_meter() -> TokenMeter:
+    return _meter
+
+
+__all__ = ["TokenMeter", "estimate_tokens", "fit_chunk_rows", "get_token_meter", "model_limits"]
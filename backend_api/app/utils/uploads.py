@@ -0,0 +1,152 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import AsyncIterator, BinaryIO, Optional, Union
+
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from .config import env_int, env_str
+
+
+class UploadTooLargeError(ValueError):
+    """Raised while streaming an upload that exceeds the configured size limit."""
+
+    def __init__(self, limit: int):
+        super().__init__(f"Upload exceeds the maximum allowed size of {limit} bytes")
+        self.limit = limit
+
+
+class SpooledUpload:
+    """An upload streamed to a temporary file on disk.
+
+    Readers open `path` instead of holding the upload as bytes, so per-request
+    memory is bounded by the parser, not by copies of the file. `sha256` is
+    computed while streaming. The file is removed by `cleanup()` or when used as
+    a context manager.
+    """
+
+    def __init__(self, path: Path, size: int, sha256: str, filename: str):
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+        self.filename = filename
+
+    def open(self) -> BinaryIO:
+        return open(self.path, "rb")
+
+    def read_bytes(self) -> bytes:
+        return self.path.read_bytes()
+
+    def cleanup(self) -> None:
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self) -> "SpooledUpload":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.cleanup()
+
+
+def _spool_dir() -> Optional[str]:
+    directory = env_str("UPLOAD_SPOOL_DIR")
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def spool_path(suffix: str = "", prefix: str = "export_") -> Path:
+    """Reserve a new empty file in the spool directory (e.g. for export output)."""
+    fd, name = tempfile.mkstemp(prefix=prefix, suffix=suffix, dir=_spool_dir())
+    os.close(fd)
+    return Path(name)
+
+
+def link_or_copy(src: Union[str, Path], dest: Union[str, Path]) -> None:
+    """Hard-link `src` to `dest` (replacing it), copying when linking is not possible."""
+    dest = Path(dest)
+    dest.unlink(missing_ok=True)
+    try:
+        os.link(src, dest)
+    except OSError as e:
+        if isinstance(e, FileNotFoundError):
+            raise
+        shutil.copyfile(src, dest)
+
+
+async def iter_file(path: Union[str, Path], chunk_size: int = 256 * 1024,
+                    remove: bool = False) -> AsyncIterator[bytes]:
+    """Async generator over the contents of `path`, read in a worker thread chunk by chunk.
+
+    With `remove=True` the file is deleted once the generator finishes or is closed
+    (e.g. when the client disconnects mid-download).
+    """
+    fh = await run_in_threadpool(open, path, "rb")
+    try:
+        while True:
+            chunk = await run_in_threadpool(fh.read, chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        fh.close()
+        if remove:
+            Path(path).unlink(missing_ok=True)
+
+
+def max_upload_bytes() -> int:
+    """Upload size limit (`UPLOAD_MAX_BYTES`, default 200 MB; 0 disables it)."""
+    return env_int("UPLOAD_MAX_BYTES", 200 * 1024 * 1024)
+
+
+async def spool_upload(file: UploadFile, max_bytes: Optional[int] = None,
+                       chunk_size: Optional[int] = None,
+                       directory: Optional[str] = None) -> SpooledUpload:
+    """Stream `file` in chunks to a temporary file, enforcing `max_bytes` on the way.
+
+    Raises `UploadTooLargeError` as soon as the limit is crossed (the partial file is
+    removed). Defaults come from `UPLOAD_MAX_BYTES`, `UPLOAD_CHUNK_BYTES` (1 MB) and
+    `UPLOAD_SPOOL_DIR` (system temp dir).
+    """
+    if max_bytes is None:
+        max_bytes = max_upload_bytes()
+    if chunk_size is None:
+        chunk_size = max(64 * 1024, env_int("UPLOAD_CHUNK_BYTES", 1024 * 1024))
+    if directory is None:
+        directory = _spool_dir()
+    elif directory:
+        os.makedirs(directory, exist_ok=True)
+
+    declared = getattr(file, "size", None)
+    if max_bytes and declared is not None and declared > max_bytes:
+        raise UploadTooLargeError(max_bytes)
+
+    suffix = Path(file.filename or "").suffix.lower()
+    fd, name = tempfile.mkstemp(prefix="upload_", suffix=suffix, dir=directory)
+    path = Path(name)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = await file.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_bytes and size > max_bytes:
+                    raise UploadTooLargeError(max_bytes)
+                digest.update(chunk)
+                await run_in_threadpool(out.write, chunk)
+    except BaseException:
+        path.unlink(missing_ok=True)
+        raise
+    return SpooledUpload(path, size, digest.hexdigest(), file.filename or path.name)
+
+
+__all__ = ["SpooledUpload", "UploadTooLargeError", "spool_upload", "spool_path", "iter_file",
+           "link_or_copy", "max_upload_bytes"]
@@ -0,0 +1,137 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import env_float, env_int, env_str
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+DEFAULT_WORKBOOKS_DIR = BASE_DIR / "data" / "workbooks"
+
+_COLUMNS = ("id", "filename", "path", "sha256", "size", "sheet_names", "created", "accessed")
+
+
+class WorkbookStore:
+    """SQLite index of uploaded workbooks kept on disk for preview and export by id.
+
+    Workbooks unused for `ttl_seconds` are removed by `purge`, which then drops the
+    least recently used ones until the files fit in `max_bytes`. `get` counts as a
+    use, so a workbook being previewed or exported does not expire.
+    """
+
+    def __init__(self, path: Path, ttl_seconds: float = 24 * 3600, max_bytes: int = 2048 * 1024 * 1024):
+        self.path = Path(path)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), timeout=10, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS workbooks ("
+            " id TEXT PRIMARY KEY, filename TEXT NOT NULL, path TEXT NOT NULL, sha256 TEXT NOT NULL,"
+            " size INTEGER NOT NULL, sheet_names TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS workbooks_accessed ON workbooks(accessed)")
+
+    @staticmethod
+    def _row(row: Optional[tuple]) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        workbook = dict(zip(_COLUMNS, row))
+        workbook["sheet_names"] = json.loads(workbook["sheet_names"])
+        return workbook
+
+    def create(self, filename: str, path: str, sha256: str, size: int,
+               sheet_names: List[str]) -> Dict[str, Any]:
+        now = time.time()
+        workbook_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO workbooks (id, filename, path, sha256, size, sheet_names, created, accessed)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (workbook_id, filename, path, sha256, size, json.dumps(sheet_names), now, now),
+            )
+        return self.get(workbook_id)
+
+    def get(self, workbook_id: str) -> Optional[Dict[str, Any]]:
+        """The workbook `workbook_id` (None if unknown or its file is gone); marks it as used."""
+        with self._lock:
+            row = self._conn.execute(f"SELECT {', '.join(_COLUMNS)} FROM workbooks WHERE id = ?",
+                                     (workbook_id,)).fetchone()
+            if row is None:
+                return None
+            if not Path(row[2]).exists():
+                self._conn.execute("DELETE FROM workbooks WHERE id = ?", (workbook_id,))
+                return None
+            self._conn.execute("UPDATE workbooks SET accessed = ? WHERE id = ?", (time.time(), workbook_id))
+        return self._row(row)
+
+    def delete(self, workbook_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT path FROM workbooks WHERE id = ?", (workbook_id,)).fetchone()
+            if row is None:
+                return False
+            self._conn.execute("DELETE FROM workbooks WHERE id = ?", (workbook_id,))
+        Path(row[0]).unlink(missing_ok=True)
+        return True
+
+    def purge(self) -> int:
+        """Delete workbooks unused for `ttl_seconds`, then the least recently used beyond `max_bytes`."""
+        with self._lock:
+            victims = []
+            if self.ttl_seconds > 0:
+                victims = self._conn.execute("SELECT id, path FROM workbooks WHERE accessed < ?",
+                                             (time.time() - self.ttl_seconds,)).fetchall()
+            if self.max_bytes > 0:
+                gone = {v[0] for v in victims}
+                rows = self._conn.execute("SELECT id, path, size FROM workbooks ORDER BY accessed DESC").fetchall()
+                total = 0
+                for workbook_id, path, size in rows:
+                    if workbook_id in gone:
+                        continue
+                    total += size
+                    if total > self.max_bytes:
+                        victims.append((workbook_id, path))
+            self._conn.executemany("DELETE FROM workbooks WHERE id = ?", [(v[0],) for v in victims])
+        for _, path in victims:
+            Path(path).unlink(missing_ok=True)
+        return len(victims)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def workbooks_dir() -> Path:
+    """Directory for uploaded workbooks and their index (`WORKBOOKS_DIR`)."""
+    path = Path(env_str("WORKBOOKS_DIR", str(DEFAULT_WORKBOOKS_DIR)))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+_store: Optional[WorkbookStore] = None
+_store_config: Optional[Tuple[str, float, int]] = None
+_store_lock = threading.Lock()
+
+
+def get_workbook_store() -> WorkbookStore:
+    """Shared store at `WORKBOOKS_DIR/workbooks.sqlite3`, bounded by `WORKBOOKS_TTL_SECONDS`
+    (since last use, default 1 day) and `WORKBOOKS_MAX_MB` (default 2048)."""
+    global _store, _store_config
+    config = (str(workbooks_dir() / "workbooks.sqlite3"), env_float("WORKBOOKS_TTL_SECONDS", 24 * 3600),
+              env_int("WORKBOOKS_MAX_MB", 2048) * 1024 * 1024)
+    with _store_lock:
+        if _store is None or _store_config != config:
+            if _store is not None:
+                _store.close()
+            _store = WorkbookStore(Path(config[0]), ttl_seconds=config[1], max_bytes=config[2])
+            _store_config = config
+        return _store
+
+
+__all__ = ["WorkbookStore", "get_workbook_store", "workbooks_dir"]
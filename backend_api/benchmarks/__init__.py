@@ -0,0 +1 @@
+"""Benchmarks for the backend hot paths (run from `backend_api/`)."""
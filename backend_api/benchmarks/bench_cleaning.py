@@ -0,0 +1,110 @@
+"""Throughput benchmark for `normalize_dataframe` and `clean_block`.
+
+Compares the vectorized implementations against the previous cell-by-cell versions
+(kept below as `legacy_*`) and prints rows per second for each size.
+
+Usage (from `backend_api/`):
+
+    python -m benchmarks.bench_cleaning --rows 100000 1000000
+"""
+import argparse
+import time
+from typing import Callable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.services.excel_service import clean_block, slugify_header, trim_edges
+from app.utils.excel_utils import normalize_dataframe
+
+
+def make_sheet(rows: int, seed: int = 0) -> pd.DataFrame:
+    """Header-less raw sheet: title rows, a header, fleet rows, blanks and TOTAL rows."""
+    rng = np.random.default_rng(seed)
+    units = np.array(["TRACTO", "REMOLQUE", "TANQUE", "DOLLY", "CAMION", "AUTO"], dtype=object)
+    body = pd.DataFrame({
+        0: rng.choice(units, rows),
+        1: np.char.add("  DESC ", rng.integers(0, 1000, rows).astype(str)).astype(object),
+        2: rng.integers(2000, 2026, rows).astype(object),
+        3: np.char.add("SER", rng.integers(0, 10**9, rows).astype(str)).astype(object),
+        4: rng.random(rows) * 1e6,
+    })
+    blanks = rng.random(rows) < 0.01
+    body.loc[blanks, :] = None
+    totals = rng.random(rows) < 0.005
+    body.loc[totals, :] = None
+    body.loc[totals, 0] = "TOTAL"
+    body.loc[totals, 4] = 1.0
+    head = pd.DataFrame([[None] * 5, ["Reporte flota", None, None, None, None],
+                         ["TIPO DE UNIDAD", "Desci.", "MOD", "NO.SERIE", "SUMA"]])
+    return pd.concat([head, body], ignore_index=True)
+
+
+def legacy_normalize_dataframe(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.dropna(axis=0, how="all").dropna(axis=1, how="all")
+    col_count = df.shape[1]
+    threshold = max(1, col_count // 2)
+    header_row_idx = next((i for i in range(min(10, len(df))) if df.iloc[i].notna().sum() >= threshold), 0)
+    df = df.iloc[header_row_idx + 1:].reset_index(drop=True)
+    df = df.applymap(lambda v: v.strip() if isinstance(v, str) else v)
+    keywords = ("total", "resumen", "subtotal", "desglose")
+
+    def is_summary_row(row):
+        non_null = row.notna().sum()
+        for v in row.tolist():
+            s = str(v).strip().lower()
+            if any(k in s for k in keywords) and non_null <= max(3, int(0.25 * col_count)):
+                return True
+        return False
+
+    mask = df.apply(lambda r: not is_summary_row(r), axis=1)
+    return df.loc[mask].dropna(axis=0, how="all").reset_index(drop=True)
+
+
+def legacy_clean_block(block: pd.DataFrame) -> Optional[pd.DataFrame]:
+    block = trim_edges(block)
+    header_idx = next((i for i in range(len(block)) if block.iloc[i].notna().sum() >= 2), 0)
+    cols = [slugify_header(x) for x in block.iloc[header_idx].tolist()]
+    data = block.iloc[header_idx + 1:, : len(cols)].copy()
+    data.columns = cols
+    keep_cols = [c for c in data.columns
+                 if not (data[c].isna().all() or (data[c].astype(str).str.strip() == "").all())]
+    data = data[keep_cols]
+    mask_empty_row = data.isna().all(axis=1) | data.astype(str).apply(lambda x: x.str.strip()).eq("").all(axis=1)
+    data = data.loc[~mask_empty_row].reset_index(drop=True)
+    for c in data.columns:
+        data[c] = pd.to_numeric(data[c], errors="ignore")
+    return data
+
+
+def _rate(fn: Callable[[pd.DataFrame], object], df: pd.DataFrame, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(df)
+        best = min(best, time.perf_counter() - start)
+    return len(df) / best
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--skip-legacy", action="store_true", help="only time the current implementation")
+    args = parser.parse_args(argv)
+
+    import warnings
+    warnings.simplefilter("ignore", FutureWarning)
+
+    print(f"{'stage':<20}{'rows':>10}{'before rows/s':>16}{'after rows/s':>16}{'speedup':>10}")
+    for rows in args.rows:
+        df = make_sheet(rows)
+        for name, new, old in (("normalize_dataframe", normalize_dataframe, legacy_normalize_dataframe),
+                               ("clean_block", clean_block, legacy_clean_block)):
+            after = _rate(new, df, args.repeat)
+            before = float("nan") if args.skip_legacy else _rate(old, df, args.repeat)
+            print(f"{name:<20}{rows:>10}{before:>16,.0f}{after:>16,.0f}{before and after / before:>10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""Stage-by-stage time and memory benchmark of the export pipeline on synthetic workbooks.
+
+Every stage runs on sheets from `workbook_generator` at each requested size. The
+suite reports the best wall time of `--repeat` runs and the peak memory allocated
+during one extra traced run (tracemalloc, which numpy and pandas buffers report
+to). Results are written as JSON with the git commit and library versions, so
+two runs can be compared:
+
+    python -m benchmarks.bench_suite --rows 1000 10000 100000 1000000 --out bench/main.json
+    python -m benchmarks.bench_suite --rows 1000 10000 100000 --out bench/pr.json --compare bench/main.json
+
+`--reader` picks the spreadsheet backend of the xlsx stages (see `excel_readers`), so
+backends compare the same way:
+
+    python -m benchmarks.bench_suite --stages parse --rows 1000 100000 --reader openpyxl --out bench/openpyxl.json
+    python -m benchmarks.bench_suite --stages parse --rows 1000 100000 --reader calamine --compare bench/openpyxl.json
+
+Stages: `parse` (xlsx -> DataFrame, only up to `--max-parse-rows`), `detect_and_clean`,
+`prepare_export_tables` (what an export runs before the rules: parse, detection and,
+unless `TABLE_COMPACT_TYPES=0`, type inference; the sheet cache is off during the suite),
+`trim_edges`, `find_segments`, `clean_block`, `normalize_dataframe`,
+`mock_apply_rules` and `dataframe_to_excel_bytes` (up to `--max-write-rows`).
+Compare the export path with and without compact types:
+
+    TABLE_COMPACT_TYPES=0 python -m benchmarks.bench_suite --stages prepare_export_tables --out bench/untyped.json
+    python -m benchmarks.bench_suite --stages prepare_export_tables --compare bench/untyped.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.services.excel_service import (clean_block, detect_and_clean_tables, find_segments,
+                                        prepare_export_tables, trim_edges)
+from app.services.llm_service import _mock_apply_rules
+from app.services.rules_registry import get_rules_registry
+from app.utils.config import env_str
+from app.utils.excel_readers import READERS, available_readers
+from app.utils.excel_utils import ExcelWorkbook, dataframe_to_excel_bytes, normalize_dataframe
+from benchmarks.workbook_generator import SheetSpec, make_raw_sheet, write_raw_workbook
+
+STAGES = ("parse", "detect_and_clean", "prepare_export_tables", "trim_edges", "find_segments", "clean_block",
+          "normalize_dataframe", "mock_apply_rules", "dataframe_to_excel_bytes")
+# stages that parse the generated xlsx
+XLSX_STAGES = ("parse", "detect_and_clean", "prepare_export_tables")
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=Path(__file__).resolve().parent).stdout.strip()
+    except Exception:
+        return None
+
+
+def measure(fn: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    """Best wall time over `repeat` runs and tracemalloc peak (MB) of one more run."""
+    best = float("inf")
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"seconds": best, "peak_mb": peak / 1024 / 1024}
+
+
+def stage_inputs(rows: int, spec: Dict[str, Any], rules: Dict[str, Any],
+                 stages: List[str], reader: Optional[str] = None) -> Dict[str, Callable[[], Any]]:
+    """Zero-argument callables, one per stage in `stages`, over a generated sheet of `rows` data rows.
+
+    Inputs are built here, outside the timed calls; the xlsx file is only written
+    when a parsing stage is requested.
+    """
+    raw = make_raw_sheet(SheetSpec(**{**spec, "rows": rows}))
+    # a single table (what detection hands to clean_block) and its cleaned form
+    table = make_raw_sheet(SheetSpec(**{**spec, "rows": rows, "stacked": 1, "side_by_side": 1}))
+    cleaned = clean_block(table)
+    counts = raw.notna().sum(axis=1).tolist()
+    xlsx = b""
+    if set(XLSX_STAGES) & set(stages):
+        buf = io.BytesIO()
+        write_raw_workbook({"Flota": raw}, buf)
+        xlsx = buf.getvalue()
+
+    def parse() -> None:
+        with ExcelWorkbook(xlsx, reader=reader) as wb:
+            wb.sheet("Flota")
+
+    def detect() -> None:
+        # includes the parse, like `prepare_export_tables`
+        with ExcelWorkbook(xlsx, reader=reader) as wb:
+            detect_and_clean_tables(wb)
+
+    calls: Dict[str, Callable[[], Any]] = {
+        "parse": parse,
+        "detect_and_clean": detect,
+        "prepare_export_tables": lambda: prepare_export_tables(xlsx, "Flota"),
+        "trim_edges": lambda: trim_edges(raw),
+        "find_segments": lambda: find_segments(counts),
+        "clean_block": lambda: clean_block(table),
+        "normalize_dataframe": lambda: normalize_dataframe(table),
+        "mock_apply_rules": lambda: _mock_apply_rules(cleaned, rules),
+        "dataframe_to_excel_bytes": lambda: dataframe_to_excel_bytes({"Flota": cleaned}),
+    }
+    return {stage: calls[stage] for stage in stages}
+
+
+def run_suite(sizes: List[int], stages: List[str], spec: Dict[str, Any], repeat: int = 1,
+              max_parse_rows: int = 20_000, max_write_rows: int = 100_000,
+              rules_id: Optional[str] = None, reader: Optional[str] = None) -> Dict[str, Any]:
+    rules = get_rules_registry().get(rules_id).rules
+    results = []
+    for rows in sizes:
+        wanted = [s for s in stages
+                  if not (s in XLSX_STAGES and rows > max_parse_rows)
+                  and not (s == "dataframe_to_excel_bytes" and rows > max_write_rows)]
+        for stage, fn in stage_inputs(rows, spec, rules, wanted, reader).items():
+            m = measure(fn, repeat)
+            results.append({"stage": stage, "rows": rows, "seconds": round(m["seconds"], 6),
+                            "rows_per_s": round(rows / m["seconds"], 1) if m["seconds"] else None,
+                            "peak_mb": round(m["peak_mb"], 3)})
+            print(f"{stage:<26}{rows:>10}{m['seconds']:>12.4f}s{rows / m['seconds']:>16,.0f} rows/s"
+                  f"{m['peak_mb']:>10.1f} MB", flush=True)
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "repeat": repeat,
+            "reader": reader or env_str("EXCEL_READER", "auto"),
+            "readers_available": available_readers(),
+            "spec": spec,
+        },
+        "results": results,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Time and peak-memory ratios (current / baseline) for every (stage, rows) in both runs."""
+    base = {(r["stage"], r["rows"]): r for r in baseline["results"]}
+    out = []
+    for r in current["results"]:
+        b = base.get((r["stage"], r["rows"]))
+        if b is None:
+            continue
+        out.append({"stage": r["stage"], "rows": r["rows"],
+                    "time_ratio": r["seconds"] / b["seconds"] if b["seconds"] else None,
+                    "memory_ratio": r["peak_mb"] / b["peak_mb"] if b["peak_mb"] else None})
+    return out
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--cols", type=int, default=6)
+    parser.add_argument("--stacked", type=int, default=2)
+    parser.add_argument("--side-by-side", type=int, default=2)
+    parser.add_argument("--unit-cardinality", type=int, default=6)
+    parser.add_argument("--summary-ratio", type=float, default=0.005)
+    parser.add_argument("--blank-ratio", type=float, default=0.01)
+    # openpyxl reads and writes well under 10k rows/s (calamine reads ~10x faster): keep the
+    # xlsx stages to sizes that finish
+    parser.add_argument("--max-parse-rows", type=int, default=20_000,
+                        help="skip the xlsx parsing stages above this size")
+    parser.add_argument("--max-write-rows", type=int, default=100_000,
+                        help="skip dataframe_to_excel_bytes above this size")
+    parser.add_argument("--reader", default=None, choices=["auto", *READERS],
+                        help="spreadsheet backend of the parsing stages (default EXCEL_READER)")
+    parser.add_argument("--rules", default=None, help="rule set id for mock_apply_rules")
+    parser.add_argument("--out", default=None, help="write results as JSON to this file")
+    parser.add_argument("--compare", default=None, help="baseline JSON to compare against")
+    args = parser.parse_args(argv)
+
+    import warnings
+    warnings.simplefilter("ignore", FutureWarning)
+    # measure the pipeline, not repeated loads from the sheet cache
+    os.environ["SHEET_CACHE_ENABLED"] = "0"
+
+    spec = {"cols": args.cols, "stacked": args.stacked, "side_by_side": args.side_by_side,
+            "unit_cardinality": args.unit_cardinality, "summary_ratio": args.summary_ratio,
+            "blank_ratio": args.blank_ratio}
+    report = run_suite(args.rows, args.stages, spec, repeat=args.repeat, max_parse_rows=args.max_parse_rows,
+                       max_write_rows=args.max_write_rows, rules_id=args.rules, reader=args.reader)
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        report["comparison"] = {"baseline_commit": baseline["meta"].get("commit"),
+                                "results": compare(report, baseline)}
+        print(f"\nvs {args.compare} ({baseline['meta'].get('commit')}):")
+        for c in report["comparison"]["results"]:
+            print(f"{c['stage']:<26}{c['rows']:>10}{c['time_ratio']:>10.2f}x time{c['memory_ratio']:>10.2f}x memory")
+    if args.out:
+        out = Path(args.out)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"\nResults written to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Synthetic messy workbooks for benchmarks and load tests.
+
+`make_raw_sheet` lays out a grid of fleet tables the way operators' files look:
+blank margins, a title row above each table, a header, unit rows with blank and
+TOTAL/subtotal rows mixed in, and tables stacked vertically and side by side.
+The result is a header-less DataFrame, i.e. what `ExcelWorkbook.sheet` returns.
+
+Usage (from `backend_api/`):
+
+    python -m benchmarks.workbook_generator out.xlsx --rows 100000 --stacked 2 --side-by-side 2
+"""
+import argparse
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Union
+
+import numpy as np
+import pandas as pd
+
+UNIT_TYPES = ("TRACTO", "REMOLQUE", "TANQUE", "DOLLY", "CAMION", "AUTO", "PICK UP", "CAJA SECA",
+              "PLATAFORMA", "GRUA", "AUTOBUS", "MOTOCICLETA")
+HEADERS = ("TIPO DE UNIDAD", "Desci.", "MOD", "NO.SERIE", "SUMA ASEGURADA", "PLACAS", "MOTOR",
+           "COLOR", "CONDUCTOR", "ZONA", "USO", "OBSERVACIONES")
+
+
+class SheetSpec:
+    """Shape of a generated sheet (any of `DEFAULTS` can be overridden by keyword).
+
+    `rows` is the total number of data rows, split evenly over `stacked` x
+    `side_by_side` tables of `cols` columns each. `unit_cardinality` distinct unit
+    types are used (names beyond `UNIT_TYPES` get a numeric suffix).
+    """
+
+    DEFAULTS: Dict[str, Any] = {
+        "rows": 10_000, "cols": 6, "stacked": 1, "side_by_side": 1,
+        "margin_rows": 2, "margin_cols": 1, "gap_rows": 3, "gap_cols": 2,
+        "blank_ratio": 0.01, "summary_ratio": 0.005, "unit_cardinality": 6, "seed": 0,
+    }
+
+    def __init__(self, **options: Any):
+        unknown = set(options) - set(self.DEFAULTS)
+        if unknown:
+            raise TypeError(f"Unknown sheet options: {sorted(unknown)}")
+        for name, default in self.DEFAULTS.items():
+            setattr(self, name, options.get(name, default))
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.DEFAULTS}
+
+
+def unit_types(cardinality: int) -> np.ndarray:
+    names = list(UNIT_TYPES[:cardinality])
+    names += [f"{UNIT_TYPES[i % len(UNIT_TYPES)]} {i}" for i in range(len(names), cardinality)]
+    return np.array(names, dtype=object)
+
+
+def make_table(rows: int, cols: int, rng: np.random.Generator, spec: SheetSpec) -> np.ndarray:
+    """One table as an object array: title row, header row and `rows` data rows."""
+    cols = max(2, cols)
+    units = unit_types(max(1, spec.unit_cardinality))
+    generators = (
+        lambda: rng.choice(units, rows),
+        lambda: np.char.add("  DESC ", rng.integers(0, 1000, rows).astype(str)).astype(object),
+        lambda: rng.integers(2000, 2026, rows).astype(object),
+        lambda: np.char.add("SER", rng.integers(0, 10**9, rows).astype(str)).astype(object),
+        lambda: np.round(rng.random(rows) * 1e6, 2).astype(object),
+    )
+    body = np.empty((rows, cols), dtype=object)
+    for c in range(cols):
+        if c < len(generators):
+            body[:, c] = generators[c]()
+        else:
+            body[:, c] = np.char.add(f"V{c} ", rng.integers(0, 100, rows).astype(str)).astype(object)
+
+    blanks = rng.random(rows) < spec.blank_ratio
+    body[blanks, :] = None
+    totals = ~blanks & (rng.random(rows) < spec.summary_ratio)
+    body[totals, :] = None
+    body[totals, 0] = rng.choice(np.array(["TOTAL", "Subtotal", "RESUMEN"], dtype=object), int(totals.sum()))
+    body[totals, cols - 1] = 1.0
+
+    header = np.array([HEADERS[c] if c < len(HEADERS) else f"COL {c}" for c in range(cols)], dtype=object)
+    title = np.full(cols, None, dtype=object)
+    title[0] = "Reporte flota"
+    return np.vstack([title, header, body])
+
+
+def make_raw_sheet(spec: SheetSpec) -> pd.DataFrame:
+    """Header-less sheet with `spec.stacked` x `spec.side_by_side` tables and blank margins."""
+    rng = np.random.default_rng(spec.seed)
+    n_tables = max(1, spec.stacked) * max(1, spec.side_by_side)
+    per_table = max(1, spec.rows // n_tables)
+    table_h = per_table + 2
+    height = spec.margin_rows + spec.stacked * table_h + (spec.stacked - 1) * spec.gap_rows
+    width = spec.margin_cols + spec.side_by_side * spec.cols + (spec.side_by_side - 1) * spec.gap_cols
+    grid = np.full((height, width), None, dtype=object)
+    for i in range(max(1, spec.stacked)):
+        r0 = spec.margin_rows + i * (table_h + spec.gap_rows)
+        for j in range(max(1, spec.side_by_side)):
+            c0 = spec.margin_cols + j * (spec.cols + spec.gap_cols)
+            grid[r0:r0 + table_h, c0:c0 + spec.cols] = make_table(per_table, spec.cols, rng, spec)
+    return pd.DataFrame(grid)
+
+
+def write_raw_workbook(sheets: Dict[str, pd.DataFrame], dest: Union[str, Path, BinaryIO]) -> None:
+    """Write header-less sheets to `dest` (path or binary file) cell for cell, in write-only mode.
+
+    Blank cells stay empty, as in the files operators upload.
+    """
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    for name, df in sheets.items():
+        ws = wb.create_sheet(title=name[:31])
+        for row in df.itertuples(index=False, name=None):
+            ws.append([None if v is None or (isinstance(v, float) and v != v) else v for v in row])
+    wb.save(dest)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("output")
+    parser.add_argument("--sheets", type=int, default=1)
+    for name, value in SheetSpec.DEFAULTS.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(value), default=value)
+    args = parser.parse_args()
+    options = {name: getattr(args, name) for name in SheetSpec.DEFAULTS}
+    sheets = {f"Flota{i + 1}": make_raw_sheet(SheetSpec(**{**options, "seed": args.seed + i}))
+              for i in range(args.sheets)}
+    write_raw_workbook(sheets, args.output)
+    print(args.output)
+
+
+if __name__ == "__main__":
+    main()
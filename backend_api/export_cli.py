@@ -0,0 +1,75 @@
+"""Batch export from the command line: several workbooks (or folders of them) in one run.
+
+Usage (from `backend_api/`):
+
+    python export_cli.py flota.xlsx otros/ --sheet Flota --rules sample3_test -o resultado.zip
+
+Folders are expanded to the `.xlsx`/`.xls` files they contain. `--sheet` may be
+repeated and accepts `<file>:<sheet>` to target one file; without it every sheet
+of every workbook is exported.
+"""
+import argparse
+import asyncio
+import shutil
+import sys
+from pathlib import Path
+from typing import List
+
+from dotenv import load_dotenv
+
+from app.services.batch_export import OUTPUT_FORMATS, BatchInput, run_batch, sheets_for_file
+from app.utils.debug_artifacts import close_debug_writer
+from app.utils.executors import shutdown_executors
+from app.utils.llm_client import close_llm_pool
+from app.utils.logging_config import configure_logging
+
+
+def expand_inputs(paths: List[str]) -> List[Path]:
+    files: List[Path] = []
+    for raw in paths:
+        path = Path(raw)
+        if path.is_dir():
+            files.extend(sorted(p for p in path.iterdir()
+                                if p.suffix.lower() in (".xlsx", ".xls") and not p.name.startswith("~$")))
+        elif path.is_file():
+            files.append(path)
+        else:
+            raise SystemExit(f"No such file or directory: {raw}")
+    if not files:
+        raise SystemExit("No Excel files found")
+    return files
+
+
+async def _run(args: argparse.Namespace) -> Path:
+    items = [BatchInput(p, sheets=sheets_for_file(args.sheet, p.name)) for p in expand_inputs(args.inputs)]
+    out_path, out_name = await run_batch(items, rules_id=args.rules, output=args.format)
+    dest = Path(args.output) if args.output else Path(out_name)
+    shutil.move(str(out_path), dest)
+    return dest
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("inputs", nargs="+", help="workbooks or folders containing workbooks")
+    parser.add_argument("--sheet", action="append", help="sheet to export (repeatable, `<file>:<sheet>` for one file)")
+    parser.add_argument("--rules", default=None, help="rule set id (default rule set if omitted)")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="auto",
+                        help="one workbook (xlsx), one workbook per input (zip) or auto")
+    parser.add_argument("-o", "--output", default=None, help="output file (default: modified_<name> in cwd)")
+    args = parser.parse_args()
+
+    load_dotenv()
+    configure_logging()
+    try:
+        dest = asyncio.run(_run(args))
+    except ValueError as e:
+        sys.exit(f"Batch export failed: {e}")
+    finally:
+        shutdown_executors()
+        close_llm_pool()
+        close_debug_writer()
+    print(dest)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,15 @@
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.router import router as api_router
 from dotenv import load_dotenv
 import os
 from app.utils.logging_config import configure_logging
+from app.utils.debug_artifacts import close_debug_writer
+from app.utils.executors import shutdown_executors
+from app.utils.llm_client import close_llm_pool
+from app.utils.metrics import ServerTimingMiddleware, get_metrics
+from app.services.export_jobs import get_job_runner, shutdown_job_runner
 
 load_dotenv()
 
@@ -24,10 +30,30 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
+app.add_middleware(ServerTimingMiddleware)
 
 app.include_router(api_router, prefix="")
 
+@app.on_event("startup")
+async def _start_job_runner():
+    get_job_runner().start()
+
+
+@app.on_event("shutdown")
+async def _shutdown_executors():
+    await shutdown_job_runner()
+    shutdown_executors(wait=False)
+    close_llm_pool()
+    close_debug_writer()
+
+
 @app.get("/healthz")
 def healthz():
     return {"status": "ok"}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(get_metrics().render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,12 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def _isolated_state(monkeypatch, tmp_path):
+    """Keep on-disk caches of the app out of the source tree during tests."""
+    monkeypatch.setenv("LLM_CACHE_PATH", str(tmp_path / "llm_cache.sqlite3"))
+    monkeypatch.setenv("JOBS_DIR", str(tmp_path / "jobs"))
+    monkeypatch.setenv("EXPORT_CACHE_DIR", str(tmp_path / "export_cache"))
+    monkeypatch.setenv("LLM_DEBUG_DIR", str(tmp_path / "llm_debug"))
+    monkeypatch.setenv("SHEET_CACHE_DIR", str(tmp_path / "sheet_cache"))
+    monkeypatch.setenv("WORKBOOKS_DIR", str(tmp_path / "workbooks"))
@@ -0,0 +1,170 @@
+import asyncio
+import io
+
+import pandas as pd
+import pytest
+from fastapi import HTTPException
+from openpyxl import Workbook
+from starlette.datastructures import UploadFile
+
+from backend_api.app.controllers import export_controller
+from backend_api.app.services import excel_service
+from backend_api.app.utils import admission
+from backend_api.app.utils.admission import ExportCost, ExportTooLargeError, ResourceGovernor, estimate_export
+from backend_api.app.utils.executors import ExecutorSaturatedError
+
+
+def _save(wb, path):
+    wb.save(path)
+    return path.stat().st_size
+
+
+def test_estimate_uses_recorded_dimensions_or_file_size(tmp_path, monkeypatch):
+    monkeypatch.setenv("EXPORT_BYTES_PER_CELL", "100")
+    wb = Workbook()
+    wb.active.title = "Flota"
+    for i in range(50):
+        wb.active.append(["TRACTO", 2020, i, None, "x"])
+    wb.create_sheet("Notas").append(["a", "b"])
+    size = _save(wb, tmp_path / "flota.xlsx")
+
+    cost = estimate_export(tmp_path / "flota.xlsx", size, ["Flota"])
+    assert (cost.cells, cost.memory_bytes, cost.source) == (250, 25_000, "dimension")
+    assert estimate_export(tmp_path / "flota.xlsx", size).cells == 252
+
+    # write-only workbooks (and other tools) record no dimension: fall back to the size
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Flota")
+    for i in range(50):
+        ws.append(["TRACTO", 2020, i])
+    size = _save(wb, tmp_path / "streamed.xlsx")
+    cost = estimate_export(tmp_path / "streamed.xlsx", size, ["Flota"])
+    assert (cost.cells, cost.source) == (size // 4, "size")
+
+
+def test_governor_rejects_oversized_and_serves_small_exports_first():
+    async def scenario():
+        gov = ResourceGovernor(memory_bytes=100, max_active=1, max_queued=2, max_wait=5, aging_seconds=0)
+        with pytest.raises(ExportTooLargeError, match="over the"):
+            await gov.acquire(ExportCost(10, 101))
+
+        order = []
+
+        async def run(name, memory, release=None):
+            async with gov.admit(ExportCost(1, memory)):
+                order.append(name)
+                if release is not None:
+                    await release.wait()
+
+        release = asyncio.Event()
+        first = asyncio.create_task(run("first", 10, release))
+        await asyncio.sleep(0)
+        large = asyncio.create_task(run("large", 80))
+        await asyncio.sleep(0)
+        small = asyncio.create_task(run("small", 5))
+        await asyncio.sleep(0)
+        assert gov.stats()["queued"] == 2
+        with pytest.raises(ExecutorSaturatedError):
+            await gov.acquire(ExportCost(1, 1))
+
+        release.set()
+        await asyncio.gather(first, large, small)
+        assert order == ["first", "small", "large"]
+        assert gov.stats()["active"] == 0 and gov.stats()["reserved_bytes"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_export_over_the_budget_runs_alone():
+    async def scenario():
+        gov = ResourceGovernor(memory_bytes=100, max_active=4, max_queued=4, max_wait=5,
+                               max_export_bytes=1000)
+        with pytest.raises(ExportTooLargeError) as info:
+            gov.check(ExportCost(10, 1001))
+        assert info.value.limit == 1000
+
+        await gov.acquire(ExportCost(1, 10))
+        large = asyncio.create_task(gov.acquire(ExportCost(10, 500)))
+        await asyncio.sleep(0.05)
+        # waits for the running export, then takes the whole budget
+        assert not large.done()
+        gov.release(ExportCost(1, 10))
+        await large
+        assert gov.stats()["reserved_bytes"] == 100
+        small = asyncio.create_task(gov.acquire(ExportCost(1, 1)))
+        await asyncio.sleep(0.05)
+        assert not small.done()
+        gov.release(ExportCost(10, 500))
+        await small
+        assert gov.stats()["reserved_bytes"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_default_budget_follows_host_memory_and_admits_benchmark_sheets(monkeypatch):
+    monkeypatch.setattr(admission, "_governor", None)
+    monkeypatch.setattr(admission, "host_memory_bytes", lambda: 8 * 1024 ** 3)
+    gov = admission.get_governor()
+    assert (gov.memory_bytes, gov.max_export_bytes) == (4 * 1024 ** 3, 8 * 1024 ** 3)
+
+    # a 1M-row, 12-column benchmarks sheet, as estimated from its dimension (A1:M1000004)
+    cost = ExportCost(13 * 1_000_004, 13 * 1_000_004 * 256, "dimension")
+    assert cost.memory_bytes > 2048 * 1024 ** 2
+
+    async def scenario():
+        async with gov.admit(cost):
+            assert gov.stats()["active"] == 1
+
+    asyncio.run(scenario())
+
+    monkeypatch.setattr(admission, "_governor", None)
+    monkeypatch.setattr(admission, "host_memory_bytes", lambda: None)
+    assert admission.get_governor().memory_bytes == admission.get_governor().max_export_bytes == 2048 * 1024 ** 2
+    monkeypatch.setattr(admission, "_governor", None)
+    monkeypatch.setenv("EXPORT_MEMORY_BUDGET_MB", "512")
+    assert admission.get_governor().memory_bytes == 512 * 1024 ** 2
+
+
+def test_memory_budget_is_shared_and_waits_are_bounded():
+    async def scenario():
+        gov = ResourceGovernor(memory_bytes=100, max_active=4, max_queued=4, max_wait=0.05)
+        await gov.acquire(ExportCost(1, 70))
+        # a CPU slot is free but the memory is not
+        with pytest.raises(ExecutorSaturatedError, match="within"):
+            await gov.acquire(ExportCost(1, 40))
+        assert gov.stats()["queued"] == 0
+        await gov.acquire(ExportCost(1, 30))
+        assert gov.stats()["reserved_bytes"] == 100
+
+        # background jobs wait instead of failing
+        job = asyncio.create_task(gov.acquire(ExportCost(1, 40), interactive=False))
+        await asyncio.sleep(0.1)
+        assert not job.done()
+        gov.release(ExportCost(1, 70))
+        await job
+        assert gov.stats()["reserved_bytes"] == 70
+
+    asyncio.run(scenario())
+
+
+def test_oversized_export_is_refused_before_parsing(monkeypatch):
+    monkeypatch.setattr(admission, "_governor", None)
+    monkeypatch.setenv("EXPORT_MEMORY_BUDGET_MB", "1")
+    monkeypatch.setenv("EXPORT_MAX_MEMORY_MB", "1")
+    monkeypatch.setenv("EXPORT_BYTES_PER_CELL", str(1024 ** 2))
+
+    async def no_export(*args, **kwargs):
+        raise AssertionError("export started")
+
+    monkeypatch.setattr(excel_service, "export_from_path", no_export)
+    buf = io.BytesIO()
+    with pd.ExcelWriter(buf, engine="openpyxl") as writer:
+        pd.DataFrame([["unidad", "serie"], ["camion", "A1"]]).to_excel(
+            writer, index=False, header=False, sheet_name="Flota")
+    upload = UploadFile(file=io.BytesIO(buf.getvalue()), filename="flota.xlsx")
+
+    with pytest.raises(HTTPException) as info:
+        asyncio.run(export_controller.export_file(upload, "Flota"))
+
+    assert info.value.status_code == 413
+    assert "4 cells" in info.value.detail
@@ -0,0 +1,171 @@
+"""HTTP-level tests of the app in `main`, through httpx's ASGI transport.
+
+`main` imports the backend as the top-level `app` package (as uvicorn runs it),
+so the modules patched here are that copy, not `backend_api.app`.
+"""
+import asyncio
+import importlib
+import io
+import sys
+import zipfile
+from pathlib import Path
+
+import httpx
+import pandas as pd
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+def _workbook(rows=(("unidad", "serie"), ("camion", "A1"), ("auto", "B2"))) -> bytes:
+    buf = io.BytesIO()
+    with pd.ExcelWriter(buf, engine="openpyxl") as writer:
+        pd.DataFrame(list(rows)).to_excel(writer, index=False, header=False, sheet_name="Flota")
+    return buf.getvalue()
+
+
+@pytest.fixture
+def main(monkeypatch, tmp_path):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    monkeypatch.setenv("LOG_DIR", str(tmp_path / "logs"))
+    if str(BACKEND_DIR) not in sys.path:
+        sys.path.insert(0, str(BACKEND_DIR))
+    return importlib.import_module("main")
+
+
+def _serve(main, scenario):
+    """Run `scenario(client)` against the app, stopping the job workers afterwards."""
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await scenario(client)
+        finally:
+            await main.shutdown_job_runner()
+
+    return asyncio.run(run())
+
+
+def _upload(name="flota.xlsx", data=None):
+    return {"file": (name, data or _workbook(), XLSX)}
+
+
+async def _wait_for_job(client, job_id):
+    for _ in range(200):
+        job = (await client.get(f"/jobs/{job_id}")).json()
+        if job["status"] in ("done", "failed"):
+            return job
+        await asyncio.sleep(0.05)
+    raise AssertionError("job did not finish")
+
+
+def test_jobs_endpoints(main):
+    async def scenario(client):
+        submitted = await client.post("/jobs", files=_upload(), data={"sheet": "Flota"})
+        assert submitted.status_code == 202
+        job_id = submitted.json()["id"]
+        assert submitted.headers["location"] == f"/jobs/{job_id}"
+
+        job = await _wait_for_job(client, job_id)
+        assert job["status"] == "done" and job["result_url"] == f"/jobs/{job_id}/result"
+        result = await client.get(job["result_url"])
+        assert result.status_code == 200
+        assert result.headers["content-disposition"] == 'attachment; filename="modified_flota.xlsx"'
+        assert "Flota_Table1" in pd.read_excel(io.BytesIO(result.content), sheet_name=None)
+
+        failed = (await client.post("/jobs", files=_upload(), data={"sheet": "Missing"})).json()
+        assert (await _wait_for_job(client, failed["id"]))["status"] == "failed"
+        assert (await client.get(f"/jobs/{failed['id']}/result")).status_code == 409
+        assert (await client.get("/jobs/unknown")).status_code == 404
+        assert (await client.post("/jobs", files=_upload("flota.csv"), data={"sheet": "Flota"})).status_code == 400
+
+    _serve(main, scenario)
+
+
+def test_batch_export_endpoint(main):
+    async def scenario(client):
+        files = [("files", ("a.xlsx", _workbook(), XLSX)), ("files", ("b.xlsx", _workbook(), XLSX))]
+        response = await client.post("/export/batch", files=files, data={"output": "zip"})
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/zip"
+        with zipfile.ZipFile(io.BytesIO(response.content)) as zf:
+            assert len(zf.namelist()) == 2
+
+        bad = await client.post("/export/batch", files=files, data={"output": "pdf"})
+        assert bad.status_code == 400
+
+    _serve(main, scenario)
+
+
+def test_metrics_and_server_timing(main):
+    async def scenario(client):
+        # a workbook of its own, so the sheet cache cannot skip the parse
+        data = _workbook((("unidad", "serie"), ("moto", "C3")))
+        response = await client.post("/export", files=_upload(data=data), data={"sheet": "Flota"})
+        assert response.status_code == 200
+        stages = [entry.split(";")[0] for entry in response.headers["server-timing"].split(", ")]
+        assert {"upload", "cache", "parse", "write", "total"} <= set(stages)
+
+        metrics = await client.get("/metrics")
+        assert metrics.status_code == 200
+        assert metrics.headers["content-type"].startswith("text/plain")
+        assert 'export_stage_seconds_count{stage="parse"}' in metrics.text
+        assert 'export_admissions_total{outcome="admitted"}' in metrics.text
+
+    _serve(main, scenario)
+
+
+def test_workbooks_endpoints(main):
+    async def scenario(client):
+        created = await client.post("/workbooks", files=_upload())
+        assert created.status_code == 201
+        workbook_id = created.json()["id"]
+        assert created.headers["location"] == f"/workbooks/{workbook_id}"
+
+        info = await client.get(f"/workbooks/{workbook_id}")
+        assert info.status_code == 200 and "Flota" in info.json()["sheets"]
+        page = await client.get(f"/workbooks/{workbook_id}/sheets/Flota", params={"limit": 2})
+        assert page.status_code == 200 and len(page.json()["rows"]) == 2
+        cleaned = await client.get(f"/workbooks/{workbook_id}/sheets/Flota", params={"view": "cleaned"})
+        assert cleaned.status_code == 200 and cleaned.json()["table"] == "Flota_Table1"
+        bad_view = await client.get(f"/workbooks/{workbook_id}/sheets/Flota", params={"view": "pdf"})
+        assert bad_view.status_code == 400
+
+        exported = await client.post("/export", data={"sheet": "Flota", "workbook_id": workbook_id})
+        assert exported.status_code == 200
+
+        assert (await client.delete(f"/workbooks/{workbook_id}")).status_code == 200
+        assert (await client.get(f"/workbooks/{workbook_id}")).status_code == 404
+        assert (await client.post("/export", data={"sheet": "Flota", "workbook_id": workbook_id})).status_code == 404
+
+    _serve(main, scenario)
+
+
+def test_admission_stats_and_error_mapping(main, monkeypatch):
+    admission = importlib.import_module("app.utils.admission")
+
+    async def scenario(client):
+        stats = await client.get("/admission/stats")
+        assert stats.status_code == 200
+        assert set(stats.json()) == {"exports", "llm"}
+        assert stats.json()["exports"]["active"] == 0
+
+        # over the memory budget: refused before parsing
+        monkeypatch.setattr(admission, "_governor", admission.ResourceGovernor(
+            memory_bytes=1024, max_active=1, max_queued=0))
+        too_large = await client.post("/export", files=_upload(), data={"sheet": "Flota"})
+        assert too_large.status_code == 413
+        assert "limit of one export" in too_large.json()["detail"]
+        assert (await client.post("/jobs", files=_upload(), data={"sheet": "Flota"})).status_code == 413
+
+        # every slot busy and no queue: refused with a retry hint
+        busy = admission.ResourceGovernor(memory_bytes=1024 ** 3, max_active=1, max_queued=0)
+        monkeypatch.setattr(admission, "_governor", busy)
+        await busy.acquire(admission.ExportCost(1, 1))
+        saturated = await client.post("/export", files=_upload(), data={"sheet": "Flota"})
+        assert saturated.status_code == 503
+        assert int(saturated.headers["retry-after"]) >= 1
+        assert (await client.get("/admission/stats")).json()["exports"]["active"] == 1
+
+    _serve(main, scenario)
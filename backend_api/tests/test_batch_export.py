@@ -0,0 +1,98 @@
+import asyncio
+import io
+import zipfile
+
+import pandas as pd
+import pytest
+
+from backend_api.app.services import batch_export
+
+
+def _write_workbook(path, sheets):
+    with pd.ExcelWriter(path, engine="openpyxl") as writer:
+        for name, rows in sheets.items():
+            pd.DataFrame(rows).to_excel(writer, index=False, header=False, sheet_name=name)
+    return path
+
+
+_FLOTA = [["unidad", "serie"], ["camion", "A1"], ["auto", "B2"]]
+
+
+@pytest.fixture(autouse=True)
+def _no_llm(monkeypatch):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+
+
+def test_sheets_for_file_selection():
+    selection = ["Flota", "a.xlsx:Extra", "b.xlsx:Otra"]
+    assert batch_export.sheets_for_file(selection, "a.xlsx") == ["Flota", "Extra"]
+    assert batch_export.sheets_for_file(["b.xlsx:Otra"], "a.xlsx") is None
+    assert batch_export.sheets_for_file(None, "a.xlsx") is None
+
+
+def test_single_workbook_exports_every_sheet(tmp_path):
+    src = _write_workbook(tmp_path / "flota.xlsx", {"Flota": _FLOTA, "Vacia": [[None]], "Otra": _FLOTA})
+
+    out_path, name = asyncio.run(batch_export.run_batch([batch_export.BatchInput(src)]))
+
+    assert name == "modified_flota.xlsx"
+    result = pd.read_excel(out_path, sheet_name=None)
+    # the empty sheet is skipped in whole-workbook mode
+    assert list(result) == ["Flota_Table1", "Otra_Table1"]
+    assert "DANOS MATERIALES LIMITES" in result["Flota_Table1"].columns
+
+
+def test_several_workbooks_go_to_a_zip(tmp_path):
+    a = _write_workbook(tmp_path / "a.xlsx", {"Flota": _FLOTA})
+    b = _write_workbook(tmp_path / "b.xlsx", {"Flota": _FLOTA, "Otra": _FLOTA})
+    items = [batch_export.BatchInput(a), batch_export.BatchInput(b, sheets=["Otra"])]
+
+    out_path, name = asyncio.run(batch_export.run_batch(items))
+
+    assert name == "modified_batch.zip"
+    with zipfile.ZipFile(out_path) as zf:
+        assert sorted(zf.namelist()) == ["modified_a.xlsx", "modified_b.xlsx"]
+        b_sheets = pd.read_excel(io.BytesIO(zf.read("modified_b.xlsx")), sheet_name=None)
+    assert list(b_sheets) == ["Otra_Table1"]
+
+
+def test_several_workbooks_into_one_xlsx(tmp_path):
+    a = _write_workbook(tmp_path / "a.xlsx", {"Flota": _FLOTA})
+    b = _write_workbook(tmp_path / "b.xlsx", {"Flota": _FLOTA})
+    items = [batch_export.BatchInput(a), batch_export.BatchInput(b)]
+
+    out_path, name = asyncio.run(batch_export.run_batch(items, output="xlsx"))
+
+    assert name == "modified_batch.xlsx"
+    assert list(pd.read_excel(out_path, sheet_name=None)) == ["a_Flota_Table1", "b_Flota_Table1"]
+
+
+def test_missing_explicit_sheet_fails(tmp_path):
+    src = _write_workbook(tmp_path / "flota.xlsx", {"Flota": _FLOTA})
+
+    with pytest.raises(ValueError, match="flota.xlsx"):
+        asyncio.run(batch_export.run_batch([batch_export.BatchInput(src, sheets=["Missing"])]))
+
+
+@pytest.mark.parametrize("output", ["xlsx", "zip"])
+def test_failed_write_leaves_no_spool_files(tmp_path, monkeypatch, output):
+    src = _write_workbook(tmp_path / "flota.xlsx", {"Flota": _FLOTA})
+    spooled = []
+    real_spool_path, real_run_cpu = batch_export.spool_path, batch_export.run_cpu
+
+    def recording_spool_path(*args, **kwargs):
+        spooled.append(real_spool_path(*args, **kwargs))
+        return spooled[-1]
+
+    async def failing_write(fn, *args):
+        if fn is batch_export.dataframe_to_excel_file:
+            raise OSError("disk full")
+        return await real_run_cpu(fn, *args)
+
+    monkeypatch.setattr(batch_export, "spool_path", recording_spool_path)
+    monkeypatch.setattr(batch_export, "run_cpu", failing_write)
+
+    with pytest.raises(OSError, match="disk full"):
+        asyncio.run(batch_export.run_batch([batch_export.BatchInput(src)], output=output))
+
+    assert spooled and not any(path.exists() for path in spooled)
@@ -0,0 +1,33 @@
+import pytest
+
+from backend_api.app.utils.csv_stream import CsvStreamError, CsvStreamParser
+
+
+def _feed_all(parser, pieces):
+    rows = []
+    for piece in pieces:
+        rows.extend(parser.feed(piece))
+    rows.extend(parser.close())
+    return rows
+
+
+def test_parser_handles_fences_preamble_and_split_tokens():
+    text = 'Aquí está:\n```csv\nunidad,desc\nTRACTO,"TANQUE 31,500\nLTS"\nDOLLY\n```\n'
+    # feed one character at a time to exercise partial lines and quoted newlines
+    parser = CsvStreamParser()
+    rows = _feed_all(parser, list(text))
+    assert parser.header == ["unidad", "desc"]
+    assert rows == [["TRACTO", "TANQUE 31,500\nLTS"], ["DOLLY", ""]]
+
+
+def test_parser_emits_rows_before_close():
+    parser = CsvStreamParser()
+    assert parser.feed("a,b\n1,") == []
+    assert parser.feed("2\n3") == [["1", "2"]]
+    assert parser.close() == [["3", ""]]
+
+
+def test_parser_rejects_wide_rows():
+    parser = CsvStreamParser()
+    with pytest.raises(CsvStreamError):
+        _feed_all(parser, ["a,b\n1,2,3\n"])
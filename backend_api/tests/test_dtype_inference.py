@@ -0,0 +1,88 @@
+import datetime as dt
+import io
+
+import numpy as np
+import pandas as pd
+
+from backend_api.app.utils import dtype_inference
+from backend_api.app.utils.dtype_inference import compact_table, compact_tables, infer_column
+from backend_api.app.utils.excel_utils import dataframe_to_excel_bytes
+
+
+def _fleet(rows=2000):
+    rng = np.random.default_rng(0)
+    mod = rng.integers(1990, 2025, rows).astype(object)
+    mod[::97] = None
+    return pd.DataFrame({
+        "tipo_de_unidad": np.array(["TRACTO", "DOLLY", "REMOLQUE"], dtype=object)[rng.integers(0, 3, rows)],
+        "mod": mod,
+        "no_serie": np.array([f"SER{i:06d}" for i in range(rows)], dtype=object),
+        "suma_asegurada": (rng.random(rows) * 1e6).round(2),
+        "alta": np.array([dt.datetime(2024, 1, 1) + dt.timedelta(days=i % 300) for i in range(rows)], dtype=object),
+        "activo": np.array([True, False] * (rows // 2), dtype=object),
+        "nota": np.array(["ver", 1] * (rows // 2), dtype=object),
+    })
+
+
+def test_columns_get_compact_types():
+    df = _fleet()
+
+    out = compact_table(df)
+
+    assert isinstance(out["tipo_de_unidad"].dtype, pd.CategoricalDtype)
+    assert str(out["mod"].dtype) == "Int16" and out["mod"].isna().sum() == df["mod"].isna().sum()
+    assert out["no_serie"].dtype == (dtype_inference.STRING_DTYPE or object)
+    assert out["suma_asegurada"].dtype == np.float64
+    assert out["alta"].dtype == "datetime64[ns]"
+    assert str(out["activo"].dtype) == "boolean"
+    assert out["nota"].dtype == object
+    assert list(out.columns) == list(df.columns)
+
+
+def test_values_and_written_workbook_are_unchanged():
+    df = _fleet()
+    out = compact_table(df)
+
+    assert df.to_csv(index=False) == out.to_csv(index=False)
+    written = [pd.read_excel(io.BytesIO(dataframe_to_excel_bytes({"Flota": frame}))) for frame in (df, out)]
+    pd.testing.assert_frame_equal(written[0], written[1])
+
+
+def test_sample_disagreeing_with_the_column_keeps_it_as_is():
+    # the evenly spaced sample only sees numbers; the full column has text too
+    col = pd.Series([str(i) for i in range(5000)] + ["S/N"], dtype=object)
+
+    assert infer_column(col, sample_rows=10).dtype != np.int16
+    assert infer_column(col, sample_rows=10).tolist() == col.tolist()
+    assert str(infer_column(pd.Series([1.0, np.nan, 2024.0]))) == str(pd.Series([1, None, 2024], dtype="Int16"))
+
+
+def test_reports_memory_before_and_after(monkeypatch):
+    tables, memory = compact_tables({"Flota": _fleet()})
+    assert memory["after"] < memory["before"] / 2
+    assert memory["after"] == dtype_inference.memory_bytes(tables["Flota"])
+
+    # exports compact their tables unless turned off
+    assert dtype_inference.compact_types_enabled()
+    monkeypatch.setenv("TABLE_COMPACT_TYPES", "0")
+    assert not dtype_inference.compact_types_enabled()
+
+
+def test_tables_of_a_sheet_are_typed_as_one_block():
+    fleet = _fleet()
+    tables = {f"Flota_Table{i}": part.set_axis([f"{c}_{i}" for c in fleet.columns], axis=1)
+              for i, part in enumerate((fleet.iloc[:3], fleet.iloc[3:], fleet.iloc[:0]), start=1)}
+    tables["Resumen"] = pd.DataFrame({"total": ["5"]}, index=[7])
+
+    typed, memory = compact_tables(tables)
+
+    assert list(typed) == list(tables)
+    for name, df in tables.items():
+        assert list(typed[name].columns) == list(df.columns)
+        assert list(typed[name].index) == list(df.index)
+        assert typed[name].to_csv(index=False) == df.to_csv(index=False)
+    first, second = typed["Flota_Table1"], typed["Flota_Table2"]
+    assert list(first.dtypes) == list(second.dtypes)
+    assert first.iloc[:, 0].cat.categories.equals(second.iloc[:, 0].cat.categories)
+    assert typed["Resumen"]["total"].dtype == "Int8"
+    assert memory["after"] < memory["before"]
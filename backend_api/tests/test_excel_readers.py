@@ -0,0 +1,93 @@
+import datetime as dt
+import io
+
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+from backend_api.app.services import excel_service
+from backend_api.app.utils import excel_readers
+from backend_api.app.utils.excel_readers import available_readers, open_reader
+
+
+def _mixed_workbook():
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Flota"
+    ws.append([None, "TIPO", None])
+    ws.append([1, 2.5, "x"])
+    ws.append([3.0, True, dt.datetime(2024, 1, 2, 3, 4)])
+    ws.append([dt.date(2024, 5, 6), dt.time(8, 30), "NA"])
+    ws.append([None, 2 ** 40, "#DIV/0!"])
+    ws.append([None, None, None])
+    ws.append([None, "tail", None])
+    ws.append([])
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+XLSX_READERS = [name for name in available_readers() if excel_readers.XLSX in excel_readers.READERS[name].formats]
+
+
+@pytest.mark.parametrize("reader", XLSX_READERS)
+@pytest.mark.parametrize("dtype", [None, object])
+def test_every_reader_matches_pandas(reader, dtype):
+    data = _mixed_workbook()
+    expected = pd.read_excel(io.BytesIO(data), header=None, engine="openpyxl", dtype=dtype)
+
+    got = open_reader(data, reader).read_sheet("Flota", dtype=dtype)
+
+    pd.testing.assert_frame_equal(got, expected)
+    # cell types too, so frames from any backend share the sheet cache
+    assert ([[type(v) for v in row] for row in got.itertuples(index=False)]
+            == [[type(v) for v in row] for row in expected.itertuples(index=False)])
+
+
+def test_auto_prefers_calamine_and_falls_back_to_openpyxl(monkeypatch):
+    data = _mixed_workbook()
+    if excel_readers.python_calamine is not None:
+        assert open_reader(data).name == "calamine"
+    monkeypatch.setattr(excel_readers, "python_calamine", None)
+    assert open_reader(data).name == "openpyxl"
+    monkeypatch.setenv("EXCEL_READER", "calamine")
+    with pytest.raises(ValueError, match="not installed"):
+        open_reader(data)
+
+
+def test_auto_streams_large_xlsx_files_with_openpyxl(monkeypatch, tmp_path):
+    data = _mixed_workbook()
+    (tmp_path / "flota.xlsx").write_bytes(data)
+    for source in (data, tmp_path / "flota.xlsx", io.BytesIO(data)):
+        assert excel_readers._source_size(source) == len(data)
+
+    first = open_reader(data).name
+    monkeypatch.setenv("EXCEL_STREAMING_MIN_MB", "1")
+    assert open_reader(data).name == first
+    monkeypatch.setattr(excel_readers, "_source_size", lambda source: 2 * 1024 ** 2)
+    assert open_reader(data).name == "openpyxl"
+    # an explicit backend wins over the size
+    if excel_readers.python_calamine is not None:
+        assert open_reader(data, "calamine").name == "calamine"
+
+
+def test_rejects_files_that_are_not_workbooks_or_unsuitable_readers():
+    with pytest.raises(ValueError, match="Not an Excel workbook"):
+        open_reader(b"unidad,serie\nTRACTO,1\n")
+    with pytest.raises(ValueError, match="cannot read .xls"):
+        open_reader(b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1" + b"\0" * 512, "openpyxl")
+    with pytest.raises(ValueError, match="Unknown EXCEL_READER"):
+        open_reader(_mixed_workbook(), "lxml")
+
+
+def test_detection_is_the_same_with_every_xlsx_reader():
+    buf = io.BytesIO()
+    with pd.ExcelWriter(buf, engine="openpyxl") as writer:
+        pd.DataFrame([[None, None], ["TIPO DE UNIDAD", "MOD"], ["TRACTO", 2020], ["DOLLY", 2021.5]]).to_excel(
+            writer, sheet_name="Flota", index=False, header=False)
+    data = buf.getvalue()
+
+    results = [excel_service.detect_and_clean_tables_from_bytes(data, reader=name) for name in XLSX_READERS]
+
+    for tables in results[1:]:
+        pd.testing.assert_frame_equal(tables["Flota"][0], results[0]["Flota"][0])
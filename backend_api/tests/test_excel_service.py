@@ -3,6 +3,7 @@ import io
 import pandas as pd
 
 from backend_api.app.services import excel_service
+from backend_api.app.utils import excel_readers, excel_utils
 
 
 def test_clean_block_basic():
@@ -58,3 +59,40 @@ def test_detect_and_clean_tables_from_bytes_basic():
     assert list(t0.columns) == ["h_a", "h_b"]
     # two rows expected
     assert t0.shape[0] == 2
+
+
+def test_detect_parses_only_requested_sheets(monkeypatch):
+    buf = io.BytesIO()
+    with pd.ExcelWriter(buf, engine="openpyxl") as writer:
+        for name in ("A", "B", "C"):
+            pd.DataFrame([["h1", "h2"], ["x", 1], ["y", 2]]).to_excel(
+                writer, index=False, header=False, sheet_name=name)
+
+    parsed = []
+    real_read_sheet = excel_readers.SpreadsheetReader.read_sheet
+
+    def counting_read_sheet(self, sheet, dtype=None):
+        parsed.append(sheet)
+        return real_read_sheet(self, sheet, dtype=dtype)
+
+    monkeypatch.setattr(excel_readers.SpreadsheetReader, "read_sheet", counting_read_sheet)
+
+    with excel_service.ExcelWorkbook(buf.getvalue()) as wb:
+        result = excel_service.detect_and_clean_tables(wb, sheets=["B"])
+        # a second consumer of the same sheet reuses the cached parse
+        wb.sheet("B")
+
+    assert list(result) == ["B"]
+    assert parsed == ["B"]
+
+
+def test_write_excel_streams_rows_in_chunks():
+    df = pd.DataFrame({"name": ["a", float("nan"), "c", "d", "e"], "value": [1.5, float("nan"), 3, 4, 5]})
+    buf = io.BytesIO()
+    excel_utils.write_excel({"Data": df, "Empty": df.iloc[0:0]}, buf, chunk_rows=2)
+
+    buf.seek(0)
+    result = pd.read_excel(buf, sheet_name=None)
+    assert list(result) == ["Data", "Empty"]
+    pd.testing.assert_frame_equal(result["Data"], df)
+    assert list(result["Empty"].columns) == ["name", "value"]
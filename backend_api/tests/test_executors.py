@@ -0,0 +1,23 @@
+import asyncio
+import io
+
+import pandas as pd
+from starlette.datastructures import UploadFile
+
+from backend_api.app.services import excel_service
+
+
+def test_process_export_runs_off_loop(monkeypatch):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    buf = io.BytesIO()
+    with pd.ExcelWriter(buf, engine="openpyxl") as writer:
+        pd.DataFrame([["unidad", "serie"], ["camion", "A1"], ["auto", "B2"]]).to_excel(
+            writer, index=False, header=False, sheet_name="Flota")
+
+    upload = UploadFile(file=io.BytesIO(buf.getvalue()), filename="flota.xlsx")
+    out_bytes, out_name = asyncio.run(excel_service.process_export(upload, "Flota"))
+
+    assert out_name == "modified_flota.xlsx"
+    result = pd.read_excel(io.BytesIO(out_bytes), sheet_name=None)
+    assert list(result) == ["Flota_Table1"]
+    assert "DANOS MATERIALES LIMITES" in result["Flota_Table1"].columns
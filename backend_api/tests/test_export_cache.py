@@ -0,0 +1,100 @@
+import asyncio
+import io
+
+import pandas as pd
+from starlette.datastructures import UploadFile
+
+from backend_api.app.services import excel_service, llm_service
+from backend_api.app.utils.export_cache import ExportCache, get_export_cache
+
+
+def _file(tmp_path, name, size):
+    path = tmp_path / name
+    path.write_bytes(b"x" * size)
+    return path
+
+
+def test_export_cache_lru_eviction_and_invalidation(tmp_path):
+    cache = ExportCache(tmp_path / "cache", max_bytes=10, max_age_seconds=60)
+    cache.store("a", _file(tmp_path, "a.xlsx", 5), "rules", "v1")
+    cache.store("b", _file(tmp_path, "b.xlsx", 5), "rules", "v1")
+    assert cache.fetch("a", tmp_path / "out_a.xlsx")  # "a" is now the most recently used
+    cache.store("c", _file(tmp_path, "c.xlsx", 5), "rules", "v2")
+
+    assert not cache.fetch("b", tmp_path / "out_b.xlsx")
+    assert cache.fetch("a", tmp_path / "out_a.xlsx")
+    assert (tmp_path / "out_a.xlsx").read_bytes() == b"x" * 5
+    assert cache.stats()["bytes"] <= 10
+
+    assert cache.invalidate("rules", keep_version="v2") == 1
+    assert not cache.fetch("a", tmp_path / "out_a2.xlsx")
+    assert cache.fetch("c", tmp_path / "out_c.xlsx")
+    # handed-out files survive the removal of their entry
+    cache.clear()
+    assert (tmp_path / "out_c.xlsx").exists()
+    assert cache.stats()["entries"] == 0
+
+
+def _workbook() -> bytes:
+    buf = io.BytesIO()
+    with pd.ExcelWriter(buf, engine="openpyxl") as writer:
+        pd.DataFrame([["unidad", "serie"], ["camion", "A1"]]).to_excel(
+            writer, index=False, header=False, sheet_name="Flota")
+    return buf.getvalue()
+
+
+def test_repeated_export_is_served_from_cache(monkeypatch):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    calls = []
+    real_export = excel_service.export_from_path
+
+    async def counting_export(*args, **kwargs):
+        calls.append(args[1])
+        return await real_export(*args, **kwargs)
+
+    monkeypatch.setattr(excel_service, "export_from_path", counting_export)
+    data = _workbook()
+
+    def export(sheet="Flota"):
+        upload = UploadFile(file=io.BytesIO(data), filename="flota.xlsx")
+        return asyncio.run(excel_service.process_export(upload, sheet))
+
+    first, name = export()
+    second, _ = export()
+
+    assert calls == ["Flota"]
+    assert second == first
+    assert name == "modified_flota.xlsx"
+
+
+def test_export_with_llm_fallback_is_not_cached(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setenv("RULES_ENGINE", "llm")
+    monkeypatch.setenv("LLM_CACHE_ENABLED", "0")
+
+    def failing_call(*args, **kwargs):
+        raise RuntimeError("LLM unavailable")
+
+    monkeypatch.setattr(llm_service, "_call_openai_csv", failing_call)
+    monkeypatch.setattr(llm_service, "_save_llm_debug", lambda *a, **k: None)
+    calls = []
+    real_export = excel_service.export_from_path
+
+    async def counting_export(*args, **kwargs):
+        calls.append(args[1])
+        return await real_export(*args, **kwargs)
+
+    monkeypatch.setattr(excel_service, "export_from_path", counting_export)
+    data = _workbook()
+
+    def export():
+        upload = UploadFile(file=io.BytesIO(data), filename="flota.xlsx")
+        return asyncio.run(excel_service.process_export(upload, "Flota"))
+
+    first, _ = export()
+    second, _ = export()
+
+    # both exports ran the pipeline: the fallback result was served but not stored
+    assert calls == ["Flota", "Flota"]
+    assert first == second
+    assert get_export_cache().stats()["entries"] == 0
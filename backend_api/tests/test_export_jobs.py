@@ -0,0 +1,89 @@
+import asyncio
+import io
+from pathlib import Path
+
+import pandas as pd
+from starlette.datastructures import UploadFile
+
+from backend_api.app.services import excel_service, export_jobs
+from backend_api.app.utils.job_store import DONE, FAILED, JobStore
+
+
+def _workbook() -> bytes:
+    buf = io.BytesIO()
+    with pd.ExcelWriter(buf, engine="openpyxl") as writer:
+        pd.DataFrame([["unidad", "serie"], ["camion", "A1"], ["auto", "B2"]]).to_excel(
+            writer, index=False, header=False, sheet_name="Flota")
+    return buf.getvalue()
+
+
+def _run_until_finished(runner, sheet, data=None):
+    async def scenario():
+        upload = UploadFile(file=io.BytesIO(data or _workbook()), filename="flota.xlsx")
+        job = await runner.submit(upload, sheet)
+        try:
+            for _ in range(200):
+                current = runner.store.get(job["id"])
+                if current["status"] in (DONE, FAILED):
+                    return current
+                await asyncio.sleep(0.05)
+            raise AssertionError("job did not finish")
+        finally:
+            await runner.stop()
+
+    return asyncio.run(scenario())
+
+
+def test_export_job_reports_stages_and_result(monkeypatch, tmp_path):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    runner = export_jobs.ExportJobRunner(JobStore(tmp_path / "jobs.sqlite3"), workers=1, poll_interval=0.05)
+
+    job = _run_until_finished(runner, "Flota")
+
+    view = export_jobs.describe_job(job)
+    assert view["status"] == DONE
+    assert list(view["stages"]) == ["parsed", "tables_detected", "chunks_transformed", "written"]
+    assert view["tables"] == ["Flota_Table1"]
+    assert view["result_url"] == f"/jobs/{job['id']}/result"
+    assert job["result_name"] == "modified_flota.xlsx"
+    # the spooled input is removed, the result stays until the job expires
+    assert not Path(job["input_path"]).exists()
+    result = pd.read_excel(job["result_path"], sheet_name=None)
+    assert "DANOS MATERIALES LIMITES" in result["Flota_Table1"].columns
+
+
+def test_export_job_failure_is_recorded(monkeypatch, tmp_path):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    runner = export_jobs.ExportJobRunner(JobStore(tmp_path / "jobs.sqlite3"), workers=1, poll_interval=0.05)
+
+    job = _run_until_finished(runner, "Missing")
+
+    assert job["status"] == FAILED
+    assert "Sheet 'Missing' not found" in job["error"]
+    assert "result_url" not in export_jobs.describe_job(job)
+
+
+def test_export_jobs_share_the_export_cache(monkeypatch, tmp_path):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    calls = []
+    real_export = excel_service.export_from_path
+
+    async def counting_export(*args, **kwargs):
+        calls.append(args[1])
+        return await real_export(*args, **kwargs)
+
+    monkeypatch.setattr(excel_service, "export_from_path", counting_export)
+    runner = export_jobs.ExportJobRunner(JobStore(tmp_path / "jobs.sqlite3"), workers=1, poll_interval=0.05)
+
+    # one copy of the bytes: the workbook records when it was written
+    data = _workbook()
+    first = _run_until_finished(runner, "Flota", data)
+    second = _run_until_finished(runner, "Flota", data)
+    upload = UploadFile(file=io.BytesIO(data), filename="flota.xlsx")
+    out_path, _ = asyncio.run(excel_service.process_export_to_file(upload, "Flota"))
+
+    assert calls == ["Flota"]
+    assert first["status"] == second["status"] == DONE
+    assert Path(second["result_path"]).read_bytes() == Path(first["result_path"]).read_bytes()
+    assert out_path.read_bytes() == Path(first["result_path"]).read_bytes()
+    out_path.unlink()
@@ -0,0 +1,43 @@
+import time
+
+import pandas as pd
+
+from backend_api.app.services import llm_service
+from backend_api.app.utils.llm_cache import LLMCache, get_llm_cache
+
+
+def test_llm_cache_evicts_by_age_and_size(tmp_path):
+    cache = LLMCache(tmp_path / "c.sqlite3", max_bytes=10, max_age_seconds=60)
+    cache.put("a", "12345")
+    cache.put("b", "12345")
+    assert cache.get("a") == "12345"  # "a" is now the most recently used
+    cache.put("c", "12345")
+    assert cache.get("b") is None
+    assert cache.get("a") == "12345"
+    assert cache.stats()["bytes"] <= 10
+
+    cache.max_age_seconds = 0.01
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert cache.stats()["hits"] == 2
+
+
+def test_transform_uses_cache_for_repeated_requests(monkeypatch):
+    calls = []
+
+    def fake_call(system_prompt, user_prompt, model="m", max_retries=2, timeout=30):
+        calls.append(user_prompt)
+        return "a,b\n1,foo"
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(llm_service, "_call_openai_csv", fake_call)
+    df = pd.DataFrame({"a": [1]})
+
+    first = llm_service.transform_sheet_with_rules(df, rules={"r": 1})
+    second = llm_service.transform_sheet_with_rules(df, rules={"r": 1})
+    llm_service.transform_sheet_with_rules(df, rules={"r": 2})
+
+    assert len(calls) == 2
+    assert first.equals(second)
+    stats = get_llm_cache().stats()
+    assert stats["hits"] == 1 and stats["misses"] == 2
@@ -0,0 +1,137 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from backend_api.app.services import llm_service
+from backend_api.app.utils import llm_client
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server.requests.append(body)
+        server.peers.add(self.client_address)
+        with server.lock:
+            server.active += 1
+            server.peak = max(server.peak, server.active)
+        time.sleep(server.delay)
+        with server.lock:
+            server.active -= 1
+        if server.fail:
+            payload, status = {"error": {"message": "down", "type": "server_error"}}, 503
+        elif body.get("stream"):
+            events = []
+            for piece in ("a,b\n", "1,st", "ub\n"):
+                chunk = {"id": "stub", "object": "chat.completion.chunk", "created": 0, "model": body["model"],
+                         "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+                events.append(f"data: {json.dumps(chunk)}\n\n")
+            events.append("data: [DONE]\n\n")
+            data = "".join(events).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        else:
+            payload, status = {
+                "id": "stub", "object": "chat.completion", "created": 0, "model": body["model"],
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": "a,b\n1,stub"}}],
+                "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+            }, 200
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    server.requests, server.peers, server.fail = [], set(), False
+    server.lock, server.active, server.peak, server.delay = threading.Lock(), 0, 0, 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setenv("OPENAI_BASE_URL", f"http://127.0.0.1:{server.server_port}/v1")
+    monkeypatch.setenv("LLM_RETRY_BASE_SECONDS", "0.01")
+    monkeypatch.setenv("LLM_BREAKER_THRESHOLD", "2")
+    monkeypatch.setenv("LLM_CACHE_ENABLED", "0")
+    llm_client.close_llm_pool()
+    yield server
+    llm_client.close_llm_pool()
+    server.shutdown()
+    server.server_close()
+
+
+def test_pooled_client_reuses_connection(stub_server):
+    for _ in range(3):
+        assert llm_service._call_openai_csv("sys", "user", model="stub-model") == "a,b\n1,stub"
+    assert len(stub_server.requests) == 3
+    assert len(stub_server.peers) == 1  # one keep-alive connection for all calls
+
+
+def test_provider_usage_is_recorded(stub_server):
+    from backend_api.app.utils.token_budget import get_token_meter
+
+    get_token_meter().reset()
+    llm_service._call_openai_csv("sys", "user", model="stub-model")
+    usage = get_token_meter().stats()["models"]["stub-model"]
+    assert (usage["calls"], usage["prompt_tokens"], usage["completion_tokens"]) == (1, 1, 1)
+    assert usage["estimated_calls"] == 0
+
+
+def test_circuit_breaker_short_circuits_to_fallback(stub_server, monkeypatch):
+    stub_server.fail = True
+    monkeypatch.setattr(llm_service, "_save_llm_debug", lambda *a, **k: None)
+    with pytest.raises(Exception):
+        llm_service._call_openai_csv("sys", "user", max_retries=3)
+    # two failed attempts open the breaker; the remaining retries never reach the server
+    assert len(stub_server.requests) == 2
+    assert llm_client.get_llm_pool().breaker.state == llm_client.CircuitBreaker.OPEN
+
+    with pytest.raises(llm_client.CircuitOpenError):
+        llm_service._call_openai_csv("sys", "user")
+    import pandas as pd
+    out = llm_service.transform_sheet_with_rules(pd.DataFrame({"a": [1]}), rules={})
+    assert "DANOS MATERIALES LIMITES" in out.columns
+    assert len(stub_server.requests) == 2
+
+
+def test_breaker_half_open_trial():
+    breaker = llm_client.CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.allow()       # trial call
+    assert not breaker.allow()   # only one trial at a time
+    breaker.record_success()
+    assert breaker.state == breaker.CLOSED
+
+
+def test_streaming_rows_from_stub(stub_server):
+    rows = list(llm_service.iter_llm_csv_rows("sys", "user", model="stub-model"))
+    assert rows == [["a", "b"], ["1", "stub"]]
+    assert stub_server.requests[0]["stream"] is True
+
+
+def test_in_flight_calls_are_capped_process_wide(stub_server, monkeypatch):
+    monkeypatch.setenv("LLM_MAX_IN_FLIGHT", "2")
+    stub_server.delay = 0.05
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        replies = list(pool.map(lambda _: llm_service._call_openai_csv("sys", "user", model="stub-model"), range(6)))
+
+    assert replies == ["a,b\n1,stub"] * 6
+    assert stub_server.peak == 2
+    assert llm_client.get_llm_pool().in_flight == 0
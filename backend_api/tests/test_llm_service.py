@@ -1,8 +1,9 @@
-import os
-from pathlib import Path
+import gzip
+
 import pandas as pd
 
 from backend_api.app.services import llm_service
+from backend_api.app.utils.debug_artifacts import get_debug_writer
 
 
 def test_transform_sheet_with_rules_valid_csv(monkeypatch):
@@ -26,6 +27,8 @@ def test_transform_sheet_with_rules_valid_csv(monkeypatch):
 def test_transform_sheet_with_rules_failure_creates_debug(monkeypatch, tmp_path):
     # Ensure OPENAI key exists so LLM branch is attempted
     monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    debug_dir = tmp_path / "llm_debug"
+    monkeypatch.setenv("LLM_DEBUG_DIR", str(debug_dir))
 
     # Force the _call_openai_csv to raise an exception
     def fake_call_raise(*args, **kwargs):
@@ -33,29 +36,160 @@ def test_transform_sheet_with_rules_failure_creates_debug(monkeypatch, tmp_path)
 
     monkeypatch.setattr(llm_service, "_call_openai_csv", fake_call_raise)
 
-    # Clean potential existing debug files
-    base_dir = Path(llm_service.__file__).resolve().parents[2]
-    debug_dir = base_dir / "data" / "llm_debug"
-    if debug_dir.exists():
-        for f in debug_dir.glob("llm_raw_*.txt"):
-            try:
-                f.unlink()
-            except Exception:
-                pass
-
     df = pd.DataFrame({"a": [1]})
     out = llm_service.transform_sheet_with_rules(df, rules={}, use_llm=True)
 
     # On failure the fallback adds columns
     assert "DANOS MATERIALES LIMITES" in out.columns
 
-    # A debug file should have been created
-    files = list(debug_dir.glob("llm_raw_*.txt")) if debug_dir.exists() else []
-    assert len(files) >= 1
+    # A compressed debug file is written in the background
+    assert get_debug_writer().flush(timeout=5)
+    files = list(debug_dir.glob("llm_raw_*.txt.gz"))
+    assert len(files) == 1
+    with gzip.open(files[0], "rt", encoding="utf-8") as fh:
+        assert "simulated failure" in fh.read()
+
+
+def _prompt_csv(user_prompt):
+    body = user_prompt.split("HOJA DE ENTRADA", 1)[1].split("):\n\n", 1)[1]
+    return body.split("\n\n\nRecuerda", 1)[0]
+
+
+def test_transform_sheet_with_rules_chunks_in_order(monkeypatch):
+    import io
+    import threading
+    import time
+
+    df = pd.DataFrame({"unidad": [f"u{i}" for i in range(10)]})
+    in_flight = []
+    peak = []
+    lock = threading.Lock()
+
+    def fake_call(system_prompt, user_prompt, model="m", max_retries=2, timeout=30):
+        with lock:
+            in_flight.append(1)
+            peak.append(len(in_flight))
+        time.sleep(0.01)
+        chunk = pd.read_csv(io.StringIO(_prompt_csv(user_prompt)))
+        with lock:
+            in_flight.pop()
+        if "u4" in chunk["unidad"].tolist():
+            return "not, a, valid\ncsv"
+        chunk["extra"] = "x"
+        return chunk.to_csv(index=False)
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(llm_service, "_call_openai_csv", fake_call)
+    monkeypatch.setattr(llm_service, "_save_llm_debug", lambda *a, **k: None)
+
+    out = llm_service.transform_sheet_with_rules(df, rules={}, chunk_rows=3, max_concurrency=2)
+
+    assert out["unidad"].tolist() == df["unidad"].tolist()
+    assert list(out.columns) == ["unidad", "extra"]
+    # the failed chunk (rows 3-5) is filled by the deterministic fallback, aligned to the LLM columns
+    assert out["extra"].isna().tolist() == [False] * 3 + [True] * 3 + [False] * 4
+    assert max(peak) <= 2
+
+
+def test_row_batches_share_one_chunk_pool(monkeypatch):
+    import io
+    import threading
+
+    threads = set()
+
+    def fake_call(system_prompt, user_prompt, model="m", max_retries=2, timeout=30):
+        threads.add(threading.current_thread().name)
+        chunk = pd.read_csv(io.StringIO(_prompt_csv(user_prompt)))
+        chunk["extra"] = "x"
+        return chunk.to_csv(index=False)
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setenv("LLM_CACHE_ENABLED", "0")
+    monkeypatch.setattr(llm_service, "_call_openai_csv", fake_call)
+    monkeypatch.setattr(llm_service, "_chunk_pool", None)
+    monkeypatch.setenv("LLM_MAX_IN_FLIGHT", "3")
+
+    df = pd.DataFrame({"unidad": [f"u{i}" for i in range(12)]})
+    for _ in range(3):
+        out = llm_service.transform_sheet_with_rules(df, rules={}, chunk_rows=2, max_concurrency=2)
+        assert out["unidad"].tolist() == df["unidad"].tolist()
 
-    # Cleanup created debug files
-    for f in files:
-        try:
-            f.unlink()
-        except Exception:
-            pass
+    # no executor per table: every batch of every table ran on the same few threads
+    assert all(name.startswith("llm-chunk") for name in threads)
+    assert len(threads) <= 3
+
+
+def test_transform_projects_distinct_keys(monkeypatch):
+    import io
+
+    df = pd.DataFrame({
+        "tipo_de_unidad": ["TRACTO", "DOLLY", "TRACTO", "tracto ", "DOLLY"],
+        "serie": ["s1", "s2", "s3", "s4", "s5"],
+    })
+    sent = []
+
+    def fake_call(system_prompt, user_prompt, model="m", max_retries=2, timeout=30):
+        chunk = pd.read_csv(io.StringIO(_prompt_csv(user_prompt)))
+        sent.append(chunk)
+        chunk = chunk.rename(columns={"tipo_de_unidad": "TIPO DE UNIDAD"})
+        chunk["DEDUCIBLE"] = chunk["TIPO DE UNIDAD"].map(lambda u: "10 %" if "TRACTO" in u.upper() else "5 %")
+        return chunk.to_csv(index=False)
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(llm_service, "_call_openai_csv", fake_call)
+    rules = {"reglas_asignacion": {"mapeo_columnas": {"columna_referencia": "TIPO DE UNIDAD"}}}
+
+    out = llm_service.transform_sheet_with_rules(df, rules=rules)
+
+    assert len(sent) == 1
+    assert list(sent[0].columns) == ["tipo_de_unidad"]
+    assert sent[0]["tipo_de_unidad"].tolist() == ["TRACTO", "DOLLY"]
+    assert list(out.columns) == ["tipo_de_unidad", "serie", "DEDUCIBLE"]
+    assert out["serie"].tolist() == df["serie"].tolist()
+    assert out["DEDUCIBLE"].tolist() == ["10 %", "5 %", "10 %", "10 %", "5 %"]
+
+
+def test_transform_streams_rows_incrementally(monkeypatch):
+    pieces = ["```csv\na,", "b\n1,fo", "o\n2,bar\n", "```"]
+    seen = []
+
+    def fake_stream(system_prompt, user_prompt, model="m", max_retries=2, timeout=30):
+        for i, piece in enumerate(pieces):
+            # rows must reach the callback while the "model" is still generating
+            if i == 3:
+                assert [r for _, rows in seen for r in rows] == [["1", "foo"], ["2", "bar"]]
+            yield piece
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(llm_service, "_stream_openai_csv", fake_stream)
+
+    out = llm_service.transform_sheet_with_rules(pd.DataFrame({"a": [1, 2]}), rules={}, stream=True,
+                                                 on_rows=lambda idx, rows: seen.append((idx, rows)))
+
+    assert list(out.columns) == ["a", "b"]
+    assert out["a"].tolist() == [1, 2]
+    assert out["b"].tolist() == ["foo", "bar"]
+
+
+def test_cached_chunks_report_rows_and_keep_dtypes(monkeypatch):
+    calls = []
+
+    def fake_stream(system_prompt, user_prompt, model="m", max_retries=2, timeout=30):
+        calls.append(1)
+        yield "a,b,c\n1,007,\n2,bar,x\n"
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setenv("LLM_CACHE_ENABLED", "1")
+    monkeypatch.setattr(llm_service, "_stream_openai_csv", fake_stream)
+
+    frames, seen = [], []
+    for _ in range(2):
+        rows = []
+        frames.append(llm_service.transform_sheet_with_rules(
+            pd.DataFrame({"a": [1, 2]}), rules={}, stream=True, on_rows=lambda idx, r: rows.extend(r)))
+        seen.append(rows)
+
+    assert len(calls) == 1  # the second run was answered from the LLM cache
+    assert seen[1] == seen[0] == [["1", "007", ""], ["2", "bar", "x"]]
+    pd.testing.assert_frame_equal(frames[1], frames[0])
+    assert frames[1]["b"].tolist() == ["007", "bar"]
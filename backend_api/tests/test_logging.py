@@ -0,0 +1,57 @@
+import gzip
+import logging
+import logging.handlers
+import os
+import time
+
+from backend_api.app.utils import logging_config
+from backend_api.app.utils.debug_artifacts import DebugArtifactWriter
+
+
+def test_configure_logging_is_idempotent_and_queued(monkeypatch, tmp_path):
+    monkeypatch.setenv("LOG_DIR", str(tmp_path))
+    root = logging.getLogger()
+    before = list(root.handlers)
+    level = root.level
+    try:
+        logging_config.configure_logging("INFO")
+        logging_config.configure_logging("DEBUG")
+        added = [h for h in root.handlers if h not in before]
+        assert len(added) == 1 and isinstance(added[0], logging.handlers.QueueHandler)
+        assert root.level == logging.DEBUG
+
+        logging.getLogger("test_logging").info("queued record")
+    finally:
+        logging_config.shutdown_logging()
+        root.setLevel(level)
+    assert root.handlers == before
+    assert "queued record" in (tmp_path / "app.log").read_text(encoding="utf-8")
+
+
+def test_debug_writer_rate_limits_and_prunes(tmp_path):
+    writer = DebugArtifactWriter(tmp_path, max_bytes=1, max_per_minute=2)
+    try:
+        assert writer.submit("first", tag="_a")
+        assert writer.flush(timeout=5)
+        old = next(tmp_path.glob("llm_raw_*_a.txt.gz"))
+        os.utime(old, (time.time() - 60, time.time() - 60))
+
+        assert writer.submit("second", tag="_b")
+        assert not writer.submit("third", tag="_c")
+        assert writer.flush(timeout=5)
+    finally:
+        writer.close()
+    # the size cap keeps only the newest artifact
+    assert [p.name.endswith("_b.txt.gz") for p in tmp_path.iterdir()] == [True]
+
+
+def test_debug_writer_truncates_large_prompts(tmp_path):
+    writer = DebugArtifactWriter(tmp_path, max_chars=10)
+    try:
+        writer.submit("x" * 1000)
+        assert writer.flush(timeout=5)
+    finally:
+        writer.close()
+    (path,) = tmp_path.glob("llm_raw_*.txt.gz")
+    with gzip.open(path, "rt", encoding="utf-8") as fh:
+        assert fh.read().startswith("x" * 10 + "\n\n--TRUNCATED: 990")
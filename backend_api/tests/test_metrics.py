@@ -0,0 +1,64 @@
+import asyncio
+import io
+
+import pandas as pd
+from starlette.datastructures import UploadFile
+
+from backend_api.app.services import excel_service
+from backend_api.app.utils import metrics
+
+
+def test_histogram_and_counter_render_prometheus_text():
+    registry = metrics.MetricsRegistry()
+    hist = registry.histogram("stage_seconds", "Stage durations", (0.1, 1), ("stage",))
+    hist.observe(0.05, stage="parse")
+    hist.observe(0.5, stage="parse")
+    hist.observe(5, stage="parse")
+    registry.counter("fallbacks_total", "Fallbacks", ("reason",)).inc(reason='bad "csv"')
+
+    text = registry.render()
+
+    assert '# TYPE stage_seconds histogram' in text
+    assert 'stage_seconds_bucket{stage="parse",le="0.1"} 1' in text
+    assert 'stage_seconds_bucket{stage="parse",le="1"} 2' in text
+    assert 'stage_seconds_bucket{stage="parse",le="+Inf"} 3' in text
+    assert 'stage_seconds_sum{stage="parse"} 5.55' in text
+    assert 'fallbacks_total{reason="bad \\"csv\\""} 1' in text
+
+
+def test_server_timing_middleware_reports_request_stages():
+    async def app(scope, receive, send):
+        metrics.record_timing("parse", 0.25)
+        metrics.record_timing("rules", 0.5)
+        metrics.record_timing("rules", 0.25)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(metrics.ServerTimingMiddleware(app)({"type": "http"}, None, send))
+
+    headers = dict(sent[0]["headers"])
+    entries = headers[b"server-timing"].decode().split(", ")
+    assert entries[:2] == ["parse;dur=250.0", "rules;dur=750.0"]
+    assert entries[2].startswith("total;dur=")
+
+
+def test_export_records_stage_metrics(monkeypatch):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    monkeypatch.setenv("EXPORT_CACHE_ENABLED", "0")
+    buf = io.BytesIO()
+    with pd.ExcelWriter(buf, engine="openpyxl") as writer:
+        pd.DataFrame([["unidad", "serie"], ["camion", "A1"]]).to_excel(
+            writer, index=False, header=False, sheet_name="Flota")
+    stages = metrics.stage_seconds()
+    before = {s: stages.count(stage=s) for s in ("upload", "parse", "detect", "rules", "write")}
+
+    upload = UploadFile(file=io.BytesIO(buf.getvalue()), filename="flota.xlsx")
+    asyncio.run(excel_service.process_export(upload, "Flota"))
+
+    assert all(stages.count(stage=s) == n + 1 for s, n in before.items())
+    assert 'rules_rows_count{engine="fallback"}' in metrics.get_metrics().render()
@@ -0,0 +1,47 @@
+import json
+from pathlib import Path
+
+import pandas as pd
+
+from backend_api.app.services import llm_service
+from backend_api.app.services.rules_compiler import compile_rules, normalize_unit
+
+SAMPLE_RULES = Path(__file__).resolve().parents[2] / "data" / "sample3_test.json"
+
+
+def _rules():
+    return json.loads(SAMPLE_RULES.read_text(encoding="utf-8"))
+
+
+def test_normalize_unit():
+    assert normalize_unit("Tractos ") == normalize_unit("TRACTO") == "TRACTO"
+    assert normalize_unit("Camión") == "CAMION"
+    assert normalize_unit(None) == ""
+
+
+def test_compiled_rules_lookup_uses_limits_from_rules():
+    compiled = compile_rules(_rules())
+    assert compiled is not None and compiled.complete
+    df = pd.DataFrame({"tipo_de_unidad": ["TRACTO", "REMOLQUE", "tracto camion", "DOLLY"]})
+
+    assert not compiled.covers(df["tipo_de_unidad"])
+    out = compiled.apply(df, default=lambda col, unit: "?")
+
+    assert out["DANOS MATERIALES DEDUCIBLES"].tolist() == ["10 %", "5 %", "10 %", "?"]
+    assert out["ROBO TOTAL LIMITES"].tolist() == ["VALOR CONVENIDO"] * 3 + ["?"]
+
+
+def test_aliases_make_rules_fully_expressible(monkeypatch):
+    rules = _rules()
+    rules["reglas_asignacion"]["sinonimos"] = {"TANQUE": "REMOLQUES", "DOLLY": "REMOLQUES"}
+    df = pd.DataFrame({"TIPO DE UNIDAD": ["TRACTO", "TANQUE", "DOLLY"], "MOD": [2022, 2025, 2025]})
+
+    def fail_call(*args, **kwargs):
+        raise AssertionError("LLM must not be called when the compiled rules cover the sheet")
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(llm_service, "_call_openai_csv", fail_call)
+
+    out = llm_service.transform_sheet_with_rules(df, rules)
+    assert out["DANOS MATERIALES DEDUCIBLES"].tolist() == ["10 %", "5 %", "5 %"]
+    assert list(out.columns[:2]) == ["TIPO DE UNIDAD", "MOD"]
@@ -0,0 +1,33 @@
+import json
+import os
+
+import pytest
+
+from backend_api.app.services.rules_registry import RulesRegistry
+
+
+def test_registry_loads_once_and_hot_reloads(tmp_path):
+    path = tmp_path / "fleet.json"
+    path.write_text(json.dumps({"coberturas_por_tipo": {"TRACTOS": {"coberturas": {}}}}), encoding="utf-8")
+    registry = RulesRegistry(tmp_path, reload_interval=0)
+
+    first = registry.get("fleet")
+    assert registry.get("fleet") is first
+    assert first.compiled is not None
+
+    path.write_text(json.dumps({"reglas_asignacion": {}}), encoding="utf-8")
+    os.utime(path, (first.mtime + 10, first.mtime + 10))
+    second = registry.get("fleet")
+    assert second.version != first.version
+
+    # an invalid edit keeps serving the last good version
+    path.write_text("{not json", encoding="utf-8")
+    os.utime(path, (first.mtime + 20, first.mtime + 20))
+    assert registry.get("fleet") is second
+
+
+def test_registry_unknown_id(tmp_path):
+    registry = RulesRegistry(tmp_path, reload_interval=0)
+    with pytest.raises(ValueError):
+        registry.get("missing")
+    assert registry.get().rules == {}
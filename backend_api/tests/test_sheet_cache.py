@@ -0,0 +1,87 @@
+import datetime as dt
+import io
+
+import numpy as np
+import pandas as pd
+
+from backend_api.app.services import excel_service
+from backend_api.app.utils import excel_utils, sheet_cache
+from backend_api.app.utils.sheet_cache import SheetCache
+
+
+def _raw_sheet():
+    return pd.DataFrame({
+        0: ["TIPO", 1, 2.5, None, np.nan, True, dt.datetime(2024, 1, 2, 3, 4), 2 ** 70, dt.time(8, 30)],
+        1: ["x"] * 9,
+        2: np.arange(9.0),
+    })
+
+
+def test_frames_round_trip_with_cell_types(tmp_path):
+    cache = SheetCache(tmp_path)
+    raw = _raw_sheet()
+    table = pd.DataFrame({"tipo": ["A", "B"], "n": [1, 2], "zona": pd.Categorical(["N", "S"]),
+                          "mod": pd.array([2020, None], dtype="Int64")}, index=[3, 7])
+    key = cache.make_key("sha", "raw", "Flota")
+    cache.store(key, "sha", {"raw": raw, "table": table}, {"note": "x"})
+
+    frames, meta = cache.load(key)
+
+    assert meta == {"note": "x"}
+    pd.testing.assert_frame_equal(frames["raw"], raw)
+    pd.testing.assert_frame_equal(frames["table"], table)
+    # every cell comes back with its Python type (NaN stays NaN, None stays None)
+    assert [type(v) for v in frames["raw"][0]] == [type(v) for v in raw[0]]
+    assert cache.stats()["format"] == ("arrow" if sheet_cache.pa is not None else "pickle")
+
+
+def test_pickle_format_without_pyarrow(tmp_path, monkeypatch):
+    monkeypatch.setattr(sheet_cache, "pa", None)
+    cache = SheetCache(tmp_path)
+    key = cache.make_key("sha", "raw", "Flota")
+    cache.store(key, "sha", {"raw": _raw_sheet()})
+
+    assert cache.stats()["format"] == "pickle"
+    pd.testing.assert_frame_equal(cache.load(key)[0]["raw"], _raw_sheet())
+
+
+def test_evicts_least_recently_used_beyond_size(tmp_path):
+    cache = SheetCache(tmp_path)
+    frame = pd.DataFrame({"a": np.arange(1000.0)})
+    cache.store(cache.make_key("one", "raw"), "one", {"f": frame})
+    cache.max_bytes = cache.stats()["bytes"] + 1
+    cache.store(cache.make_key("two", "raw"), "two", {"f": frame})
+
+    assert cache.load(cache.make_key("one", "raw")) is None
+    assert cache.load(cache.make_key("two", "raw")) is not None
+    assert cache.stats()["entries"] == 1
+
+
+def test_prepared_tables_are_not_parsed_twice(monkeypatch):
+    buf = io.BytesIO()
+    with pd.ExcelWriter(buf, engine="openpyxl") as writer:
+        pd.DataFrame({"TIPO DE UNIDAD": ["TRACTO", "DOLLY", "TRACTO"], "MOD": [2020, 2021, 2022]}).to_excel(
+            writer, sheet_name="Flota", index=False)
+    data = buf.getvalue()
+
+    monkeypatch.setenv("TABLE_COMPACT_TYPES", "0")
+    first, timings, memory = excel_service.prepare_export_tables_timed(data, "Flota")
+    assert set(timings) == {"parse", "detect"} and memory["before"] == memory["after"] > 0
+    monkeypatch.delenv("TABLE_COMPACT_TYPES")
+    typed, timings, memory = excel_service.prepare_export_tables_timed(data, "Flota")
+    # typed tables are cached apart from the untyped ones
+    assert set(timings) == {"parse", "detect", "types"}
+    assert typed["Flota_Table1"]["mod"].dtype == "Int16" and first["Flota_Table1"]["mod"].dtype != "Int16"
+    first = typed
+
+    def no_parse(*args, **kwargs):
+        raise AssertionError("workbook parsed again")
+
+    monkeypatch.setattr(excel_utils, "open_reader", no_parse)
+    second, timings, cached_memory = excel_service.prepare_export_tables_timed(data, "Flota")
+
+    assert list(timings) == ["sheet_cache"]
+    assert cached_memory == memory
+    assert list(second) == list(first)
+    for name in first:
+        pd.testing.assert_frame_equal(second[name], first[name])
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+
+from backend_api.app.services import excel_service
+from backend_api.app.services.table_detection import detect_regions, true_runs
+
+
+def test_true_runs_merges_small_gaps():
+    mask = [True, True, False, True, False, False, True]
+    assert true_runs(mask) == [(0, 1), (3, 3), (6, 6)]
+    assert true_runs(mask, max_gap=1) == [(0, 3), (6, 6)]
+    assert true_runs(mask, min_len=2) == [(0, 1)]
+
+
+def test_detect_regions_splits_side_by_side_and_stacked():
+    occ = np.zeros((12, 9), dtype=bool)
+    occ[1:4, 0:3] = True   # top-left table
+    occ[1:6, 5:9] = True   # table to its right
+    occ[8:12, 0:3] = True  # table stacked below the first one
+    regions = sorted(detect_regions(occ))
+    assert regions == [(1, 3, 0, 2), (1, 5, 5, 8), (8, 11, 0, 2)]
+
+
+def test_detect_and_clean_splits_horizontal_tables():
+    sheet = pd.DataFrame([
+        [None, None, None, None, None],
+        ["unidad", "serie", None, "tipo", "deducible"],
+        ["TRACTO", "A1", None, "TRACTOS", "10 %"],
+        ["DOLLY", "B2", None, "REMOLQUES", "5 %"],
+    ])
+
+    class _Workbook:
+        sheet_names = ["S"]
+
+        def has_sheet(self, name):
+            return name == "S"
+
+        def sheet(self, name):
+            return sheet
+
+    # one blank column is a spacer by default; a lower `min_col_gap` cuts on it
+    tables = excel_service.detect_and_clean_tables(_Workbook())["S"]
+    assert [list(t.columns) for t in tables] == [["unidad", "serie", "tipo", "deducible"]]
+    tables = excel_service.detect_and_clean_tables(_Workbook(), min_col_gap=1)["S"]
+    assert [list(t.columns) for t in tables] == [["unidad", "serie"], ["tipo", "deducible"]]
+
+
+def test_blank_column_inside_a_table_keeps_it_whole():
+    occ = np.ones((5, 6), dtype=bool)
+    occ[:, 2] = False  # spacer column
+    assert detect_regions(occ) == [(0, 4, 0, 5)]
+
+    wide = np.zeros((5, 11), dtype=bool)
+    wide[:, 0:4] = wide[:, 6:11] = True
+    assert detect_regions(wide) == [(0, 4, 0, 3), (0, 4, 6, 10)]
+
+
+def test_trim_edges_wide_margins():
+    df = pd.DataFrame(np.full((2000, 300), np.nan))
+    df.iloc[1500, 250] = 1.0
+    df.iloc[1501, 251] = 2.0
+    out = excel_service.trim_edges(df)
+    assert out.shape == (2, 2)
+    assert out.iloc[0, 0] == 1.0
@@ -0,0 +1,106 @@
+import io
+import json
+from pathlib import Path
+
+import pandas as pd
+
+from backend_api.app.services import llm_service
+from backend_api.app.utils import token_budget
+
+SAMPLE_RULES = Path(__file__).resolve().parents[2] / "data" / "sample3_test.json"
+
+
+def _prompt_csv(user_prompt):
+    body = user_prompt.split("HOJA DE ENTRADA", 1)[1].split("):\n\n", 1)[1]
+    return body.split("\n\n\nRecuerda", 1)[0]
+
+
+def test_fit_chunk_rows_respects_context_and_output(monkeypatch):
+    monkeypatch.setenv("LLM_CONTEXT_TOKENS", "10000")
+    monkeypatch.setenv("LLM_MAX_OUTPUT_TOKENS", "2000")
+    # prompt room: 10000 - 2000 - 1000 = 7000 -> 700 rows; output: 0.9 * 2000 / 20 = 90 rows
+    assert token_budget.fit_chunk_rows(1000, 10, 20, "m") == 90
+    assert token_budget.fit_chunk_rows(1000, 10, 20, "m", configured=50) == 50
+    assert token_budget.fit_chunk_rows(1000, 100, 1, "m", configured=500) == 70
+
+
+def test_token_meter_accumulates_per_model():
+    meter = token_budget.TokenMeter()
+    meter.record("m", 100, 20, estimated_prompt_tokens=120)
+    meter.record("m", 50, 10, estimated=True)
+
+    stats = meter.stats()
+    assert stats["models"]["m"] == {"calls": 2, "estimated_calls": 1, "estimated_prompt_tokens": 170,
+                                    "prompt_tokens": 150, "completion_tokens": 30}
+    assert stats["totals"]["completion_tokens"] == 30
+
+
+def test_compact_prompt_drops_descriptions_and_unused_columns(monkeypatch):
+    df = pd.DataFrame({
+        "tipo_de_unidad": ["TRACTO", "DOLLY"],
+        "suma": [1.5, 2.5],
+        "no_serie": ["s1", "s2"],
+    })
+    rules = {
+        "reglas_asignacion": {"descripcion": "agregar columnas", "columnas_a_agregar": ["DEDUCIBLE"],
+                              "mapeo_columnas": {"columna_referencia": "TIPO DE UNIDAD"}},
+        "estructura_excel_final": {"columnas_finales": ["A: TIPO DE UNIDAD", "B: NO.SERIE"],
+                                   "notas": ["Mantener el ancho de columnas original"]},
+        "ejemplo_output_esperado": {"descripcion": "filas de ejemplo",
+                                    "ejemplos": [{"fila_original": {"TIPO DE UNIDAD": "DOLLY", "SUMA": 1},
+                                                  "columnas_agregadas": {"DEDUCIBLE": "10 %"}}]},
+    }
+    prompts = []
+
+    def fake_call(system_prompt, user_prompt, model="m", max_retries=2, timeout=30):
+        prompts.append(user_prompt)
+        chunk = pd.read_csv(io.StringIO(_prompt_csv(user_prompt)))
+        chunk["DEDUCIBLE"] = "10 %"
+        return chunk.to_csv(index=False)
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(llm_service, "_call_openai_csv", fake_call)
+
+    out = llm_service.transform_sheet_with_rules(df, rules=rules, project_keys=False)
+
+    assert len(prompts) == 1
+    assert "agregar columnas" not in prompts[0] and "filas de ejemplo" not in prompts[0]
+    assert "Mantener" in prompts[0] and '"DEDUCIBLE": "10 %"' in prompts[0] and "SUMA" not in prompts[0]
+    assert _prompt_csv(prompts[0]).splitlines()[0] == "tipo_de_unidad,no_serie"
+    assert list(out.columns) == ["tipo_de_unidad", "suma", "no_serie", "DEDUCIBLE"]
+    assert out["suma"].tolist() == [1.5, 2.5]
+
+
+def test_compact_rules_keep_example_mappings_and_notes():
+    rules = json.loads(SAMPLE_RULES.read_text(encoding="utf-8"))
+
+    compact = llm_service.compact_rules(rules)
+    text = json.dumps(compact, ensure_ascii=False)
+
+    examples = {e["fila_original"]["TIPO DE UNIDAD"]: e for e in compact["ejemplo_output_esperado"]["ejemplos"]}
+    assert list(examples["TANQUE"]["fila_original"]) == ["TIPO DE UNIDAD"]
+    assert examples["TANQUE"]["columnas_agregadas"]["DANOS MATERIALES DEDUCIBLES"] == "5 %"
+    assert examples["DOLLY"]["columnas_agregadas"]["ROBO TOTAL DEDUCIBLES"] == "10 %"
+    assert "después de la columna D" in text
+    assert "descripcion" not in text and "FREIGHTLINER" not in text
+    assert len(text) < len(json.dumps(rules, ensure_ascii=False))
+
+
+def test_large_sheets_are_batched_to_fit_the_model(monkeypatch):
+    df = pd.DataFrame({"unidad": [f"unidad numero {i}" for i in range(300)]})
+    sizes = []
+
+    def fake_call(system_prompt, user_prompt, model="m", max_retries=2, timeout=30):
+        chunk = pd.read_csv(io.StringIO(_prompt_csv(user_prompt)))
+        sizes.append(len(chunk))
+        chunk["extra"] = "x"
+        return chunk.to_csv(index=False)
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setenv("LLM_MAX_OUTPUT_TOKENS", "1000")
+    monkeypatch.setattr(llm_service, "_call_openai_csv", fake_call)
+
+    out = llm_service.transform_sheet_with_rules(df, rules={}, chunk_rows=0)
+
+    assert len(sizes) > 1 and sum(sizes) == 300
+    assert out["unidad"].tolist() == df["unidad"].tolist()
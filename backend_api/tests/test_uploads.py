@@ -0,0 +1,44 @@
+import asyncio
+import hashlib
+import io
+
+import pytest
+from starlette.datastructures import UploadFile
+
+from backend_api.app.utils import uploads
+
+
+def test_spool_upload_streams_to_disk(tmp_path):
+    payload = b"x" * (300 * 1024)
+    upload = UploadFile(file=io.BytesIO(payload), filename="Book.XLSX")
+
+    spooled = asyncio.run(uploads.spool_upload(upload, max_bytes=1024 * 1024, chunk_size=64 * 1024,
+                                               directory=str(tmp_path)))
+    with spooled:
+        assert spooled.path.parent == tmp_path
+        assert spooled.path.suffix == ".xlsx"
+        assert spooled.size == len(payload)
+        assert spooled.sha256 == hashlib.sha256(payload).hexdigest()
+        assert spooled.read_bytes() == payload
+    assert not spooled.path.exists()
+
+
+def test_spool_upload_enforces_limit_while_streaming(tmp_path):
+    upload = UploadFile(file=io.BytesIO(b"y" * 200_000), filename="big.xlsx")
+
+    with pytest.raises(uploads.UploadTooLargeError):
+        asyncio.run(uploads.spool_upload(upload, max_bytes=100_000, chunk_size=64 * 1024,
+                                         directory=str(tmp_path)))
+    # the partial spool file is removed
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_iter_file_yields_chunks_and_removes_file(tmp_path):
+    path = tmp_path / "out.xlsx"
+    path.write_bytes(b"0123456789")
+
+    async def collect():
+        return [chunk async for chunk in uploads.iter_file(path, chunk_size=4, remove=True)]
+
+    assert asyncio.run(collect()) == [b"0123", b"4567", b"89"]
+    assert not path.exists()
@@ -0,0 +1,32 @@
+import io
+
+from backend_api.app.services import excel_service
+from backend_api.benchmarks.workbook_generator import SheetSpec, make_raw_sheet, unit_types, write_raw_workbook
+
+
+def test_generated_sheet_layout():
+    spec = SheetSpec(rows=40, cols=5, stacked=2, side_by_side=3, margin_rows=2, margin_cols=1,
+                     blank_ratio=0.0, summary_ratio=0.0, unit_cardinality=3)
+    df = make_raw_sheet(spec)
+
+    # 2 stacked tables of 40 // 6 rows + title + header, separated by 3 blank rows
+    assert df.shape == (2 + 2 * (6 + 2) + 3, 1 + 3 * 5 + 2 * 2)
+    assert df.iloc[:2].isna().all().all() and df.iloc[:, 0].isna().all()
+    assert set(df.iloc[4:10, 1]) <= set(unit_types(3))
+
+
+def test_generated_workbook_is_detected_as_separate_tables():
+    spec = SheetSpec(rows=60, cols=4, stacked=2, side_by_side=2, blank_ratio=0.0, summary_ratio=0.0)
+    buf = io.BytesIO()
+    write_raw_workbook({"Flota": make_raw_sheet(spec)}, buf)
+
+    tables = excel_service.detect_and_clean_tables_from_bytes(buf.getvalue())["Flota"]
+
+    assert len(tables) == 4
+    assert all(t.shape == (15, 4) for t in tables)
+    assert list(tables[0].columns) == ["tipo_de_unidad", "desci", "mod", "no_serie"]
+
+
+def test_unit_cardinality_beyond_known_types():
+    names = unit_types(20)
+    assert len(set(names)) == 20
@@ -0,0 +1,78 @@
+import asyncio
+import io
+import time
+
+import pandas as pd
+import pytest
+from fastapi import UploadFile
+
+from backend_api.app.services import excel_service, workbook_service
+from backend_api.app.utils.workbook_store import WorkbookStore, get_workbook_store
+
+
+@pytest.fixture(autouse=True)
+def _no_llm(monkeypatch):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+
+
+def _workbook():
+    buf = io.BytesIO()
+    with pd.ExcelWriter(buf, engine="openpyxl") as writer:
+        rows = [["Reporte flota", None], ["unidad", "serie"]] + [[f"camion {i}", f"S{i}"] for i in range(30)]
+        pd.DataFrame(rows).to_excel(writer, index=False, header=False, sheet_name="Flota")
+        pd.DataFrame([["x"]]).to_excel(writer, index=False, header=False, sheet_name="Notas")
+    return buf.getvalue()
+
+
+def _upload():
+    return asyncio.run(workbook_service.create_workbook(UploadFile(file=io.BytesIO(_workbook()),
+                                                                   filename="flota.xlsx")))
+
+
+def test_upload_once_then_page_through_raw_and_cleaned_rows():
+    info = _upload()
+    assert info["sheets"] == ["Flota", "Notas"]
+    workbook = get_workbook_store().get(info["id"])
+
+    raw = asyncio.run(workbook_service.sheet_preview(workbook, "Flota", offset=1, limit=3))
+    assert raw["columns"] == ["A", "B"] and raw["total_rows"] == 32
+    assert raw["rows"] == [["unidad", "serie"], ["camion 0", "S0"], ["camion 1", "S1"]]
+
+    cleaned = asyncio.run(workbook_service.sheet_preview(workbook, "Flota", view="cleaned", offset=28, limit=10))
+    assert cleaned["columns"] == ["unidad", "serie"] and cleaned["total_rows"] == 30
+    assert cleaned["rows"] == [["camion 28", "S28"], ["camion 29", "S29"]]
+    assert cleaned["view"] == "cleaned"
+    assert cleaned["tables"] == [{"name": cleaned["table"], "rows": 30}]
+    # the earlier name of the view still works
+    alias = asyncio.run(workbook_service.sheet_preview(workbook, "Flota", view="tables", offset=28, limit=10))
+    assert alias == cleaned
+
+    with pytest.raises(ValueError):
+        asyncio.run(workbook_service.sheet_preview(workbook, "Missing"))
+
+
+def test_export_by_workbook_id_skips_the_upload():
+    info = _upload()
+    workbook = get_workbook_store().get(info["id"])
+
+    out_path, name = asyncio.run(excel_service.process_workbook_export(workbook, "Flota"))
+    try:
+        assert name == "modified_flota.xlsx"
+        assert "camion 29" in pd.read_excel(out_path, sheet_name=None).popitem()[1].iloc[:, 0].tolist()
+    finally:
+        out_path.unlink()
+
+
+def test_purge_drops_idle_and_least_recently_used(tmp_path):
+    store = WorkbookStore(tmp_path / "wb.sqlite3", ttl_seconds=60, max_bytes=150)
+    files = []
+    for i in range(3):
+        path = tmp_path / f"{i}.xlsx"
+        path.write_bytes(b"x" * 60)
+        files.append(store.create(f"{i}.xlsx", str(path), "sha", 60, ["S"]))
+        time.sleep(0.01)
+    store.get(files[0]["id"])
+
+    assert store.purge() == 1
+    assert store.get(files[1]["id"]) is None
+    assert store.get(files[0]["id"]) is not None and store.get(files[2]["id"]) is not None
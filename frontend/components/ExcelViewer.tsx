@@ -1,16 +1,56 @@
 import React, { useState, useRef } from 'react'
-import { readFileArrayBuffer, parseWorkbook, getSheetNames, sheetToRows } from '../lib/excel'
+
+const API_BASE = ((process.env.NEXT_PUBLIC_API_BASE as string) || 'http://localhost:8000').replace(/\/$/, '')
+const PAGE_SIZE = 100
+
+type View = 'raw' | 'cleaned'
+
+type Page = {
+  columns: string[]
+  rows: any[][]
+  total_rows: number
+  offset: number
+  limit: number
+  table?: string
+  tables?: { name: string; rows: number }[]
+}
 
 export default function ExcelViewer() {
-  const [file, setFile] = useState<File | null>(null)
-  const [wb, setWb] = useState<any | null>(null)
+  const [workbookId, setWorkbookId] = useState<string | null>(null)
   const [sheets, setSheets] = useState<string[]>([])
   const [selected, setSelected] = useState<string | null>(null)
-  const [rows, setRows] = useState<any[][]>([])
+  const [view, setView] = useState<View>('raw')
+  const [table, setTable] = useState<string | null>(null)
+  const [page, setPage] = useState<Page | null>(null)
   const [loading, setLoading] = useState(false)
   const [error, setError] = useState<string | null>(null)
+  const [progress, setProgress] = useState<string | null>(null)
   const inputRef = useRef<HTMLInputElement | null>(null)
 
+  // Only the requested window of rows is sent by the backend; the workbook
+  // itself stays on the server after the upload.
+  const loadPage = async (id: string, sheet: string, v: View, t: string | null, offset: number) => {
+    setLoading(true)
+    setError(null)
+    try {
+      const params = new URLSearchParams({ view: v, offset: String(offset), limit: String(PAGE_SIZE) })
+      if (v === 'cleaned' && t) params.set('table', t)
+      const res = await fetch(`${API_BASE}/workbooks/${id}/sheets/${encodeURIComponent(sheet)}?${params}`)
+      if (!res.ok) {
+        const text = await res.text()
+        throw new Error(text || `Error ${res.status}`)
+      }
+      const data: Page = await res.json()
+      setPage(data)
+      setTable(data.table ?? null)
+    } catch (err: any) {
+      console.error(err)
+      setError(err.message || 'Error leyendo la hoja')
+    } finally {
+      setLoading(false)
+    }
+  }
+
   const onFileChange = async (e: React.ChangeEvent<HTMLInputElement>) => {
     setError(null)
     const f = e.target.files?.[0] ?? null
@@ -21,18 +61,25 @@ export default function ExcelViewer() {
     }
     setLoading(true)
     try {
-      setFile(f)
-      const data = await readFileArrayBuffer(f)
-      const _wb = parseWorkbook(data)
-      setWb(_wb)
-      const names = getSheetNames(_wb)
-      setSheets(names)
-      const first = names[0] ?? null
+      const form = new FormData()
+      form.append('file', f)
+      const res = await fetch(`${API_BASE}/workbooks`, { method: 'POST', body: form })
+      if (!res.ok) {
+        const text = await res.text()
+        throw new Error(text || `Error ${res.status}`)
+      }
+      const workbook = await res.json()
+      setWorkbookId(workbook.id)
+      setSheets(workbook.sheets)
+      const first = workbook.sheets[0] ?? null
       setSelected(first)
-      if (first) setRows(sheetToRows(_wb, first))
+      setView('raw')
+      setTable(null)
+      setPage(null)
+      if (first) await loadPage(workbook.id, first, 'raw', null, 0)
     } catch (err: any) {
       console.error(err)
-      setError('Error leyendo el archivo')
+      setError(err.message || 'Error leyendo el archivo')
     } finally {
       setLoading(false)
     }
@@ -40,28 +87,56 @@ export default function ExcelViewer() {
 
   const selectSheet = (name: string) => {
     setSelected(name)
-    if (!wb) return
-    setRows(sheetToRows(wb, name))
+    setTable(null)
+    if (workbookId) loadPage(workbookId, name, view, null, 0)
+  }
+
+  const selectView = (v: View) => {
+    setView(v)
+    setTable(null)
+    if (workbookId && selected) loadPage(workbookId, selected, v, null, 0)
+  }
+
+  const selectTable = (name: string) => {
+    if (workbookId && selected) loadPage(workbookId, selected, view, name, 0)
+  }
+
+  const goTo = (offset: number) => {
+    if (workbookId && selected) loadPage(workbookId, selected, view, table, offset)
   }
 
   const exportModified = async () => {
     setError(null)
-    if (!file || !selected) {
+    if (!workbookId || !selected) {
       setError('No hay archivo o hoja seleccionada')
       return
     }
     setLoading(true)
     try {
+      // The workbook is already on the server: the job only needs its id.
+      // Submit, poll its progress, then download the result (xlsx blob).
       const form = new FormData()
-      form.append('file', file)
+      form.append('workbook_id', workbookId)
       form.append('sheet', selected)
-
-      // Adjust backend URL as needed. Expecting blob (xlsx) response.
-      const API_BASE = (process.env.NEXT_PUBLIC_API_BASE as string) || 'http://localhost:8000'
-      const res = await fetch(`${API_BASE.replace(/\/$/, '')}/export`, {
+      const submit = await fetch(`${API_BASE}/jobs`, {
         method: 'POST',
         body: form,
       })
+      if (!submit.ok) {
+        const text = await submit.text()
+        throw new Error(text || `Error ${submit.status}`)
+      }
+      const { id } = await submit.json()
+      for (;;) {
+        const statusRes = await fetch(`${API_BASE}/jobs/${id}`)
+        if (!statusRes.ok) throw new Error(`Error ${statusRes.status}`)
+        const job = await statusRes.json()
+        if (job.status === 'failed') throw new Error(job.error || 'Error en export')
+        if (job.status === 'done') break
+        setProgress(job.chunks_total ? `${job.stage} (${job.chunks_done}/${job.chunks_total})` : job.stage)
+        await new Promise((resolve) => setTimeout(resolve, 1000))
+      }
+      const res = await fetch(`${API_BASE}/jobs/${id}/result`)
       if (!res.ok) {
         const text = await res.text()
         throw new Error(text || `Error ${res.status}`)
@@ -83,9 +158,18 @@ export default function ExcelViewer() {
       setError(err.message || 'Error en export')
     } finally {
       setLoading(false)
+      setProgress(null)
     }
   }
 
+  const tabStyle = (active: boolean) => ({
+    marginRight: 8,
+    padding: '6px 10px',
+    borderRadius: 6,
+    border: active ? '2px solid #111827' : '1px solid #e5e7eb',
+    background: active ? '#eef2ff' : 'white',
+  })
+
   return (
     <section>
       <label style={{ display: 'block', marginBottom: 8 }}>
@@ -93,62 +177,84 @@ export default function ExcelViewer() {
         <input ref={inputRef} type="file" accept=".xlsx" onChange={onFileChange} style={{ display: 'block', marginTop: 8 }} />
       </label>
 
-      {loading && <p>Procesando…</p>}
+      {loading && <p>Procesando…{progress ? ` ${progress}` : ''}</p>}
       {error && <p style={{ color: 'crimson' }}>{error}</p>}
 
       {sheets.length > 0 && (
         <div style={{ marginTop: 12 }}>
           <div style={{ marginBottom: 12 }}>
             {sheets.map((s) => (
-              <button
-                key={s}
-                onClick={() => selectSheet(s)}
-                style={{
-                  marginRight: 8,
-                  padding: '6px 10px',
-                  borderRadius: 6,
-                  border: s === selected ? '2px solid #111827' : '1px solid #e5e7eb',
-                  background: s === selected ? '#eef2ff' : 'white',
-                }}
-              >
+              <button key={s} onClick={() => selectSheet(s)} style={tabStyle(s === selected)}>
                 {s}
               </button>
             ))}
           </div>
 
+          <div style={{ marginBottom: 12 }}>
+            <button onClick={() => selectView('raw')} style={tabStyle(view === 'raw')}>
+              Hoja original
+            </button>
+            <button onClick={() => selectView('cleaned')} style={tabStyle(view === 'cleaned')}>
+              Tablas detectadas
+            </button>
+            {view === 'cleaned' &&
+              page?.tables?.map((t) => (
+                <button key={t.name} onClick={() => selectTable(t.name)} style={tabStyle(t.name === table)}>
+                  {t.name} ({t.rows})
+                </button>
+              ))}
+          </div>
+
           <div style={{ marginBottom: 12 }}>
             <button onClick={exportModified} disabled={loading} style={{ padding: '8px 12px', borderRadius: 6 }}>
               Export Modified Excel
             </button>
           </div>
 
-          <div style={{ overflowX: 'auto' }}>
-            <table style={{ borderCollapse: 'collapse', width: '100%' }}>
-              <thead>
-                {rows.length > 0 && (
+          {page && (
+            <div style={{ overflowX: 'auto' }}>
+              <table style={{ borderCollapse: 'collapse', width: '100%' }}>
+                <thead>
                   <tr>
-                    {rows[0].map((cell: any, idx: number) => (
+                    {page.columns.map((col, idx) => (
                       <th key={idx} style={{ textAlign: 'left', padding: 8, borderBottom: '1px solid #e5e7eb' }}>
-                        {String(cell)}
+                        {col}
                       </th>
                     ))}
                   </tr>
-                )}
-              </thead>
-              <tbody>
-                {rows.slice(1).map((r, i) => (
-                  <tr key={i}>
-                    {r.map((c: any, j: number) => (
-                      <td key={j} style={{ padding: 8, borderBottom: '1px solid #f3f4f6' }}>
-                        {String(c)}
-                      </td>
-                    ))}
-                  </tr>
-                ))}
-              </tbody>
-            </table>
-            {rows.length === 0 && <p>No hay datos en la hoja seleccionada.</p>}
-          </div>
+                </thead>
+                <tbody>
+                  {page.rows.map((r, i) => (
+                    <tr key={page.offset + i}>
+                      {r.map((c: any, j: number) => (
+                        <td key={j} style={{ padding: 8, borderBottom: '1px solid #f3f4f6' }}>
+                          {c === null ? '' : String(c)}
+                        </td>
+                      ))}
+                    </tr>
+                  ))}
+                </tbody>
+              </table>
+              {page.total_rows === 0 ? (
+                <p>No hay datos en la hoja seleccionada.</p>
+              ) : (
+                <div style={{ marginTop: 8 }}>
+                  <button onClick={() => goTo(Math.max(0, page.offset - page.limit))} disabled={loading || page.offset === 0}>
+                    Anterior
+                  </button>
+                  <span style={{ margin: '0 8px' }}>
+                    Filas {page.offset + 1}–{page.offset + page.rows.length} de {page.total_rows}
+                  </span>
+                  <button
+                    onClick={() => goTo(page.offset + page.limit)}
+                    disabled={loading || page.offset + page.limit >= page.total_rows}
+                  >
+                    Siguiente
+                  </button>
+                </div>
+              )}
+            </div>
+          )}
         </div>
       )}
     </section>